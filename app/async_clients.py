@@ -0,0 +1,87 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+class _ThreadedClient:
+    """
+    Runs the blocking calls of a sync client in a private thread pool so they
+    can be awaited from an asyncio event loop. The pool size bounds how many of
+    the client's calls run at once; pacing is still done by the client itself.
+    """
+
+    def __init__(self, client, max_workers: int, name: str):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Awaits any blocking callable in the client's threads."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def batches(self, items: Iterable[Any], size: int) -> AsyncIterator[List[Any]]:
+        """
+        Pulls `items` (e.g. a streaming SPOT generator) in lists of up to `size`,
+        each pull running in the client's threads; stops when it is exhausted.
+        """
+        iterator = iter(items)
+        while True:
+            batch = await self.run(lambda: list(islice(iterator, size)))
+            if not batch:
+                return
+            yield batch
+
+    def cancel(self) -> None:
+        """Makes the client's running and queued calls fail fast (see the clients' cancel())."""
+        self.client.cancel()
+
+    def close(self) -> None:
+        """Waits for calls still running in the pool (e.g. a generator pull) and stops it."""
+        self._executor.shutdown(wait=True)
+
+
+class AsyncSpotClient(_ThreadedClient):
+    """asyncio facade over SpotClient."""
+
+    def __init__(self, client, max_workers: int = 2):
+        super().__init__(client, max_workers, "spot")
+
+    async def get_token(self):
+        return await self.run(self.client.get_token)
+
+    async def fetch_products(self) -> Dict[str, Any]:
+        return await self.run(self.client.fetch_products)
+
+    async def iter_products(self) -> Iterator[Dict[str, Any]]:
+        """Downloads the catalog (in a client thread) and returns the product generator."""
+        return await self.run(self.client.iter_products)
+
+    async def fetch_price(self) -> Dict[str, Any]:
+        return await self.run(self.client.fetch_price)
+
+
+class AsyncOmieClient(_ThreadedClient):
+    """asyncio facade over OmieClient."""
+
+    def __init__(self, client, max_workers: int = 4):
+        super().__init__(client, max_workers, "omie")
+
+    async def list_products(self, **kwargs: Any) -> List[Dict[str, Any]]:
+        return await self.run(self.client.list_products, **kwargs)
+
+    async def insert_product(self, product: Dict[str, Any]):
+        return await self.run(self.client.insert_product, product)
+
+    async def update_product(self, changes: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.run(self.client.update_product, changes)
+
+    async def get_product(self, integration_code: str) -> Dict[str, Any]:
+        return await self.run(self.client.get_product, integration_code)
+
+    async def insert_products_batch(self, products: List[Dict[str, Any]], lot_size: int):
+        return await self.run(self.client.insert_products_batch, products, lot_size=lot_size)
@@ -0,0 +1,237 @@
+import base64
+import gzip
+import io
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from event_log import SECRET_KEYS, redact
+from http_session import build_session, DEFAULT_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+
+# Responses up to this size are parsed and redacted (e.g. the SPOT token); catalogs are kept as-is
+_REDACT_BODY_LIMIT = 64 * 1024
+
+# Headers worth keeping: the body is stored decoded, so encodings and lengths no longer apply
+_KEPT_HEADERS = ("Content-Type",)
+
+
+class CassetteMiss(requests.exceptions.RequestException):
+    """Raised on replay when the cassette holds no response for a request."""
+
+
+def _redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(k, "***" if k.lower() in SECRET_KEYS else v) for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    return parts._replace(query=urlencode(query)).geturl()
+
+
+def _redact_body(body: Optional[bytes]) -> Optional[Any]:
+    """Request/response JSON body with credentials masked; None when it is not JSON."""
+    if not body:
+        return None
+    try:
+        return redact(json.loads(body))
+    except ValueError:
+        return None
+
+
+def _request_keys(method: str, url: str, body: Optional[bytes]) -> Tuple[str, str]:
+    """
+    (exact, loose) replay keys of a request. Both ignore the host and every
+    credential. The exact key includes the query and the JSON body; the loose
+    one only the OMIE call name, so a replayed run whose payloads drifted
+    from the recording still gets a response of the right kind.
+    """
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_KEYS)
+    payload = _redact_body(body)
+    call = payload.get("call", "") if isinstance(payload, dict) else ""
+    loose = f"{method} {parts.path} {call}".rstrip()
+    exact = f"{method} {parts.path}?{urlencode(query)} {json.dumps(payload, sort_keys=True, ensure_ascii=False)}"
+    return exact, loose
+
+
+def _encode_body(content: bytes, content_type: str) -> Tuple[str, str]:
+    if "json" in content_type and len(content) <= _REDACT_BODY_LIMIT:
+        masked = _redact_body(content)
+        if masked is not None:
+            return json.dumps(masked, ensure_ascii=False), "utf-8"
+    try:
+        return content.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        return base64.b64encode(content).decode("ascii"), "base64"
+
+
+class _RecordingAdapter(HTTPAdapter):
+    """HTTPAdapter that appends every request/response pair it carries to a cassette."""
+
+    def __init__(self, cassette: "Cassette", **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        # Session.send only sets response.elapsed after the adapter returns
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        elapsed = time.perf_counter() - started
+        # Reads the whole body (also for stream=True); the caller still gets an intact response
+        self.cassette.record(request, response, elapsed)
+        return response
+
+
+class _ReplayAdapter(BaseAdapter):
+    """Adapter that answers from a cassette without any network access."""
+
+    def __init__(self, cassette: "Cassette"):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        return self.cassette.replay(request, self)
+
+    def close(self):
+        pass
+
+
+class Cassette:
+    """
+    Record/replay transport for SpotClient and OmieClient.
+
+    In "record" mode, sessions from session() send real requests and append
+    every request/response pair to `path` (gzip-compressed JSON lines, with
+    credentials and tokens masked). In "replay" mode they answer from `path`
+    instead: each request gets the next recorded response with the same method,
+    path, query and body, or else the next one for the same OMIE call.
+    `latency_scale` replays the recorded response times scaled by that factor
+    (0 = as fast as possible, 1 = as recorded).
+    """
+
+    def __init__(self, path: str, mode: str = "replay", latency_scale: float = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._file = None
+        self._exact: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._loose: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+        if mode == "record":
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+            self._write({"version": CASSETTE_VERSION})
+        else:
+            self._load()
+
+    def __enter__(self) -> "Cassette":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def session(self, pool_maxsize: int = DEFAULT_POOL_SIZE) -> requests.Session:
+        """A session (see build_session) whose traffic goes through this cassette."""
+        if self.mode == "record":
+            adapter = _RecordingAdapter(self, pool_connections=2, pool_maxsize=max(1, pool_maxsize), pool_block=True)
+        else:
+            adapter = _ReplayAdapter(self)
+        return build_session(pool_maxsize=pool_maxsize, adapter=adapter)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response, elapsed: float) -> None:
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        content_type = response.headers.get("Content-Type", "")
+        content, encoding = _encode_body(response.content, content_type)
+        entry = {
+            "method": request.method,
+            "url": _redact_url(request.url),
+            "request": _redact_body(body),
+            "key": _request_keys(request.method, request.url, body)[0],
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers},
+            "body": content,
+            "encoding": encoding,
+            "elapsed": round(elapsed, 4),
+        }
+        with self._lock:
+            if self._file is not None:
+                self._write(entry)
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"{self.path} is not a version {CASSETTE_VERSION} cassette")
+            count = 0
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                entry["_pending"] = True
+                body = entry.get("request")
+                _, loose = _request_keys(entry["method"], entry["url"],
+                                         json.dumps(body).encode("utf-8") if body is not None else None)
+                self._exact[entry["key"]].append(entry)
+                self._loose[loose].append(entry)
+                count += 1
+        logger.info(f"📼 Loaded {count} recorded requests from {self.path}")
+
+    def _next(self, exact: str, loose: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for key, queue in ((exact, self._exact.get(exact)), (loose, self._loose.get(loose))):
+                # An entry sits in both queues; skip the ones already served through the other
+                while queue:
+                    entry = queue.popleft()
+                    if not entry.pop("_pending", False):
+                        continue
+                    self._last[key] = entry
+                    return entry
+            # Recording exhausted: repeat the last answer (e.g. a token validated more often)
+            return self._last.get(exact) or self._last.get(loose)
+
+    def replay(self, request: requests.PreparedRequest, adapter: BaseAdapter) -> requests.Response:
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        exact, loose = _request_keys(request.method, request.url, body)
+        entry = self._next(exact, loose)
+        if entry is None:
+            raise CassetteMiss(f"No recorded response for {request.method} {_redact_url(request.url)}",
+                               request=request)
+        if self.latency_scale > 0:
+            time.sleep(entry.get("elapsed", 0) * self.latency_scale)
+
+        content = entry["body"]
+        content = base64.b64decode(content) if entry.get("encoding") == "base64" else content.encode("utf-8")
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason")
+        response.headers = CaseInsensitiveDict(entry.get("headers", {}))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(content)
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=entry.get("elapsed", 0))
+        response.connection = adapter
+        return response
@@ -0,0 +1,138 @@
+import json
+import sqlite3
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadLetter(NamedTuple):
+    code: str
+    name: Optional[str]
+    action: str                 # "insert" or "update"
+    update_date: Optional[str]
+    payload_json: str
+    spot_ncm: Optional[str]     # SPOT Taric before fix_ncm, so the NCM can be re-mapped
+    error_code: Optional[str]
+    error_message: Optional[str]
+    fault_class: Optional[str]  # see omie_faults.classify_fault; "exception" or "preflight" otherwise
+    attempts: int
+    first_failed_at: str
+    last_failed_at: str
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        """The mapped OMIE payload that failed."""
+        return json.loads(self.payload_json)
+
+
+class DeadLetterStore:
+    """
+    SQLite store of the products whose last OMIE insert/update failed: the
+    mapped payload, the fault and how many times it failed. A later success
+    for the same code (in a full sync or a retry-failed run) removes the entry,
+    so the store always holds exactly the products still needing work.
+    """
+
+    def __init__(self, path: str = "dead_letters.db", commit_every: int = 100):
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                code TEXT PRIMARY KEY,
+                name TEXT,
+                action TEXT NOT NULL,
+                update_date TEXT,
+                payload TEXT NOT NULL,
+                spot_ncm TEXT,
+                error_code TEXT,
+                error_message TEXT,
+                fault_class TEXT,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                first_failed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_failed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        self._conn.commit()
+        # Every product that succeeds asks to be resolved; only these codes need a DELETE
+        self._codes = {code for code, in self._conn.execute("SELECT code FROM dead_letters")}
+        if self._codes:
+            logger.info(f"Loaded {len(self._codes)} dead letters from {path}")
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._codes
+
+    def get(self, code: str) -> Optional[DeadLetter]:
+        letters = self.letters([code])
+        return letters[0] if letters else None
+
+    def letters(self, codes: Optional[Iterable[str]] = None, max_attempts: Optional[int] = None) -> List[DeadLetter]:
+        """
+        Dead letters in the order they first failed, optionally only the given
+        codes and only those that failed fewer than `max_attempts` times.
+        """
+        self.commit()
+        query = ("SELECT code, name, action, update_date, payload, spot_ncm, error_code, error_message, "
+                 "fault_class, attempts, first_failed_at, last_failed_at FROM dead_letters")
+        letters = [DeadLetter(*row) for row in self._conn.execute(query + " ORDER BY first_failed_at, code")]
+        if codes is not None:
+            wanted = set(codes)
+            letters = [letter for letter in letters if letter.code in wanted]
+        if max_attempts is not None:
+            letters = [letter for letter in letters if letter.attempts < max_attempts]
+        return letters
+
+    def record(self, code: str, action: str, payload: Dict[str, Any], error_code: Optional[str],
+               error_message: Optional[str], fault_class: Optional[str] = None, name: Optional[str] = None,
+               update_date: Optional[str] = None, spot_ncm: Optional[str] = None) -> None:
+        """Stores (or refreshes) a failed product, counting one more failed attempt."""
+        self._conn.execute(
+            """
+            INSERT INTO dead_letters (code, name, action, update_date, payload, spot_ncm,
+                                      error_code, error_message, fault_class)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(code) DO UPDATE SET
+                name = excluded.name,
+                action = excluded.action,
+                update_date = excluded.update_date,
+                payload = excluded.payload,
+                spot_ncm = COALESCE(excluded.spot_ncm, dead_letters.spot_ncm),
+                error_code = excluded.error_code,
+                error_message = excluded.error_message,
+                fault_class = excluded.fault_class,
+                attempts = dead_letters.attempts + 1,
+                last_failed_at = CURRENT_TIMESTAMP
+            """,
+            (code, name, action, update_date, json.dumps(payload, ensure_ascii=False), spot_ncm,
+             error_code, error_message, fault_class),
+        )
+        self._codes.add(code)
+        self._written()
+
+    def resolve(self, code: str) -> None:
+        """Drops a product that has now been synced."""
+        if code not in self._codes:
+            return
+        self._conn.execute("DELETE FROM dead_letters WHERE code = ?", (code,))
+        self._codes.discard(code)
+        self._written()
+
+    def _written(self) -> None:
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self) -> None:
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self.commit()
+        self._conn.close()
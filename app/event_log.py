@@ -0,0 +1,120 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+# Keys whose values never reach a log line
+SECRET_KEYS = {"app_key", "app_secret", "token", "accesskey", "access_key", "password"}
+
+# Credentials in URLs and rendered payloads (e.g. urllib3's DEBUG request lines)
+_SECRET_PATTERN = re.compile(r"""(?i)(["']?(?:app_key|app_secret|token|accesskey)["']?\s*[=:]\s*["']?)[^&\s"',}]+""")
+
+# Attributes every LogRecord has; anything else on a record came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# Payload dumps: one in every `_payload_every` calls to log_payload() is rendered
+_payload_every = 100
+_payload_counter = itertools.count()
+
+
+class RedactingFilter(logging.Filter):
+    """Masks credentials in the rendered message; runs in the listener thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        masked = _SECRET_PATTERN.sub(r"\1***", message)
+        if masked != message:
+            record.msg, record.args = masked, None
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per line: ts, level, logger, msg, plus any `extra=` fields
+    (e.g. event, code) and the exception text when there is one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: Any = logging.INFO, json_lines: bool = False, stream=None,
+                      payload_sample_every: int = 100) -> logging.handlers.QueueListener:
+    """
+    Routes every log record through a QueueHandler: callers (the sync loop, client
+    threads) only enqueue the record, and a listener thread formats and writes it.
+    With `json_lines`, records are written as JSON lines (see JsonLinesFormatter).
+    Credentials are masked in every written line (see RedactingFilter).
+    `payload_sample_every` sets how many log_payload() calls share one dump.
+    Returns the started listener; it is stopped (and flushed) at exit.
+    """
+    global _payload_every
+    _payload_every = max(1, payload_sample_every)
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.addFilter(RedactingFilter())
+    handler.setFormatter(JsonLinesFormatter() if json_lines else
+                         logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener: logging.handlers.QueueListener) -> None:
+    try:
+        listener.stop()
+    except AttributeError:
+        # Already stopped by the caller
+        pass
+
+
+def redact(value: Any) -> Any:
+    """Copy of `value` with credentials (app_key, app_secret, token, ...) masked."""
+    if isinstance(value, dict):
+        return {k: "***" if str(k).lower() in SECRET_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, **fields: Any) -> bool:
+    """
+    Logs `payload` at DEBUG, redacted and rendered as JSON, for one in every
+    `payload_sample_every` calls. Nothing is serialized unless DEBUG is enabled
+    for `logger`. Returns True when the payload was logged.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    if next(_payload_counter) % _payload_every:
+        return False
+    logger.debug("%s: %s", message, json.dumps(redact(payload), ensure_ascii=False),
+                 extra={"event": "payload", **fields})
+    return True
@@ -0,0 +1,37 @@
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from typing import Optional, Tuple
+
+# (connect timeout, read timeout) in seconds, as accepted by requests
+Timeout = Tuple[float, float]
+
+DEFAULT_POOL_SIZE = 10
+
+
+class RequestCancelled(Exception):
+    """Raised by a client call started after the client was cancelled (the run is shutting down)."""
+
+
+def build_session(pool_maxsize: int = DEFAULT_POOL_SIZE, pool_connections: int = 2,
+                  adapter: Optional[BaseAdapter] = None) -> requests.Session:
+    """
+    Builds a requests.Session with a keep-alive connection pool.
+
+    `pool_maxsize` is the number of connections kept open per host; set it to at
+    least the number of threads sharing the session. Extra threads wait for a
+    free connection (pool_block) instead of opening throwaway ones.
+    `adapter` replaces the default transport (e.g. a cassette, see cassette.py).
+    """
+    session = requests.Session()
+    adapter = adapter or HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=max(1, pool_maxsize),
+        pool_block=True,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
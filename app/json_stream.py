@@ -0,0 +1,104 @@
+import codecs
+import json
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    """
+    Text buffer over an iterable of byte chunks. Consumed text is dropped every
+    time a new chunk is appended, so the buffer only ever holds the value being
+    decoded plus one chunk.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], encoding: str):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Appends the next chunk to the buffer; returns False once the stream is exhausted."""
+        if self.eof:
+            return False
+        text = ""
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                break
+        else:
+            text = self._decoder.decode(b"", final=True)
+            self.eof = True
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return bool(text) or not self.eof
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character ('' at end of stream)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def take(self, *expected: str) -> str:
+        char = self.peek()
+        if char not in expected:
+            found = repr(char) if char else "end of stream"
+            raise ValueError(f"Malformed JSON stream: expected one of {expected}, found {found}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decodes the next complete JSON value, reading more chunks as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number ending exactly at the buffer edge may continue in the next chunk
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(chunks: Iterable[bytes], key: str, meta: Optional[Dict[str, Any]] = None,
+                    encoding: str = "utf-8") -> Iterator[Any]:
+    """
+    Incrementally parses a JSON object like {"<key>": [item, item, ...], ...}
+    and yields the items of the `key` array one at a time.
+    Other top-level members are decoded into `meta` when a dict is given.
+    """
+    reader = _Reader(chunks, encoding)
+    reader.take("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        name = reader.value()
+        reader.take(":")
+        if name == key and reader.peek() == "[":
+            reader.take("[")
+            if reader.peek() == "]":
+                reader.take("]")
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.take(",", "]") == "]":
+                        break
+        else:
+            value = reader.value()
+            if meta is not None:
+                meta[name] = value
+
+        if reader.take(",", "}") == "}":
+            return
@@ -1,14 +1,70 @@
 import os
+import sys
 from dotenv import load_dotenv
-from product_sync import sync_products
-import logging
+from product_sync import sync_products, retry_failed
+from spot_mapper import load_ncm_corrections
+from event_log import configure_logging
 
-logging.basicConfig(level=logging.INFO)
 load_dotenv()
+# LOG_FORMAT=json writes one JSON event per line; payload dumps need LOG_LEVEL=DEBUG
+configure_logging(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    json_lines=os.getenv("LOG_FORMAT", "text").lower() == "json",
+    payload_sample_every=int(os.getenv("LOG_PAYLOAD_SAMPLE", "100")),
+)
 
 SPOT_ACCESS_KEY = os.getenv("SPOT_ACCESS_KEY")
 OMIE_APP_KEY = os.getenv("OMIE_APP_KEY")
 OMIE_APP_SECRET = os.getenv("OMIE_APP_SECRET")
+SPOT_TOKEN_CACHE = os.getenv("SPOT_TOKEN_CACHE")  # optional path to persist the SPOT session token
+# OMIE request rate: never above OMIE_MAX_RPS, starting at OMIE_START_RPS (default: the maximum)
+OMIE_MAX_RPS = float(os.getenv("OMIE_MAX_RPS", "4"))
+OMIE_START_RPS = float(os.getenv("OMIE_START_RPS")) if os.getenv("OMIE_START_RPS") else None
+SYNC_STATE_DB = os.getenv("SYNC_STATE_DB", "sync_state.db")  # delta-sync state
+# Local OMIE code index; its own file, since the state store batches its writes in one long transaction
+SYNC_INDEX_DB = os.getenv("SYNC_INDEX_DB", "omie_index.db")
+SYNC_JOURNAL = os.getenv("SYNC_JOURNAL", "sync_journal.jsonl")  # per-product outcomes of the current run
+NCM_TABLE = os.getenv("NCM_TABLE")  # optional table of valid NCM codes (Siscomex JSON, CSV or one per line)
+SYNC_METRICS = os.getenv("SYNC_METRICS")  # optional metrics report: *.prom (Prometheus textfile) or JSON
+# Optional cassette: replay (the default, as in sync_products) serves a run from it,
+# SYNC_CASSETTE_MODE=record captures all SPOT/OMIE traffic to it
+SYNC_CASSETTE = os.getenv("SYNC_CASSETTE")
+SYNC_CASSETTE_MODE = os.getenv("SYNC_CASSETTE_MODE", "replay")
+SYNC_REPLAY_LATENCY = float(os.getenv("SYNC_REPLAY_LATENCY", "0"))  # 1 = recorded response times
+SYNC_VARIANTS = os.getenv("SYNC_VARIANTS", "0") == "1"  # one OMIE item per SPOT SKU (color) instead of per product
+SYNC_DEAD_LETTERS = os.getenv("SYNC_DEAD_LETTERS", "dead_letters.db")  # failed products kept for retry-failed
+# Snapshots of each kind kept in snapshots/, about a month of hourly runs (0 keeps them all)
+SYNC_SNAPSHOT_KEEP = int(os.getenv("SYNC_SNAPSHOT_KEEP", "720")) or None
+NCM_CORRECTIONS = os.getenv("NCM_CORRECTIONS")  # optional extra NCM corrections (JSON object or CSV wrong,right)
+# retry-failed skips products that already failed this many times (unset = retry all)
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS")) if os.getenv("RETRY_MAX_ATTEMPTS") else None
+
+# `python app/main.py resume` continues an interrupted run from its journal
+RESUME = "resume" in sys.argv[1:]
+# `python app/main.py retry-failed [--remap-ncm] [CODE ...]` resubmits only the failed products
+RETRY_FAILED = "retry-failed" in sys.argv[1:]
+
+if NCM_CORRECTIONS:
+    load_ncm_corrections(NCM_CORRECTIONS)
+
+if RETRY_FAILED:
+    codes = [arg for arg in sys.argv[1:] if arg != "retry-failed" and not arg.startswith("--")]
+    retry_failed(
+        omie_app_key=OMIE_APP_KEY,
+        omie_app_secret=OMIE_APP_SECRET,
+        dead_letter_path=SYNC_DEAD_LETTERS,
+        codes=codes or None,
+        max_attempts=RETRY_MAX_ATTEMPTS,
+        # New corrections only help products mapped before they existed
+        remap_ncm="--remap-ncm" in sys.argv[1:] or bool(NCM_CORRECTIONS),
+        ncm_table_path=NCM_TABLE,
+        state_path=SYNC_STATE_DB,
+        index_path=SYNC_INDEX_DB,
+        max_rps=OMIE_MAX_RPS,
+        start_rps=OMIE_START_RPS,
+        snapshot_keep=SYNC_SNAPSHOT_KEEP,
+    )
+    sys.exit(0)
 
 # ⚠️ Real sync: no preview, no dry-run
 sync_products(
@@ -16,5 +72,22 @@ sync_products(
     omie_app_key=OMIE_APP_KEY,
     omie_app_secret=OMIE_APP_SECRET,
     dry_run=False,
-    preview_count=None
+    preview_count=None,
+    max_rps=OMIE_MAX_RPS,
+    start_rps=OMIE_START_RPS,
+    token_cache_path=SPOT_TOKEN_CACHE,
+    stream=True,
+    state_path=SYNC_STATE_DB,
+    index_path=SYNC_INDEX_DB,
+    update_existing=True,
+    ncm_table_path=NCM_TABLE,
+    journal_path=SYNC_JOURNAL,
+    resume=RESUME,
+    snapshot_keep=SYNC_SNAPSHOT_KEEP,
+    metrics_path=SYNC_METRICS,
+    cassette_path=SYNC_CASSETTE,
+    cassette_mode=SYNC_CASSETTE_MODE,
+    replay_latency=SYNC_REPLAY_LATENCY,
+    variants=SYNC_VARIANTS,
+    dead_letter_path=SYNC_DEAD_LETTERS
 )
@@ -0,0 +1,185 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+# Every exported metric name starts with this
+PREFIX = "spot_omie_"
+
+# Upper bounds (seconds) for API call and phase latencies
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Upper bounds (seconds) for per-product CPU work such as mapping
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as exported to Prometheus."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> Iterator[Tuple[float, int]]:
+        """(upper bound, observations <= bound) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+        yield math.inf, self.count
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and latency histograms for one
+    sync run, shared by the clients (their threads record API calls, retries
+    and faults) and the sync pipeline (phases and outcomes).
+
+    Metrics are identified by name plus labels, e.g.
+    observe("omie_request_seconds", 0.4, call="IncluirProduto").
+    write() saves them as a Prometheus textfile (.prom) or a JSON report.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def observe(self, name: str, value: float, buckets: Optional[Sequence[float]] = None, **labels: Any) -> None:
+        """Adds one observation; the first one of a name fixes its buckets."""
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                first = next(iter(series.values()), None)
+                histogram = series[key] = Histogram(first.buckets if first else buckets or self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, buckets: Optional[Sequence[float]] = None, **labels: Any) -> Iterator[None]:
+        """Observes the wall time of the with-block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, buckets=buckets, **labels)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def gauge(self, name: str, **labels: Any) -> Optional[float]:
+        with self._lock:
+            return self._gauges.get(name, {}).get(_labels(labels))
+
+    def histogram(self, name: str, **labels: Any) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get(name, {}).get(_labels(labels))
+
+    def as_dict(self) -> Dict[str, Any]:
+        """JSON report: {"counters": ..., "gauges": ..., "histograms": ...}, one entry per series."""
+        with self._lock:
+            def plain(families):
+                return {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                        for name, series in families.items()}
+
+            return {
+                "counters": plain(self._counters),
+                "gauges": plain(self._gauges),
+                "histograms": {
+                    name: [{
+                        "labels": dict(key),
+                        "count": h.count,
+                        "sum": h.sum,
+                        "buckets": {_bound(bound): count for bound, count in h.cumulative()},
+                    } for key, h in series.items()]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (as read by node_exporter's textfile collector)."""
+        lines = []
+        with self._lock:
+            for kind, families in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(families.items()):
+                    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                    for key, value in series.items():
+                        lines.append(f"{PREFIX}{name}{_render_labels(key)} {_number(value)}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for key, h in series.items():
+                    for bound, count in h.cumulative():
+                        lines.append(f"{PREFIX}{name}_bucket{_render_labels(key + (('le', _bound(bound)),))} {count}")
+                    lines.append(f"{PREFIX}{name}_sum{_render_labels(key)} {_number(h.sum)}")
+                    lines.append(f"{PREFIX}{name}_count{_render_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> str:
+        """
+        Writes the report to `path`: Prometheus text when it ends with .prom,
+        JSON otherwise. The file is replaced atomically so a collector never
+        reads half of it. Returns `path`.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.endswith(".prom"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.as_dict(), indent=2, ensure_ascii=False)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        return path
+
+
+def _bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else _number(bound)
+
+
+def _number(value: float) -> str:
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _render_labels(key: Labels) -> str:
+    if not key:
+        return ""
+    rendered = ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in key
+    )
+    return "{" + rendered + "}"
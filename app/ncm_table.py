@@ -0,0 +1,76 @@
+import csv
+import json
+import logging
+from typing import Iterable, Optional, Set
+
+from spot_mapper import fix_ncm
+
+logger = logging.getLogger(__name__)
+
+
+def _digits(code) -> str:
+    return "".join(ch for ch in str(code) if ch.isdigit())
+
+
+class NcmTable:
+    """
+    Local pre-flight check for NCM codes, so products OMIE would reject with
+    "NCM não cadastrada" are caught before any request is sent.
+
+    With a table of valid codes loaded (see load()), any code outside it is
+    rejected. Without one, only codes OMIE already refused during this run
+    (see reject()) are rejected.
+    """
+
+    def __init__(self, codes: Iterable[str] = ()):
+        self._valid: Set[str] = {_digits(code) for code in codes if len(_digits(code)) == 8}
+        self._rejected: Set[str] = set()
+
+    @classmethod
+    def load(cls, path: str) -> "NcmTable":
+        """
+        Loads valid codes from the Siscomex NCM JSON export ({"Nomenclaturas": [{"Codigo": ...}]}),
+        a CSV with an "ncm"/"Codigo" column, or a plain list with one code per line.
+        Only full 8-digit codes are kept; chapter and heading rows are ignored.
+        """
+        with open(path, encoding="utf-8-sig") as f:
+            if path.lower().endswith(".json"):
+                data = json.load(f)
+                rows = data.get("Nomenclaturas", []) if isinstance(data, dict) else data
+                codes = [row.get("Codigo", "") if isinstance(row, dict) else row for row in rows]
+            else:
+                reader = csv.reader(f, delimiter=";" if ";" in f.readline() else ",")
+                f.seek(0)
+                rows = list(reader)
+                header = [name.strip().lower() for name in rows[0]] if rows else []
+                column = next((header.index(name) for name in ("ncm", "codigo") if name in header), None)
+                if column is None:
+                    codes = [row[0] for row in rows if row]
+                else:
+                    codes = [row[column] for row in rows[1:] if len(row) > column]
+
+        table = cls(codes)
+        logger.info(f"Loaded {len(table)} valid NCM codes from {path}")
+        return table
+
+    def __len__(self) -> int:
+        return len(self._valid)
+
+    def __contains__(self, ncm: Optional[str]) -> bool:
+        return self.accepts(ncm)
+
+    def accepts(self, ncm: Optional[str]) -> bool:
+        """
+        False when a product with this NCM is certain to be rejected by OMIE.
+        The code is normalized and corrected with fix_ncm before the lookup.
+        """
+        if not ncm:
+            # Left for OMIE to judge unless a full table says otherwise
+            return not self._valid
+        code = _digits(fix_ncm(ncm))
+        return code not in self._rejected and (not self._valid or code in self._valid)
+
+    def reject(self, ncm: Optional[str]) -> None:
+        """Remembers a code OMIE refused so later products using it fail locally."""
+        if ncm:
+            self._rejected.add(_digits(fix_ncm(ncm)))
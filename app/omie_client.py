@@ -1,34 +1,162 @@
 import requests
 import logging
-from typing import List, Dict, Any, Optional
+import time
+import itertools
+import threading
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple
 from tenacity import (
     retry,
     stop_after_attempt,
     wait_exponential,
-    retry_if_exception_type,
+    wait_random,
     before_sleep_log,
 )
+from rate_limiter import AdaptiveRateLimiter
+from http_session import build_session, Timeout, DEFAULT_POOL_SIZE, RequestCancelled
+from event_log import log_payload
+from metrics import Metrics
+from omie_faults import (
+    RETRYABLE,
+    THROTTLE_MARKERS,
+    CircuitBreaker,
+    RetryBudget,
+    classify_fault,
+    is_empty_listing_fault,
+    is_throttle_fault,
+)
 
 logger = logging.getLogger(__name__)
 
-# Retry configuration for transient network errors
+_log_retry = before_sleep_log(logger, logging.WARNING)
+
+
+def _before_retry_sleep(retry_state) -> None:
+    """Logs a retried _make_request and counts the retry and its backoff in the client's metrics."""
+    _log_retry(retry_state)
+    client, payload = (list(retry_state.args) + [None, None])[:2]
+    metrics = getattr(client, "metrics", None)
+    if not isinstance(metrics, Metrics):
+        return
+    call = (payload or retry_state.kwargs.get("payload") or {}).get("call", "")
+    error = type(retry_state.outcome.exception()).__name__
+    metrics.inc("omie_retries_total", call=call, error=error)
+    metrics.inc("omie_backoff_seconds_total", retry_state.next_action.sleep, call=call)
+
+
+# Network errors worth sending the same request again for
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def _should_retry(retry_state) -> bool:
+    """Retries transient network errors while the client's run-wide retry budget lasts."""
+    error = retry_state.outcome.exception()
+    if not isinstance(error, TRANSIENT_ERRORS):
+        return False
+    client = retry_state.args[0] if retry_state.args else None
+    budget = getattr(client, "retry_budget", None)
+    if budget is not None and not budget.spend():
+        logger.warning(f"⚠️ OMIE retry budget exhausted, not retrying {type(error).__name__}")
+        if isinstance(getattr(client, "metrics", None), Metrics):
+            client.metrics.inc("omie_retry_budget_exhausted_total")
+        return False
+    return True
+
+
+# Retry configuration for transient network errors. Waits stay short (a jittered
+# 0.5s, 1s, 2s, 4s): a longer outage opens the client's circuit breaker, which
+# pauses every call at once instead of each request sleeping on its own.
 RETRY_CONFIG = {
     "stop": stop_after_attempt(5),  # Max 5 attempts
-    "wait": wait_exponential(multiplier=1, min=2, max=30),  # 2s, 4s, 8s, 16s, 30s
-    "retry": retry_if_exception_type((
-        requests.exceptions.ConnectionError,
-        requests.exceptions.Timeout,
-        requests.exceptions.ChunkedEncodingError,
-    )),
-    "before_sleep": before_sleep_log(logger, logging.WARNING),
+    "wait": wait_exponential(multiplier=0.5, min=0.5, max=8) + wait_random(0, 0.5),
+    "retry": _should_retry,
+    "before_sleep": _before_retry_sleep,
     "reraise": True,
 }
 
+# Product API endpoint; every call is a POST with {"call": ..., "param": [...]}
+DEFAULT_URL = "https://app.omie.com.br/api/v1/geral/produtos/"
+
+# Retryable faults (see omie_faults.classify_fault) are sent again up to this many times in all.
+# "Consumo redundante" is not among them: OMIE blocks the call for about a minute, far
+# longer than this backoff, so the product is left for the next run or retry-failed.
+FAULT_RETRY_ATTEMPTS = 3
+# Backoff before resending a retryable fault: 1s, 2s, 4s... capped
+FAULT_RETRY_WAIT = 1.0
+FAULT_RETRY_MAX_WAIT = 8.0
+
+# (connect, read) timeouts per OMIE call; calls not listed use DEFAULT_TIMEOUT
+DEFAULT_TIMEOUT: Timeout = (5, 60)
+DEFAULT_TIMEOUTS: Dict[str, Timeout] = {
+    "ListarProdutos": (5, 60),
+    "IncluirProduto": (5, 30),
+}
+
+# Allowed values for registros_por_pagina when tuning; each one divides the larger ones
+# so a page fetched at a bigger size maps exactly onto whole pages of a smaller size.
+PAGE_SIZE_LADDER = (500, 250, 50)
+
+# OMIE accepts at most 50 products per *PorLote call
+MAX_LOT_SIZE = 50
+
+
+class IncompleteListingError(Exception):
+    """
+    Raised by a parallel listing when some pages are still missing after all retries.
+    Carries the products that were fetched and the page numbers that were not.
+    """
+
+    def __init__(self, products: List[Dict[str, Any]], missing_pages: List[int]):
+        super().__init__(f"OMIE listing incomplete, missing pages: {missing_pages}")
+        self.products = products
+        self.missing_pages = missing_pages
+
+
 class OmieClient:
-    def __init__(self, app_key: str, app_secret: str):
+    def __init__(self, app_key: str, app_secret: str, rate_limit: Optional[float] = None,
+                 max_rate_limit: float = 4.0, min_rate_limit: float = 0.2,
+                 session: Optional[requests.Session] = None, pool_maxsize: int = DEFAULT_POOL_SIZE,
+                 timeouts: Optional[Dict[str, Timeout]] = None, metrics: Optional[Metrics] = None,
+                 url: str = DEFAULT_URL, retry_budget: Optional[RetryBudget] = None,
+                 breaker: Optional[CircuitBreaker] = None):
         self.app_key = app_key
         self.app_secret = app_secret
-        self.url = "https://app.omie.com.br/api/v1/geral/produtos/"
+        self.url = url
+        # Keep-alive pool shared by all threads; size it to the number of concurrent callers
+        self.session = session or build_session(pool_maxsize=pool_maxsize)
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        # Shared by every call made through this client (and every thread using it).
+        # Starts at `rate_limit` (the ceiling when not given) and backs off when OMIE throttles.
+        self.rate_limiter = AdaptiveRateLimiter(
+            rate=min(rate_limit or max_rate_limit, max_rate_limit),
+            min_rate=min_rate_limit,
+            max_rate=max_rate_limit,
+            burst=2,
+        )
+        # registros_por_pagina for listings; lowered automatically when pages are slow
+        self.page_size = PAGE_SIZE_LADDER[0]
+        self._lot_numbers = itertools.count(1)
+        # Set by cancel(); requests not yet sent fail fast with RequestCancelled
+        self.cancelled = threading.Event()
+        # Request latencies, throttles, retries and faults per OMIE call
+        self.metrics = metrics or Metrics()
+        # Retries of network errors and retryable faults, for the whole run (every thread)
+        self.retry_budget = retry_budget or RetryBudget()
+        # Pauses all calls together while OMIE keeps failing
+        self.breaker = breaker or CircuitBreaker()
+
+    def cancel(self) -> None:
+        """Stops this client's pending work: every later request raises RequestCancelled."""
+        self.cancelled.set()
+
+    def _check_cancelled(self) -> None:
+        if self.cancelled.is_set():
+            raise RequestCancelled("OMIE client was cancelled")
 
     def _build_headers(self) -> Dict[str, str]:
         return {"Content-Type": "application/json"}
@@ -36,49 +164,145 @@ class OmieClient:
     def _build_auth_payload(self) -> Dict[str, str]:
         return {"app_key": self.app_key, "app_secret": self.app_secret}
 
+    @staticmethod
+    def _is_throttled(response: requests.Response) -> bool:
+        """
+        Detects OMIE quota faults (HTTP 429 or "consumo redundante"-style fault bodies).
+        """
+        if response.status_code == 429:
+            return True
+        if response.status_code < 400:
+            return False
+        body = response.text
+        if not isinstance(body, str):
+            return False
+        body = body.lower()
+        return any(marker in body for marker in THROTTLE_MARKERS)
+
+    @staticmethod
+    def _is_server_fault(response: requests.Response) -> bool:
+        """
+        True for HTTP 5xx answers that mean OMIE itself is struggling: non-fault
+        bodies and retryable faults. OMIE sends every fault with HTTP 500, so
+        product faults (NCM, duplicates...) don't count.
+        """
+        if response.status_code < 500:
+            return False
+        try:
+            body = response.json()
+        except ValueError:
+            return True
+        if not isinstance(body, dict) or not (body.get("faultcode") or body.get("faultstring")):
+            return True
+        return classify_fault(body) == RETRYABLE
+
+    def _record_health(self, call: str, healthy: bool) -> None:
+        if healthy:
+            self.breaker.record_success()
+        elif self.breaker.record_failure():
+            self.metrics.inc("omie_circuit_opened_total", call=call)
+
     @retry(**RETRY_CONFIG)
     def _make_request(self, payload: Dict[str, Any]) -> requests.Response:
         """
         Makes a POST request to OMIE API with automatic retry on transient failures.
-        Retries up to 5 times with exponential backoff (2s, 4s, 8s, 16s, 30s).
+        Retries up to 5 times with short exponential backoff, while the run's retry
+        budget lasts. Every attempt waits for the circuit breaker to be closed and
+        draws a token from the client's adaptive rate limiter.
         """
-        response = requests.post(
-            self.url,
-            json=payload,
-            headers=self._build_headers(),
-            timeout=60  # 60 second timeout
-        )
+        call = payload.get("call")
+        self._check_cancelled()
+        waited = self.breaker.acquire(self.cancelled)
+        if waited:
+            self.metrics.inc("omie_circuit_wait_seconds_total", waited, call=call)
+        self.metrics.inc("omie_rate_limit_wait_seconds_total", self.rate_limiter.acquire(), call=call)
+        # The wait for a token can be long; don't send anything once cancelled
+        self._check_cancelled()
+        try:
+            with self.metrics.timer("omie_request_seconds", call=call):
+                response = self.session.post(
+                    self.url,
+                    json=payload,
+                    headers=self._build_headers(),
+                    timeout=self.timeouts.get(call, DEFAULT_TIMEOUT)
+                )
+        except TRANSIENT_ERRORS:
+            self._record_health(call, healthy=False)
+            raise
+        self.metrics.inc("omie_requests_total", call=call, status=response.status_code)
+
+        if self._is_throttled(response):
+            self.metrics.inc("omie_throttled_total", call=call)
+            self.rate_limiter.penalize()
+            self._record_health(call, healthy=False)
+        else:
+            if response.status_code < 400:
+                self.rate_limiter.reward()
+            self._record_health(call, healthy=not self._is_server_fault(response))
+
         return response
 
-    def list_products(self, page: int = 1, page_size: int = 500) -> List[Dict[str, Any]]:
+    def _build_list_payload(self, page: int, page_size: int,
+                            filters: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        return {
+            **self._build_auth_payload(),
+            "call": "ListarProdutos",
+            "param": [{
+                "pagina": page,
+                "registros_por_pagina": page_size,
+                "apenas_importado_api": "S",
+                "filtrar_apenas_omiepdv": "N",
+                **(filters or {})
+            }]
+        }
+
+    def _fetch_page(self, page: int, page_size: int, filters: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Fetches one ListarProdutos page. OMIE answers an empty listing (no products
+        yet, or no changes since `filtrar_por_data_de`) with an HTTP 500 fault; that
+        comes back as an empty last page instead of an error.
+        """
+        response = self._make_request(self._build_list_payload(page, page_size, filters))
+        if response.status_code >= 400:
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            if isinstance(body, dict) and is_empty_listing_fault(body):
+                logger.info(f"No OMIE products on ListarProdutos page {page}.")
+                return {"pagina": page, "total_de_paginas": page, "total_de_registros": 0,
+                        "produto_servico_cadastro": []}
+        response.raise_for_status()
+        return response.json()
+
+    def list_products(self, page: int = 1, page_size: Optional[int] = None, workers: int = 1,
+                      page_retries: int = 2, target_page_latency: float = 15.0,
+                      changed_since: Optional[date] = None) -> List[Dict[str, Any]]:
         """
         Lists products from OMIE in a paginated manner.
+        With workers > 1, pages are fetched concurrently (see _list_products_parallel).
+        With `changed_since`, only products included or changed on or after that date are listed.
         """
+        page_size = page_size or self.page_size
+        filters = None
+        if changed_since is not None:
+            filters = {"filtrar_por_data_de": changed_since.strftime("%d/%m/%Y")}
+
+        if workers > 1:
+            return self._list_products_parallel(page_size, workers, page_retries, target_page_latency, filters)
+
         all_products = []
 
         while True:
-            payload = {
-                **self._build_auth_payload(),
-                "call": "ListarProdutos",
-                "param": [{
-                    "pagina": page,
-                    "registros_por_pagina": page_size,
-                    "apenas_importado_api": "S",
-                    "filtrar_apenas_omiepdv": "N"
-                }]
-            }
-
             try:
-                response = self._make_request(payload)
-                response.raise_for_status()
-                data = response.json()
+                data = self._fetch_page(page, page_size, filters)
                 products = data.get("produto_servico_cadastro", [])
 
                 if not products:
-                    logging.warning(f"No products found on page {page}.")
+                    logger.warning(f"No products found on page {page}.")
                 else:
-                    logging.debug(f"Page {page} - First product: {products[0]}")
-                    logging.debug(f"Page {page} - Number of products: {len(products)}")
+                    logger.debug("Page %s - First product: %s", page, products[0])
+                    logger.debug("Page %s - Number of products: %s", page, len(products))
 
                 all_products.extend(products)
 
@@ -88,46 +312,146 @@ class OmieClient:
                 page += 1
 
             except requests.exceptions.ConnectionError as e:
-                logging.error(f"Connection error on ListarProdutos (page {page}) after all retries: {e}")
-                logging.warning(f"Skipping remaining pages due to connection error on page {page}")
+                logger.error(f"Connection error on ListarProdutos (page {page}) after all retries: {e}")
+                logger.warning(f"Skipping remaining pages due to connection error on page {page}")
                 break
             except requests.HTTPError as e:
-                logging.error(f"OMIE error on ListarProdutos (page {page}): {e}")
-                logging.error(f"OMIE response:\n{response.text}")
-                logging.warning(f"Skipping remaining pages due to error on page {page}")
+                logger.error(f"OMIE error on ListarProdutos (page {page}): {e}")
+                if e.response is not None:
+                    logger.error(f"OMIE response:\n{e.response.text}")
+                logger.warning(f"Skipping remaining pages due to error on page {page}")
                 break
 
-        logging.info(f"Fetched {len(all_products)} products from OMIE.")
+        logger.info(f"Fetched {len(all_products)} products from OMIE.")
         return all_products
-    def insert_product(self, product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+
+    def _tune_page_size(self, page_size: int, latency: float, target_page_latency: float) -> int:
         """
-        Inserts a new product into OMIE, with detailed error logging.
+        Picks the largest ladder size that divides `page_size` and whose estimated
+        latency (from the observed per-record latency) fits `target_page_latency`.
+        """
+        if latency <= target_page_latency:
+            return page_size
+
+        per_record = latency / page_size
+        candidates = [size for size in PAGE_SIZE_LADDER if size < page_size and page_size % size == 0]
+        for size in candidates:
+            if size * per_record <= target_page_latency:
+                return size
+        return candidates[-1] if candidates else page_size
+
+    def _list_products_parallel(self, page_size: int, workers: int, page_retries: int,
+                                target_page_latency: float,
+                                filters: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
         """
+        Reads total_de_paginas from page 1, then fetches the other pages concurrently.
+        Failed pages are retried on their own; pages still missing after `page_retries`
+        rounds raise IncompleteListingError instead of silently shrinking the result.
+        """
+        first = None
+        for attempt in range(page_retries + 1):
+            started = time.monotonic()
+            try:
+                first = self._fetch_page(1, page_size, filters)
+                break
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.error(f"OMIE error on ListarProdutos (page 1, attempt {attempt + 1}): {e}")
+        if first is None:
+            raise IncompleteListingError([], [1])
+
+        latency = time.monotonic() - started
+        first_products = first.get("produto_servico_cadastro", [])
+        total_pages = first.get("total_de_paginas", 1)
+        total_records = first.get("total_de_registros")
+
+        tuned = self._tune_page_size(page_size, latency, target_page_latency)
+        first_page = 2
+        if tuned != page_size and total_records:
+            logger.info(f"Page 1 took {latency:.1f}s, lowering registros_por_pagina {page_size} → {tuned}")
+            # Page 1 at the old size already covers the first page_size // tuned pages at the new size
+            first_page = page_size // tuned + 1
+            total_pages = -(-total_records // tuned)
+            page_size = tuned
+        self.page_size = tuned
+
+        results: Dict[int, List[Dict[str, Any]]] = {}
+        pending = list(range(first_page, total_pages + 1))
+
+        for attempt in range(page_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                logger.warning(f"Retrying {len(pending)} failed ListarProdutos page(s): {pending}")
+
+            failed = []
+            with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+                futures = {executor.submit(self._fetch_page, p, page_size, filters): p for p in pending}
+                for future in as_completed(futures):
+                    p = futures[future]
+                    try:
+                        results[p] = future.result().get("produto_servico_cadastro", [])
+                    except (requests.exceptions.RequestException, ValueError) as e:
+                        logger.error(f"OMIE error on ListarProdutos (page {p}): {e}")
+                        failed.append(p)
+            pending = sorted(failed)
+
+        all_products = list(first_products)
+        for p in sorted(results):
+            all_products.extend(results[p])
+
+        if pending:
+            logger.error(f"OMIE listing incomplete after {page_retries} retries, missing pages: {pending}")
+            raise IncompleteListingError(all_products, pending)
+
+        logger.info(f"Fetched {len(all_products)} products from OMIE ({total_pages} pages, {workers} workers).")
+        return all_products
+
+    def _call_product_api(self, call: str, param: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Sends one product API call and returns the parsed response.
+        OMIE faults (even with HTTP 500) are returned as dicts so the caller can handle them.
+        Retryable faults (throttling, OMIE busy; see classify_fault) are sent again up to
+        FAULT_RETRY_ATTEMPTS times with a short backoff, while the retry budget lasts.
+        """
+        for attempt in itertools.count(1):
+            result = self._send_product_call(call, param)
+            if not (isinstance(result, dict) and (result.get("faultstring") or result.get("faultcode"))):
+                return result
+            if classify_fault(result) != RETRYABLE or attempt >= FAULT_RETRY_ATTEMPTS:
+                return result
+            if not self.retry_budget.spend():
+                logger.warning(f"⚠️ OMIE retry budget exhausted, giving up on {call}")
+                self.metrics.inc("omie_retry_budget_exhausted_total")
+                return result
+            delay = min(FAULT_RETRY_MAX_WAIT, FAULT_RETRY_WAIT * 2 ** (attempt - 1))
+            logger.warning(f"🔁 Retrying {call} in {delay:g}s after OMIE fault: {result.get('faultstring')}")
+            self.metrics.inc("omie_retries_total", call=call, error="fault")
+            self.metrics.inc("omie_backoff_seconds_total", delay, call=call)
+            if self.cancelled.wait(delay):
+                return result
+
+    def _send_product_call(self, call: str, param: Dict[str, Any]) -> Dict[str, Any]:
         payload = {
             **self._build_auth_payload(),
-            "call": "IncluirProduto",
-            "param": [product]
+            "call": call,
+            "param": [param]
         }
 
-        # 🔍 Log the outgoing payload
-        import pprint
-        logger.info("Sending product to OMIE:")
-        pprint.pprint(payload)
-
         try:
             response = self._make_request(payload)
-            
+
             # Parse JSON response first to check for OMIE application errors
             result = response.json()
-            
+
             # Check if OMIE returned a fault (even with HTTP 500)
             if result.get("faultstring") or result.get("faultcode"):
-                logger.warning(f"OMIE application error: {result.get('faultstring', 'Unknown error')}")
+                self.metrics.inc("omie_faults_total", call=call, faultcode=result.get("faultcode", ""))
+                logger.warning(f"OMIE application error on {call}: {result.get('faultstring', 'Unknown error')}")
                 return result  # Return the error dict so caller can handle it
-            
+
             # Only raise for HTTP errors if it's not an OMIE fault response
             response.raise_for_status()
-            
+
         except requests.exceptions.ConnectionError as e:
             logger.error(f"Connection error while calling OMIE after all retries: {e}")
             raise
@@ -142,5 +466,101 @@ class OmieClient:
             response.raise_for_status()
             raise
 
+        return result
+
+    def insert_product(self, product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Inserts a new product into OMIE, with detailed error logging.
+        """
+        # 🔍 Log the outgoing payload (DEBUG only, sampled, without credentials)
+        log_payload(logger, "Sending product to OMIE", {"call": "IncluirProduto", "param": [product]},
+                    code=product.get("codigo_produto_integracao"))
+
+        result = self._call_product_api("IncluirProduto", product)
+        if result.get("faultstring") or result.get("faultcode"):
+            return result
+
         logger.info(f"✅ Inserted product with integration code: {product.get('codigo_produto_integracao')}")
-        return result
\ No newline at end of file
+        return result
+
+    def update_product(self, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Updates an existing OMIE product (AlterarProduto). `changes` must identify the
+        product (codigo_produto_integracao or codigo_produto) and may carry only the
+        fields that changed.
+        """
+        result = self._call_product_api("AlterarProduto", changes)
+        if not (result.get("faultstring") or result.get("faultcode")):
+            logger.info(f"✅ Updated product {changes.get('codigo_produto_integracao')}: "
+                        f"{sorted(k for k in changes if k != 'codigo_produto_integracao')}")
+        return result
+
+    def upsert_product(self, product: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Inserts or replaces a product by codigo_produto_integracao (UpsertProduto).
+        """
+        return self._call_product_api("UpsertProduto", product)
+
+    def get_product(self, integration_code: str) -> Dict[str, Any]:
+        """
+        Fetches the current OMIE record of a product (ConsultarProduto).
+        """
+        return self._call_product_api("ConsultarProduto", {"codigo_produto_integracao": integration_code})
+
+    def _submit_lot(self, call: str, item_call: str, lot: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Sends one *PorLote call. OMIE answers a lot as a whole, so when the lot is
+        rejected its products are resubmitted one by one with `item_call` to find
+        out which of them failed. A lot refused because OMIE is throttling or busy
+        (already retried as a whole by _call_product_api) is not split: every
+        product gets that fault instead of one more request each.
+        """
+        lot_number = next(self._lot_numbers)
+        result = self._call_product_api(call, {"lote": lot_number, "produto_servico_cadastro": lot})
+
+        fault = result.get("faultstring") or result.get("faultcode")
+        if fault and (is_throttle_fault(result) or classify_fault(result) == RETRYABLE):
+            logger.warning(f"{call} lot {lot_number} refused ({result.get('faultstring')}), "
+                           f"not resubmitting its {len(lot)} products now")
+            return [(p.get("codigo_produto_integracao"), dict(result)) for p in lot]
+
+        if fault or str(result.get("codigo_status", "0")) != "0":
+            reason = result.get("faultstring") or result.get("descricao_status")
+            logger.warning(f"{call} lot {lot_number} rejected ({reason}), resubmitting {len(lot)} products one by one")
+            return [(p.get("codigo_produto_integracao"), self._call_product_api(item_call, p)) for p in lot]
+
+        logger.info(f"✅ {call} lot {lot_number} accepted ({len(lot)} products)")
+        return [
+            (p.get("codigo_produto_integracao"), {
+                "codigo_produto_integracao": p.get("codigo_produto_integracao"),
+                "codigo_status": result.get("codigo_status", "0"),
+                "descricao_status": result.get("descricao_status"),
+                "lote": lot_number,
+            })
+            for p in lot
+        ]
+
+    def _submit_in_lots(self, call: str, item_call: str, products: List[Dict[str, Any]],
+                        lot_size: int) -> List[Tuple[str, Dict[str, Any]]]:
+        lot_size = max(1, min(lot_size, MAX_LOT_SIZE))
+        results = []
+        for start in range(0, len(products), lot_size):
+            results.extend(self._submit_lot(call, item_call, products[start:start + lot_size]))
+        return results
+
+    def insert_products_batch(self, products: List[Dict[str, Any]],
+                              lot_size: int = MAX_LOT_SIZE) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Inserts products with IncluirProdutosPorLote, `lot_size` products per call.
+        Returns one (codigo_produto_integracao, result) pair per product, in input order;
+        a result carrying faultcode/faultstring means that product failed.
+        """
+        return self._submit_in_lots("IncluirProdutosPorLote", "IncluirProduto", products, lot_size)
+
+    def upsert_products_batch(self, products: List[Dict[str, Any]],
+                              lot_size: int = MAX_LOT_SIZE) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Inserts or replaces products with UpsertProdutosPorLote; same result shape
+        as insert_products_batch.
+        """
+        return self._submit_in_lots("UpsertProdutosPorLote", "UpsertProduto", products, lot_size)
@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# What to do with an OMIE fault (see classify_fault)
+RETRYABLE = "retryable"   # OMIE is busy or throttling: the same call may succeed shortly
+SKIPPABLE = "skippable"   # something wrong with this one product: record it and go on
+FATAL = "fatal"           # credentials, account or API misuse: every later call would fail too
+
+# Fragments of OMIE fault messages that mean "slow down" rather than a real error
+THROTTLE_MARKERS = (
+    "consumo redundante",
+    "consumo indevido",
+    "bloqueada",
+    "limite de requisi",
+    "too many requests",
+)
+
+# OMIE blocks a call identical to a recent one for about 60s; resending it within
+# a few seconds only meets the same block, so such a product waits for the next run
+REDUNDANT_MARKERS = (
+    "consumo redundante",
+)
+
+# Fragments of fault messages OMIE sends while it is overloaded or restarting
+BUSY_MARKERS = (
+    "tente novamente",
+    "indisponível",
+    "sobrecarregad",
+    "tempo limite",
+    "timeout",
+    "erro interno",
+    "internal server error",
+    "broken response",
+)
+
+# Fragments of the fault ListarProdutos answers (HTTP 500, SOAP-ENV:Client-5113) when a page,
+# or a filtered window such as filtrar_por_data_de, has no records at all
+EMPTY_LISTING_MARKERS = (
+    "não existem registros",
+)
+
+# Fragments of fault messages about the product itself (its NCM, a duplicate, a missing record)
+PRODUCT_MARKERS = (
+    "ncm não cadastrada",
+    "ncm inválid",
+    "já cadastrad",
+    "já existe",
+    "duplicad",
+    "duplicate",
+    "produto não encontrado",
+)
+
+
+def is_throttle_fault(fault: Dict[str, Any]) -> bool:
+    """True when OMIE refused the call to slow us down (rate limit, redundant consumption)."""
+    message = str(fault.get("faultstring") or "").lower()
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+
+def is_empty_listing_fault(fault: Dict[str, Any]) -> bool:
+    """True for the fault OMIE sends instead of an empty ListarProdutos page."""
+    message = str(fault.get("faultstring") or "").lower()
+    return any(marker in message for marker in EMPTY_LISTING_MARKERS)
+
+
+def classify_fault(fault: Dict[str, Any]) -> str:
+    """
+    Sorts an OMIE fault ({"faultcode": ..., "faultstring": ...}) into RETRYABLE,
+    SKIPPABLE or FATAL. Throttling, SOAP-ENV:Server faults and "busy" messages
+    are retryable; faults about the product's own data are skippable, and so is
+    "consumo redundante" (see REDUNDANT_MARKERS); anything else is fatal, since
+    an unknown fault most likely hits every product.
+    """
+    code = str(fault.get("faultcode") or "")
+    message = str(fault.get("faultstring") or "").lower()
+    if any(marker in message for marker in REDUNDANT_MARKERS):
+        return SKIPPABLE
+    if any(marker in message for marker in THROTTLE_MARKERS + BUSY_MARKERS):
+        return RETRYABLE
+    if code.startswith("SOAP-ENV:Server"):
+        return RETRYABLE
+    if any(marker in message for marker in PRODUCT_MARKERS):
+        return SKIPPABLE
+    return FATAL
+
+
+class RetryBudget:
+    """
+    Thread-safe cap on the retries of a whole run, shared by every call of a
+    client. Once spent, failures are returned at once instead of being retried,
+    so a degraded OMIE costs at most `max_retries` backoff sleeps in total
+    rather than a full retry cycle per product.
+    """
+
+    def __init__(self, max_retries: int = 100):
+        self.max_retries = max(0, int(max_retries))
+        self._spent = 0
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> int:
+        with self._lock:
+            return self.max_retries - self._spent
+
+    def spend(self) -> bool:
+        """Takes one retry from the budget; False when it is exhausted."""
+        with self._lock:
+            if self._spent >= self.max_retries:
+                return False
+            self._spent += 1
+            return True
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised when OMIE stayed unavailable through every circuit breaker cooldown."""
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker in front of OMIE.
+
+    `failure_threshold` consecutive failures (connection errors, throttling,
+    server faults) open the circuit: every caller then waits, together, for
+    `reset_timeout` seconds instead of each one hammering a degraded OMIE.
+    After that one probe call is let through (half-open); its success closes
+    the circuit, its failure opens it again. After `max_trips` openings in a
+    row without any success, acquire() raises CircuitOpenError.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, max_trips: int = 6,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_trips = max_trips
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, cancelled: Optional[threading.Event] = None, poll: float = 0.5) -> float:
+        """
+        Blocks while the circuit is open (or while a half-open probe is in flight).
+        Returns the time spent waiting, in seconds. Stops waiting once `cancelled` is set.
+        """
+        started = time.monotonic()
+        with self._cond:
+            while self.state != self.CLOSED:
+                if self.trips >= self.max_trips:
+                    raise CircuitOpenError(f"OMIE still failing after {self.trips} circuit breaker cooldowns")
+                if cancelled is not None and cancelled.is_set():
+                    break
+                now = self.clock()
+                if self.state == self.OPEN:
+                    remaining = self._opened_at + self.reset_timeout - now
+                    if remaining <= 0:
+                        self.state = self.HALF_OPEN
+                        self._probe_started = now
+                        logger.info("🔌 OMIE circuit half-open, sending a probe call")
+                        break
+                    self._cond.wait(min(remaining, poll))
+                elif now - self._probe_started >= self.reset_timeout:
+                    # The probe never reported back (e.g. it was cancelled); let another one through
+                    self._probe_started = now
+                    break
+                else:
+                    self._cond.wait(poll)
+        return time.monotonic() - started
+
+    def record_success(self) -> None:
+        with self._cond:
+            if self.state != self.CLOSED:
+                logger.info("🔌 OMIE circuit closed, calls resume")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trips = 0
+            self._cond.notify_all()
+
+    def record_failure(self) -> bool:
+        """Counts a failed call; returns True when it opened the circuit."""
+        with self._cond:
+            self.failures += 1
+            if self.state == self.OPEN:
+                return False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.trips += 1
+                self._opened_at = self.clock()
+                logger.warning(f"🔌 OMIE circuit open after {self.failures} failures, "
+                               f"pausing calls for {self.reset_timeout:g}s")
+                self._cond.notify_all()
+                return True
+            return False
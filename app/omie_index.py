@@ -0,0 +1,143 @@
+import sqlite3
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class OmieCodeIndex:
+    """
+    Local SQLite mirror of the OMIE products created by this integration:
+    codigo_produto_integracao → codigo_produto.
+    Keep it in its own file: SyncStateStore holds a write transaction open
+    between its batched commits, which would lock out add() on a shared file.
+
+    refresh() keeps it current with a date-filtered ListarProdutos instead of a
+    full scan, and falls back to a full reconcile every `full_refresh_every`
+    to drop products deleted in OMIE and catch any other drift.
+    """
+
+    def __init__(self, path: str = "omie_index.db", full_refresh_every: timedelta = timedelta(hours=24),
+                 overlap: timedelta = timedelta(days=1)):
+        self.path = path
+        self.full_refresh_every = full_refresh_every
+        # ListarProdutos filters by day only; look back a little so nothing falls between runs
+        self.overlap = overlap
+        # refresh() may run in a worker thread of the async sync; calls are never concurrent
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS omie_codes (
+                code TEXT PRIMARY KEY,
+                codigo_produto INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS omie_index_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+        self._codes: Dict[str, Optional[int]] = dict(
+            self._conn.execute("SELECT code, codigo_produto FROM omie_codes")
+        )
+        # ListarProdutos records seen by the last refresh(), until pop_listed_records()
+        self._listed: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._codes
+
+    def codes(self) -> Set[str]:
+        return set(self._codes)
+
+    def codigo_produto(self, code: str) -> Optional[int]:
+        return self._codes.get(code)
+
+    def _get_meta(self, key: str) -> Optional[datetime]:
+        row = self._conn.execute("SELECT value FROM omie_index_meta WHERE key = ?", (key,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def _set_meta(self, key: str, value: datetime) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO omie_index_meta (key, value) VALUES (?, ?)", (key, value.isoformat())
+        )
+
+    @property
+    def last_refresh(self) -> Optional[datetime]:
+        return self._get_meta("last_refresh")
+
+    @property
+    def last_full_refresh(self) -> Optional[datetime]:
+        return self._get_meta("last_full_refresh")
+
+    def add(self, code: str, codigo_produto: Optional[int] = None) -> None:
+        """Records a product right after it was inserted into OMIE."""
+        self._codes[code] = codigo_produto
+        self._conn.execute(
+            "INSERT OR REPLACE INTO omie_codes (code, codigo_produto) VALUES (?, ?)", (code, codigo_produto)
+        )
+        self._conn.commit()
+
+    def merge(self, products: Iterable[Dict[str, Any]], replace: bool = False) -> int:
+        """
+        Adds ListarProdutos entries to the index; with `replace`, the index is
+        rebuilt from `products` alone. Returns the number of entries merged.
+        """
+        rows = [
+            (p["codigo_produto_integracao"], p.get("codigo_produto"))
+            for p in products
+            if p.get("codigo_produto_integracao")
+        ]
+        if replace:
+            self._conn.execute("DELETE FROM omie_codes")
+            self._codes.clear()
+        self._conn.executemany("INSERT OR REPLACE INTO omie_codes (code, codigo_produto) VALUES (?, ?)", rows)
+        self._conn.commit()
+        self._codes.update(rows)
+        return len(rows)
+
+    def refresh(self, omie_client, workers: int = 4, now: Optional[datetime] = None) -> Set[str]:
+        """
+        Brings the index up to date and returns the known integration codes.
+        A window without changes lists nothing (OmieClient turns OMIE's
+        "Não existem registros" fault into an empty page) and keeps the index.
+        Listing errors (e.g. IncompleteListingError) propagate and leave the
+        refresh timestamps untouched, so the next run retries the same window.
+        """
+        now = now or datetime.now(timezone.utc)
+        last_refresh = self.last_refresh
+        last_full = self.last_full_refresh
+
+        if last_refresh is None or last_full is None or now - last_full >= self.full_refresh_every:
+            logger.info("🔄 Full reconcile of the local OMIE code index...")
+            products = omie_client.list_products(workers=workers)
+            count = self.merge(products, replace=True)
+            self._set_meta("last_full_refresh", now)
+        else:
+            since = (last_refresh - self.overlap).date()
+            logger.info(f"🔄 Incremental refresh of the local OMIE code index (changes since {since:%d/%m/%Y})...")
+            products = omie_client.list_products(workers=workers, changed_since=since)
+            count = self.merge(products)
+
+        self._listed = {p["codigo_produto_integracao"]: p for p in products if p.get("codigo_produto_integracao")}
+        self._set_meta("last_refresh", now)
+        self._conn.commit()
+        logger.info(f"✅ OMIE code index: {count} entries refreshed, {len(self)} known codes.")
+        return self.codes()
+
+    def pop_listed_records(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Hands over the ListarProdutos records the last refresh() listed, keyed by
+        integration code: every OMIE product after a full reconcile, the changed
+        ones after an incremental refresh. They are not kept after this call.
+        """
+        records, self._listed = self._listed, {}
+        return records
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
@@ -0,0 +1,117 @@
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# OptionalsPrice rows carry up to this many quantity tiers (MinQt1/Price1 .. MinQt10/Price10)
+MAX_TIERS = 10
+
+
+class SkuPrice(NamedTuple):
+    """Prices of one SPOT SKU (a product in one color/size): unit price plus (min quantity, price) tiers."""
+    sku: str
+    reference: str
+    color: Optional[str]
+    color_code: Optional[str]
+    unit_price: Optional[float]
+    tiers: Tuple[Tuple[float, float], ...]
+
+    @property
+    def version(self) -> str:
+        """
+        Short fingerprint of the price (unit price and tiers), "" when unpriced.
+        SPOT reprices without touching UpdateDate, so the delta check folds this
+        into the product's version.
+        """
+        if self.unit_price is None:
+            return ""
+        return ",".join(f"{value:g}" for value in (self.unit_price, *(v for tier in self.tiers for v in tier)))
+
+    def apply(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Adds this price to a mapped OMIE payload (in place): the unit price as
+        valor_unitario and, when there is more than one quantity tier, the tier
+        table in obs_internas. Unpriced SKUs leave the payload as-is.
+        """
+        if self.unit_price is None:
+            return payload
+        payload["valor_unitario"] = round(self.unit_price, 2)
+        if len(self.tiers) > 1:
+            payload["obs_internas"] = format_tiers(self.tiers)
+        return payload
+
+
+def _number(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else number  # NaN from CSV snapshots
+
+
+def parse_price_row(row: Dict[str, Any]) -> SkuPrice:
+    tiers = []
+    for i in range(1, MAX_TIERS + 1):
+        min_qty, price = _number(row.get(f"MinQt{i}")), _number(row.get(f"Price{i}"))
+        if min_qty is not None and price is not None:
+            tiers.append((min_qty, price))
+    unit_price = _number(row.get("YourPrice"))
+    if unit_price is None and tiers:
+        unit_price = tiers[0][1]
+    return SkuPrice(
+        sku=str(row.get("Sku") or ""),
+        reference=str(row.get("ProdReference") or ""),
+        color=row.get("ColorDesc1") or None,
+        color_code=str(row["ColorCode"]) if row.get("ColorCode") not in (None, "") else None,
+        unit_price=unit_price,
+        tiers=tuple(sorted(tiers)),
+    )
+
+
+class PriceIndex:
+    """
+    Hash index ProdReference → SKU prices, built in one pass over the SPOT
+    OptionalsPrice rows, so joining prices to products is one lookup each.
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]] = ()):
+        self._skus: Dict[str, List[SkuPrice]] = {}
+        for row in rows:
+            price = parse_price_row(row)
+            if price.reference:
+                self._skus.setdefault(price.reference, []).append(price)
+
+    def __len__(self) -> int:
+        return len(self._skus)
+
+    def __contains__(self, reference: str) -> bool:
+        return reference in self._skus
+
+    def skus(self, reference: str) -> List[SkuPrice]:
+        return self._skus.get(reference, [])
+
+    def variants(self, reference: str) -> List[SkuPrice]:
+        """The product's SKUs (one per color/size) that have a SKU code of their own."""
+        return [sku for sku in self._skus.get(reference, ()) if sku.sku]
+
+    def product_price(self, reference: str) -> Optional[SkuPrice]:
+        """The product's cheapest priced SKU (its "from" price), or None when it has no price."""
+        priced = [sku for sku in self._skus.get(reference, ()) if sku.unit_price is not None]
+        return min(priced, key=lambda sku: sku.unit_price) if priced else None
+
+    def version(self, reference: str) -> str:
+        """Price fingerprint of the product (see SkuPrice.version), "" when it has no price."""
+        price = self.product_price(reference)
+        return price.version if price is not None else ""
+
+    def apply(self, reference: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Adds the product's price (see product_price and SkuPrice.apply) to a mapped OMIE payload."""
+        price = self.product_price(reference)
+        return price.apply(payload) if price is not None else payload
+
+
+def format_tiers(tiers: Iterable[Tuple[float, float]]) -> str:
+    """Quantity tiers as OMIE note text, e.g. "Preços SPOT por quantidade: 1+ = 10.00; 100+ = 9.00"."""
+    return "Preços SPOT por quantidade: " + "; ".join(f"{min_qty:g}+ = {price:.2f}" for min_qty, price in tiers)
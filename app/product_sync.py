@@ -1,137 +1,904 @@
-import json
+import asyncio
 import time
-import pandas as pd
-from spot_client import SpotClient
-from omie_client import OmieClient
-from spot_mapper import map_spot_to_omie
+from itertools import islice
+from spot_client import SpotClient, DEFAULT_BASE_URL as SPOT_BASE_URL
+from omie_client import OmieClient, IncompleteListingError, DEFAULT_URL as OMIE_URL
+from async_clients import AsyncSpotClient, AsyncOmieClient
+from spot_mapper import map_spot_to_omie, map_spot_variant, changed_fields, fix_ncm, load_ncm_corrections
+from sync_state import SyncStateStore, payload_hash
+from omie_index import OmieCodeIndex
+from ncm_table import NcmTable
+from sync_journal import SyncJournal
+from dead_letters import DeadLetterStore
+from snapshots import DEFAULT_KEEP as SNAPSHOT_KEEP, SnapshotWriter
+from event_log import log_payload
+from metrics import Metrics, FAST_BUCKETS
+from cassette import Cassette
+from omie_faults import classify_fault, CircuitOpenError, RETRYABLE, SKIPPABLE
+from price_index import PriceIndex
+from spot_record import SpotProduct
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Returned by _update_product when the OMIE product already matches the mapped payload
+NO_CHANGES = object()
+
+# SPOT products move from the fetch stage to the mapping stage in batches of this
+# size, with at most PRODUCT_QUEUE_BATCHES batches waiting in between
+PRODUCT_BATCH_SIZE = 100
+PRODUCT_QUEUE_BATCHES = 4
+
+
+def sync_products(spot_key, omie_app_key, omie_app_secret, dry_run=False, preview_count=None,
+                  workers=1, max_rps=4.0, start_rps=None, list_workers=4, token_cache_path=None,
+                  stream=False, state_path=None, index_path=None, update_existing=False,
+                  lot_size=None, ncm_table_path=None, journal_path=None, resume=False,
+                  snapshot_dir="snapshots", snapshot_keep=SNAPSHOT_KEEP, metrics_path=None,
+                  spot_base_url=None, omie_url=None,
+                  cassette_path=None, cassette_mode="replay", replay_latency=0.0, variants=False,
+                  dead_letter_path=None):
+    """
+    Syncs SPOT products into OMIE.
+
+    `workers` sets how many inserts run in parallel and `list_workers` how many
+    OMIE listing pages are fetched at once. Every OMIE call is paced by the
+    client's adaptive rate limiter, which starts at `start_rps` (`max_rps` when
+    not given), slows down when OMIE throttles and never exceeds `max_rps`.
+    `token_cache_path` keeps the SPOT session token on disk between runs.
+    With `stream=True` SPOT products are parsed and processed one at a time
+    instead of holding the whole catalog in memory.
+    `state_path` enables delta sync: products whose SPOT UpdateDate or mapped
+    payload did not change since the last successful sync are skipped early.
+    `index_path` keeps a local mirror of OMIE integration codes that is refreshed
+    incrementally instead of listing every OMIE product on each run.
+    With `update_existing=True`, products already in OMIE are compared with the
+    last synced payload (or the OMIE record) and only changed fields are sent
+    through AlterarProduto.
+    With `lot_size`, new products are inserted through IncluirProdutosPorLote in
+    lots of that size; outcomes are still tracked per product.
+    `ncm_table_path` loads a table of valid NCM codes; products whose NCM is not
+    in it are reported as errors without calling OMIE. NCMs OMIE rejects during
+    the run are remembered the same way, with or without a table.
+    `journal_path` writes every OMIE call outcome to an fsync'd journal as the
+    run goes. With `resume=True`, an unfinished journal is replayed: products it
+    already handled are skipped and its OMIE code listing is reused instead of
+    listing OMIE again.
+    SPOT prices (OptionalsPrice) are joined to the products by ProdReference:
+    the unit price goes out as valor_unitario and quantity tiers in
+    obs_internas, so with `state_path`/`update_existing` a price change is
+    pushed as an AlterarProduto of just those fields.
+    With `variants=True`, each SPOT SKU (color variant in OptionalsPrice)
+    becomes its own OMIE item, keyed by Sku for the existence check, state and
+    journal, with its own color and price; products without SKU rows stay one
+    item keyed by ProdReference.
+    The SPOT catalog and prices and the inserted/error products are saved as
+    compressed, timestamped snapshots in `snapshot_dir` (see snapshots.py), of
+    which the newest `snapshot_keep` per name are kept (None keeps them all).
+    `metrics_path` writes the run's metrics (phase and API call latencies,
+    retries, backoff, faults by faultcode, outcomes) at the end of the run, as a
+    Prometheus textfile when it ends with .prom and as JSON otherwise.
+    `spot_base_url` and `omie_url` point the clients at other servers (e.g. the
+    fake servers in benchmarks/); by default they talk to SPOT and OMIE.
+    `cassette_path` routes all SPOT and OMIE traffic through a cassette (see
+    cassette.py): with `cassette_mode="record"` real traffic is captured to it,
+    with "replay" the run is served from it offline, its recorded response
+    times scaled by `replay_latency`.
+    OMIE faults are sorted by omie_faults.classify_fault: throttling and busy
+    faults are retried by the client (within a run-wide retry budget, behind a
+    circuit breaker) and then reported like product faults (NCM, duplicates),
+    which never stop the run; any other fault does.
+    `dead_letter_path` keeps every product that failed (its mapped payload, the
+    fault and the number of failed attempts) in a SQLite dead-letter store until
+    it goes through; see retry_failed to resubmit just those.
+
+    Runs the asyncio pipeline in sync_products_async on a new event loop.
+    """
+    asyncio.run(sync_products_async(
+        spot_key, omie_app_key, omie_app_secret, dry_run=dry_run, preview_count=preview_count,
+        workers=workers, max_rps=max_rps, start_rps=start_rps, list_workers=list_workers,
+        token_cache_path=token_cache_path,
+        stream=stream, state_path=state_path, index_path=index_path, update_existing=update_existing,
+        lot_size=lot_size, ncm_table_path=ncm_table_path, journal_path=journal_path, resume=resume,
+        snapshot_dir=snapshot_dir, snapshot_keep=snapshot_keep, metrics_path=metrics_path,
+        spot_base_url=spot_base_url, omie_url=omie_url,
+        cassette_path=cassette_path, cassette_mode=cassette_mode, replay_latency=replay_latency,
+        variants=variants, dead_letter_path=dead_letter_path,
+    ))
+
+
+async def sync_products_async(spot_key, omie_app_key, omie_app_secret, dry_run=False, preview_count=None,
+                              workers=1, max_rps=4.0, start_rps=None, list_workers=4, token_cache_path=None,
+                              stream=False, state_path=None, index_path=None, update_existing=False,
+                              lot_size=None, ncm_table_path=None, journal_path=None, resume=False,
+                              snapshot_dir="snapshots", snapshot_keep=SNAPSHOT_KEEP, metrics_path=None,
+                              spot_base_url=None, omie_url=None,
+                              cassette_path=None, cassette_mode="replay", replay_latency=0.0,
+                              variants=False, dead_letter_path=None):
+    """
+    The asyncio pipeline behind sync_products (see there for the options).
+    Its stages overlap instead of running one after another:
+
+    - the OMIE code listing starts right away, alongside the SPOT downloads, and
+      keeps running in the background once the SPOT rows and prices are in;
+    - SPOT products are pulled in batches into a bounded queue, so fetching
+      stays at most PRODUCT_QUEUE_BATCHES batches ahead of mapping;
+    - each product is checked and mapped as soon as it arrives (waiting for the
+      listing only once, before the first existence check) and handed to one of
+      `workers` OMIE call slots. The mapping stage waits for a free slot, so a
+      fatal fault still stops the run after at most `workers` more calls.
+
+    All bookkeeping (tracking lists, state store, index, journal, dead letters)
+    happens on the event loop thread; only the client calls run in threads.
+    """
+    started = time.monotonic()
+    # One registry for the run: the clients record their API calls, the pipeline its phases
+    metrics = Metrics()
+    cassette = Cassette(cassette_path, mode=cassette_mode, latency_scale=replay_latency) if cassette_path else None
+    if cassette is not None and cassette.mode == "replay":
+        # A token cached on disk would send requests the recording never made
+        token_cache_path = None
+    spot_client = SpotClient(access_key=spot_key, token_cache_path=token_cache_path, metrics=metrics,
+                             base_url=spot_base_url or SPOT_BASE_URL,
+                             session=cassette.session(pool_maxsize=4) if cassette is not None else None)
+    omie_client = OmieClient(app_key=omie_app_key, app_secret=omie_app_secret, rate_limit=start_rps,
+                             max_rate_limit=max_rps, pool_maxsize=max(workers, list_workers), metrics=metrics, url=omie_url or OMIE_URL,
+                             session=cassette.session(pool_maxsize=max(workers, list_workers))
+                             if cassette is not None else None)
+    workers = max(1, workers)
+    async_spot = AsyncSpotClient(spot_client)
+    # One extra thread for the listing, which overlaps with the first inserts
+    async_omie = AsyncOmieClient(omie_client, max_workers=workers + 1)
 
-def sync_products(spot_key, omie_app_key, omie_app_secret, dry_run=False, preview_count=None):
-    spot_client = SpotClient(access_key=spot_key)
-    omie_client = OmieClient(app_key=omie_app_key, app_secret=omie_app_secret)
-    
     # Tracking lists for final summary
     inserted_products = []      # Successfully inserted
+    updated_products = []       # Existing products updated with changed fields
     skipped_existing = []       # Already exist in OMIE
     skipped_no_reference = []   # Missing ProdReference
     error_products = []         # Products with errors (NCM, etc.)
+    skipped_unchanged = []      # Unchanged since the last successful sync
+    skipped_resumed = []        # Already handled by the interrupted run being resumed
+    outcomes = {
+        "inserted": inserted_products,
+        "updated": updated_products,
+        "skipped_existing": skipped_existing,
+        "skipped_unchanged": skipped_unchanged,
+        "skipped_resumed": skipped_resumed,
+        "skipped_no_reference": skipped_no_reference,
+        "errors": error_products,
+    }
 
+    state = SyncStateStore(state_path) if state_path else None
+    index = OmieCodeIndex(index_path) if index_path else None
+    ncm_table = NcmTable.load(ncm_table_path) if ncm_table_path else NcmTable()
+    journal = SyncJournal(journal_path, resume=resume) if journal_path else None
+    dead_letters = DeadLetterStore(dead_letter_path) if dead_letter_path else None
+    snapshots = SnapshotWriter(snapshot_dir, keep=snapshot_keep)
 
+    spot_stream = None
+    producer = None
+    listing = None
+    existing_codes = existing_records = None
+    fatal_error = False
+    failed = False
+    calls = set()
 
-    products = spot_client.fetch_products().get("Products", [])
-    prices = spot_client.fetch_price().get("OptionalsPrice", [])
-    logger.info("\U0001F4E6 Fetching products from SPOT...")
-    logger.info(f"✅ Fetched {len(products)} products from SPOT.")
-    if products:
-        pd.DataFrame(products).to_csv("produtos_spot.csv", index=False)
-    if prices:
-        pd.DataFrame(prices).to_csv("prices_spot.csv", index=False)
-    if preview_count is not None:
-        products = products[:preview_count]
+    try:
+        logger.info("\U0001F4E6 Fetching products from SPOT and OMIE...")
+        # Both SPOT downloads wait for this one authentication instead of racing to log in
+        spot_auth = asyncio.create_task(async_spot.get_token())
 
-    logger.info("\U0001F4E6 Fetching products from OMIE...")
-    existing_products = omie_client.list_products()
-    existing_codes = set(p.get("codigo_produto_integracao") for p in existing_products if p.get("codigo_produto_integracao"))
-    logger.info("✅ OMIE existing codes (first 10): %s", list(existing_codes)[:10])
+        async def spot_products():
+            await spot_auth
+            return await (async_spot.iter_products() if stream else async_spot.fetch_products())
 
-    logger.info("\U0001F6E0️ Processing %d product%s from SPOT to OMIE...", len(products), "s" if len(products) != 1 else "")
+        async def spot_prices():
+            await spot_auth
+            return await async_spot.fetch_price()
 
-    fatal_error = False
-    for product in products:
-        code = product.get("ProdReference")
-        name = product.get("ProdName", "Unknown")
-        
-        if not code:
-            logger.warning("❌ Skipping product with no ProdReference: %s", name)
-            skipped_no_reference.append({"name": name, "reason": "No ProdReference"})
-            continue
-
-        if code in existing_codes:
-            logger.info("⏭️ Skipping %s — already exists in OMIE.", code)
-            skipped_existing.append({"code": code, "name": name})
-            continue
-
-        omie_payload = map_spot_to_omie(product)
-        logger.info("\U0001F9BE OMIE Payload:\n%s\n", json.dumps(omie_payload, indent=2, ensure_ascii=False))
-
-        if not dry_run:
+        startup, _ = await _run_startup({
+            "spot_auth": spot_auth,
+            "spot_products": spot_products(),
+            "spot_prices": spot_prices(),
+            "omie_listing": _load_existing_codes(async_omie, index, journal, list_workers, update_existing),
+        }, cancel=(async_spot.cancel, async_omie.cancel), metrics=metrics, background=("omie_listing",))
+        listing = startup.pop("omie_listing")
+
+        async def wait_for_listing():
+            """Awaits the background OMIE listing; an incomplete one stops the run."""
+            nonlocal existing_codes, existing_records, fatal_error
+            existing_codes, existing_records, listing_complete = await listing
+            fatal_error = fatal_error or not listing_complete
+
+        # Only the fields the sync reads are kept (see SpotProduct); the snapshot gets the full products
+        if stream:
+            spot_stream = snapshots.stream("produtos_spot", startup.pop("spot_products"))
+            products = map(SpotProduct.from_dict, spot_stream)
+        else:
+            rows = startup.pop("spot_products").get("Products", [])
+            logger.info(f"✅ Fetched {len(rows)} products from SPOT.")
+            if rows:
+                snapshots.write("produtos_spot", rows)
+            products = SpotProduct.from_rows(rows)
+            del rows
+        prices = startup["spot_prices"].get("OptionalsPrice", [])
+        if prices:
+            snapshots.write("prices_spot", prices)
+        with metrics.timer("sync_phase_seconds", phase="price_index", outcome="done"):
+            price_index = PriceIndex(prices)
+        logger.info(f"💲 Indexed SPOT prices for {len(price_index)} products.")
+        if preview_count is not None:
+            products = islice(products, preview_count) if stream else products[:preview_count]
+
+        queue = asyncio.Queue(maxsize=PRODUCT_QUEUE_BATCHES)
+        producer = asyncio.create_task(_produce(async_spot, products, queue))
+
+        logger.info("\U0001F6E0️ Processing products from SPOT to OMIE...")
+        processing_started = time.monotonic()
+
+        slots = asyncio.Semaphore(workers)
+        pending_lot = []
+        seen = 0
+        tracking = {
+            "inserted": inserted_products,
+            "updated": updated_products,
+            "skipped_existing": skipped_existing,
+            "errors": error_products,
+        }
+
+        async def dispatch(action, items, call):
+            """Awaits one OMIE call, records the outcome of every product it carried and frees its slot."""
+            nonlocal fatal_error
             try:
-                response = omie_client.insert_product(omie_payload)
-                logger.info("📬 OMIE Response: %s", response)
-
-                if isinstance(response, dict) and "faultcode" in response:
-                    fault_msg = response.get("faultstring", "")
-                    fault_code = response.get("faultcode", "")
-                    
-                    error_products.append({
-                        "code": code,
-                        "name": name,
-                        "error_code": fault_code,
-                        "error_message": fault_msg
-                    })
-                    
-                    if "NCM não cadastrada" in fault_msg:
-                        logger.warning("⚠️ Skipping due to missing NCM: %s", code)
-                        continue
+                with metrics.timer("sync_call_seconds", action=action):
+                    response = await call
+                for item in items:
+                    # Lot calls answer with one result per integration code
+                    result = response.get(item[0]) if action == "insert_lot" and isinstance(response, dict) else response
+                    fatal_error = _record_outcome(action, item, result, tracking, state, index, ncm_table,
+                                                  journal, dead_letters) or fatal_error
+            finally:
+                slots.release()
 
-                    logger.error("🚫 OMIE Error (%s): %s", fault_code, fault_msg)
-                    logger.warning("🛑 Stopping sync due to fatal OMIE error.")
-                    fatal_error = True
+        async def submit(action, items, call):
+            """
+            Starts `call` in a free worker slot, then waits until a slot is free again,
+            so at most `workers` calls are in flight and the next product is only
+            looked at once the outcomes it may depend on (fatal faults, rejected NCMs) are in.
+            """
+            await slots.acquire()
+            task = asyncio.create_task(dispatch(action, items, call))
+            calls.add(task)
+            task.add_done_callback(calls.discard)
+            await slots.acquire()
+            slots.release()
+
+        while not fatal_error:
+            batch = await queue.get()
+            if batch is None:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+
+            for product in batch:
+                if fatal_error:
                     break
-                else:
-                    # Successfully inserted
-                    inserted_products.append({
-                        "code": code,
-                        "name": name,
-                        "omie_codigo": response.get("codigo_produto") if response else None
-                    })
-                    
-            except Exception as e:
-                logger.exception("❌ Unexpected exception while inserting product: %s", e)
-                error_products.append({
-                    "code": code,
-                    "name": name,
-                    "error_code": "EXCEPTION",
-                    "error_message": str(e)
-                })
-
-        time.sleep(1)
+
+                seen += 1
+                reference = product.get("ProdReference")
+                name = product.get("ProdName", "Unknown")
+
+                if not reference:
+                    logger.warning("❌ Skipping product with no ProdReference: %s", name)
+                    skipped_no_reference.append({"name": name, "reason": "No ProdReference"})
+                    continue
+
+                # One OMIE item per SKU in variant mode; a product without SKU rows stays a single item
+                skus = price_index.variants(reference) if variants else None
+                parent = None
+                for sku in skus or (None,):
+                    if fatal_error:
+                        break
+                    code = sku.sku if sku is not None else reference
+
+                    if journal is not None and journal.is_finished(code):
+                        logger.debug("⏭️ Skipping %s — handled before the interrupted run stopped.", code,
+                                     extra={"event": "skip", "code": code, "reason": "resumed"})
+                        skipped_resumed.append({"code": code, "name": name})
+                        continue
+
+                    update_date = product.get("UpdateDate")
+                    price = sku if sku is not None else price_index.product_price(reference)
+                    if update_date and price is not None and price.version:
+                        # Repricing doesn't move UpdateDate; the delta check has to see it anyway.
+                        # Without an UpdateDate there is no short-circuit to extend: the payload
+                        # hash, which includes the price, catches the change on its own.
+                        update_date = f"{update_date}|{price.version}"
+                    if state is not None and state.is_unchanged(code, update_date):
+                        logger.debug("⏭️ Skipping %s — unchanged since last sync.", code,
+                                     extra={"event": "skip", "code": code, "reason": "unchanged"})
+                        skipped_unchanged.append({"code": code, "name": name})
+                        continue
+
+                    if existing_codes is None:
+                        # The first product that gets this far needs the listing;
+                        # resumed and unchanged ones were skipped without it
+                        await wait_for_listing()
+                        if fatal_error:
+                            break
+
+                    if code in existing_codes and not update_existing:
+                        logger.info("⏭️ Skipping %s — already exists in OMIE.", code,
+                                    extra={"event": "skip", "code": code, "reason": "exists"})
+                        # No state is written: nothing was synced, and a run with update_existing
+                        # must still compare this product with OMIE
+                        skipped_existing.append({"code": code, "name": name})
+                        continue
+
+                    with metrics.timer("sync_map_seconds", buckets=FAST_BUCKETS):
+                        if parent is None:
+                            parent = map_spot_to_omie(product)
+                        # Variants copy the shared parent; a single item can take it over
+                        if sku is not None:
+                            omie_payload = map_spot_variant(parent, product, code, sku.color)
+                        else:
+                            omie_payload = parent
+                        if price is not None:
+                            price.apply(omie_payload)
+                        digest = payload_hash(omie_payload)
+                    previous = state.get(code) if state is not None else None
+                    if previous is not None and previous.payload_hash == digest:
+                        # UpdateDate moved but nothing we send to OMIE changed
+                        logger.debug("⏭️ Skipping %s — mapped payload unchanged.", code,
+                                     extra={"event": "skip", "code": code, "reason": "payload_unchanged"})
+                        skipped_unchanged.append({"code": code, "name": name})
+                        if not dry_run:
+                            state.record(code, update_date, digest, omie_payload)
+                        continue
+
+                    if not ncm_table.accepts(omie_payload.get("ncm")):
+                        logger.warning("⚠️ Skipping %s — NCM %s would be rejected by OMIE.", code, omie_payload.get("ncm"))
+                        error_products.append(_ncm_preflight_error(code, name, omie_payload))
+                        if dead_letters is not None and not dry_run:
+                            dead_letters.record(code, "update" if code in existing_codes else "insert", omie_payload,
+                                                "NCM_PREFLIGHT", error_products[-1]["error_message"], "preflight",
+                                                name=name, update_date=update_date, spot_ncm=product.get("Taric"))
+                        continue
+
+                    log_payload(logger, "\U0001F9BE OMIE Payload", omie_payload, code=code)
+
+                    if dry_run:
+                        continue
+
+                    item = (code, name, update_date, omie_payload, digest, product.get("Taric"))
+                    if code in existing_codes:
+                        baseline = previous.payload if previous is not None else None
+                        call = _update_product(async_omie, code, omie_payload, baseline or existing_records.get(code))
+                        action, items = "update", [item]
+                    elif lot_size:
+                        pending_lot.append(item)
+                        if len(pending_lot) < lot_size:
+                            continue
+                        call = _insert_lot(async_omie, pending_lot, lot_size)
+                        action, items = "insert_lot", pending_lot
+                        pending_lot = []
+                    else:
+                        call = _insert_product(async_omie, omie_payload)
+                        action, items = "insert", [item]
+
+                    await submit(action, items, call)
+
+        if existing_codes is None and not fatal_error:
+            # Nothing needed the listing; let it finish so the index is refreshed all the same
+            await wait_for_listing()
+
+        if pending_lot and not fatal_error:
+            await submit("insert_lot", pending_lot, _insert_lot(async_omie, pending_lot, lot_size))
+
+        if calls:
+            await asyncio.gather(*calls)
+        metrics.observe("sync_phase_seconds", time.monotonic() - processing_started, phase="processing",
+                        outcome="done")
+    except BaseException:
+        # Make calls still running in client threads fail fast so the shutdown below is quick
+        async_spot.cancel()
+        async_omie.cancel()
+        failed = True
+        raise
+    finally:
+        if calls:
+            await asyncio.gather(*calls, return_exceptions=True)
+        if producer is not None:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+        if listing is not None:
+            listing.cancel()
+            await asyncio.gather(listing, return_exceptions=True)
+        # Wait for client calls still running in threads (e.g. a product pull) before releasing anything
+        async_spot.close()
+        async_omie.close()
+        if cassette is not None:
+            cassette.close()
+        if spot_stream is not None:
+            # Release the temporary catalog file and finish its snapshot even if the loop stopped early
+            spot_stream.close()
+        # The stores batch their writes: commit what was recorded even when the run failed,
+        # since resume and retry-failed depend on exactly those outcomes
+        if journal is not None:
+            if not (fatal_error or failed):
+                journal.complete()
+            journal.close()
+        if state is not None:
+            state.close()
+        if index is not None:
+            index.close()
+        if dead_letters is not None:
+            if len(dead_letters):
+                logger.info(f"📮 {len(dead_letters)} failed products kept in {dead_letter_path} for retry-failed")
+            dead_letters.close()
+        if failed:
+            # Keep whatever was snapshotted before the failure
+            snapshots.close()
+            if metrics_path:
+                _write_metrics(metrics, metrics_path, started, outcomes, fatal_error, failed=True)
 
     # === FINAL EXECUTION SUMMARY ===
     _log_execution_summary(
-        products=products,
+        total=len(products) if isinstance(products, list) else seen,
         inserted=inserted_products,
+        updated=updated_products,
         skipped_existing=skipped_existing,
+        skipped_unchanged=skipped_unchanged,
+        skipped_resumed=skipped_resumed,
         skipped_no_ref=skipped_no_reference,
         errors=error_products,
         dry_run=dry_run,
         fatal_error=fatal_error
     )
     
-    # Save CSVs for reference
+    # Save snapshots for reference
     if error_products:
-        pd.DataFrame(error_products).to_csv("error_products.csv", index=False)
-        logger.info("📄 Saved error products to error_products.csv")
-    
+        path = snapshots.write("error_products", error_products)
+        logger.info(f"📄 Saving error products to {path}")
+
     if inserted_products:
-        pd.DataFrame(inserted_products).to_csv("inserted_products.csv", index=False)
-        logger.info("📄 Saved inserted products to inserted_products.csv")
+        path = snapshots.write("inserted_products", inserted_products)
+        logger.info(f"📄 Saving inserted products to {path}")
+    snapshots.close()
+
+    if metrics_path:
+        _write_metrics(metrics, metrics_path, started, outcomes, fatal_error)
+
+
+def retry_failed(omie_app_key, omie_app_secret, dead_letter_path="dead_letters.db", codes=None, max_attempts=None,
+                 remap_ncm=False, ncm_corrections_path=None, ncm_table_path=None, state_path=None, index_path=None,
+                 max_rps=4.0, start_rps=None, snapshot_dir="snapshots", snapshot_keep=SNAPSHOT_KEEP,
+                 omie_url=None):
+    """
+    Resubmits the products kept in the dead-letter store (see sync_products'
+    `dead_letter_path`) without downloading the SPOT catalog or listing OMIE:
+    each stored payload goes out again as the insert or update that failed.
+
+    `codes` limits the retry to those products and `max_attempts` leaves out the
+    ones that already failed that many times.
+    With `remap_ncm=True` the NCM is mapped again from the SPOT Taric with the
+    current corrections (plus any loaded from `ncm_corrections_path`, see
+    load_ncm_corrections) before sending. `ncm_table_path`, `state_path`,
+    `index_path`, `max_rps`, `start_rps`, `snapshot_dir` and `snapshot_keep`
+    work as in sync_products.
+    Products that go through leave the store; the others stay in it with one
+    more failed attempt counted.
+
+    Runs retry_failed_async on a new event loop.
+    """
+    asyncio.run(retry_failed_async(
+        omie_app_key, omie_app_secret, dead_letter_path=dead_letter_path, codes=codes, max_attempts=max_attempts,
+        remap_ncm=remap_ncm, ncm_corrections_path=ncm_corrections_path, ncm_table_path=ncm_table_path,
+        state_path=state_path, index_path=index_path, max_rps=max_rps, start_rps=start_rps,
+        snapshot_dir=snapshot_dir, snapshot_keep=snapshot_keep, omie_url=omie_url,
+    ))
+
 
+async def retry_failed_async(omie_app_key, omie_app_secret, dead_letter_path="dead_letters.db", codes=None,
+                             max_attempts=None, remap_ncm=False, ncm_corrections_path=None, ncm_table_path=None,
+                             state_path=None, index_path=None, max_rps=4.0, start_rps=None,
+                             snapshot_dir="snapshots", snapshot_keep=SNAPSHOT_KEEP, omie_url=None):
+    """The asyncio loop behind retry_failed (see there for the options); one OMIE call at a time."""
+    if ncm_corrections_path:
+        load_ncm_corrections(ncm_corrections_path)
+        remap_ncm = True
 
-def _log_execution_summary(products, inserted, skipped_existing, skipped_no_ref, errors, dry_run, fatal_error):
+    dead_letters = DeadLetterStore(dead_letter_path)
+    letters = dead_letters.letters(codes, max_attempts=max_attempts)
+    if not letters:
+        logger.info(f"📭 No failed products to retry in {dead_letter_path}.")
+        dead_letters.close()
+        return
+
+    omie_client = OmieClient(app_key=omie_app_key, app_secret=omie_app_secret, rate_limit=start_rps,
+                             max_rate_limit=max_rps, pool_maxsize=1, url=omie_url or OMIE_URL)
+    async_omie = AsyncOmieClient(omie_client, max_workers=1)
+    state = SyncStateStore(state_path) if state_path else None
+    index = OmieCodeIndex(index_path) if index_path else None
+    ncm_table = NcmTable.load(ncm_table_path) if ncm_table_path else NcmTable()
+    snapshots = SnapshotWriter(snapshot_dir, keep=snapshot_keep)
+    tracking = {"inserted": [], "updated": [], "skipped_existing": [], "errors": []}
+    fatal_error = False
+
+    logger.info(f"📮 Retrying {len(letters)} failed products from {dead_letter_path}...")
+    try:
+        for letter in letters:
+            code = letter.code
+            omie_payload = letter.payload
+            if remap_ncm:
+                ncm = fix_ncm(str(letter.spot_ncm) if letter.spot_ncm else omie_payload.get("ncm"))
+                if ncm != omie_payload.get("ncm"):
+                    logger.info("🔧 %s: NCM %s → %s", code, omie_payload.get("ncm"), ncm)
+                    omie_payload["ncm"] = ncm
+            item = (code, letter.name, letter.update_date, omie_payload, payload_hash(omie_payload), letter.spot_ncm)
+
+            if not ncm_table.accepts(omie_payload.get("ncm")):
+                logger.warning("⚠️ Skipping %s — NCM %s would be rejected by OMIE.", code, omie_payload.get("ncm"))
+                error = _ncm_preflight_error(code, letter.name, omie_payload)
+                tracking["errors"].append(error)
+                dead_letters.record(code, letter.action, omie_payload, error["error_code"], error["error_message"],
+                                    "preflight", name=letter.name, update_date=letter.update_date,
+                                    spot_ncm=letter.spot_ncm)
+                continue
+
+            if letter.action == "update":
+                previous = state.get(code) if state is not None else None
+                response = await _update_product(async_omie, code, omie_payload,
+                                                 previous.payload if previous is not None else None)
+            else:
+                response = await _insert_product(async_omie, omie_payload)
+            if _record_outcome(letter.action, item, response, tracking, state, index, ncm_table,
+                               dead_letters=dead_letters):
+                fatal_error = True
+                break
+    finally:
+        async_omie.close()
+        dead_letters.close()
+        if state is not None:
+            state.close()
+        if index is not None:
+            index.close()
+
+    _log_execution_summary(
+        total=len(letters),
+        inserted=tracking["inserted"],
+        updated=tracking["updated"],
+        skipped_existing=tracking["skipped_existing"],
+        skipped_unchanged=[],
+        skipped_no_ref=[],
+        errors=tracking["errors"],
+        dry_run=False,
+        fatal_error=fatal_error
+    )
+    if tracking["errors"]:
+        path = snapshots.write("error_products", tracking["errors"])
+        logger.info(f"📄 Saving error products to {path}")
+    if tracking["inserted"]:
+        path = snapshots.write("inserted_products", tracking["inserted"])
+        logger.info(f"📄 Saving inserted products to {path}")
+    snapshots.close()
+
+
+def _integration_codes(omie_products):
+    return set(p.get("codigo_produto_integracao") for p in omie_products if p.get("codigo_produto_integracao"))
+
+
+async def _load_existing_codes(async_omie, index, journal, list_workers, update_existing):
+    """
+    Listing stage: returns (existing_codes, existing_records, complete). The codes
+    come from the journal of an interrupted run, the local index or a full
+    ListarProdutos; `complete` is False when the listing missed pages.
+    """
+    existing_records = {}
+    complete = True
+    try:
+        if journal is not None and journal.resumed and journal.listing is not None:
+            # Everything OMIE had at the start of the interrupted run, plus what it inserted since
+            existing_codes = journal.listing | journal.inserted_codes()
+            logger.info("♻️ Reusing the OMIE listing journaled by the interrupted run.")
+        elif index is not None:
+            existing_codes = await async_omie.run(index.refresh, async_omie.client, workers=list_workers)
+            listed = index.pop_listed_records()
+            if update_existing:
+                # Whatever the refresh listed (all of OMIE on a full reconcile) saves a ConsultarProduto each
+                existing_records = listed
+        else:
+            existing_products = await async_omie.list_products(workers=list_workers)
+            existing_codes = _integration_codes(existing_products)
+            if update_existing:
+                # Listing records double as the current OMIE state for the update diff
+                existing_records = {p["codigo_produto_integracao"]: p for p in existing_products
+                                    if p.get("codigo_produto_integracao")}
+    except IncompleteListingError as e:
+        # Inserting against a partial code set would re-submit products that already exist
+        logger.error("🛑 OMIE listing incomplete (missing pages %s), not inserting to avoid duplicates.",
+                     e.missing_pages)
+        existing_codes = _integration_codes(e.products) | (index.codes() if index is not None else set())
+        complete = False
+    if journal is not None and journal.listing is None and complete:
+        journal.record_listing(existing_codes)
+    logger.info("✅ OMIE existing codes (first 10): %s", list(existing_codes)[:10])
+    return existing_codes, existing_records, complete
+
+
+async def _run_startup(jobs, cancel=(), metrics=None, background=()):
+    """
+    Startup phase: runs the independent `jobs` ({source: awaitable}) concurrently
+    and returns ({source: result}, {source: seconds}). The first failure cancels
+    the other sources (calling each `cancel` hook so client threads stop too)
+    and is re-raised once they have stopped. Per-source timings are logged
+    (and observed in `metrics` as sync_phase_seconds) either way.
+
+    Startup doesn't wait for the sources named in `background`: their task is
+    returned in place of the result, for the caller to await (or cancel) later.
+    One failing before the others are done still stops the startup.
+    """
+    started = time.monotonic()
+    timings = {}
+    outcome = {}
+    reported = False
+
+    async def timed(source, job):
+        try:
+            result = await job
+            outcome[source] = "done"
+            return result
+        except asyncio.CancelledError:
+            outcome[source] = "cancelled"
+            raise
+        except BaseException:
+            outcome[source] = "failed"
+            raise
+        finally:
+            timings[source] = time.monotonic() - started
+            if reported:
+                # A background source outliving the startup report
+                logger.info(f"⏱️ {source} took {timings[source]:.2f}s ({outcome.get(source)})")
+                if metrics is not None:
+                    metrics.observe("sync_phase_seconds", timings[source], phase=source, outcome=outcome.get(source))
+
+    tasks = {source: asyncio.create_task(timed(source, job)) for source, job in jobs.items()}
+    foreground = [task for source, task in tasks.items() if source not in background]
+    try:
+        waiting = set(tasks.values())
+        failed = None
+        while failed is None and not all(task.done() for task in foreground):
+            done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            failed = next((task for task in done if not task.cancelled() and task.exception() is not None), None)
+        if failed is not None:
+            for hook in cancel:
+                hook()
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise failed.exception()
+        return {source: task if source in background else task.result() for source, task in tasks.items()}, timings
+    finally:
+        reported = True
+        report = ", ".join(
+            f"{source} {timings[source]:.2f}s" + ("" if outcome.get(source) == "done" else f" ({outcome.get(source)})")
+            if source in timings else f"{source} (running)"
+            for source in jobs
+        )
+        logger.info(f"⏱️ Startup took {time.monotonic() - started:.2f}s: {report}")
+        if metrics is not None:
+            for source, seconds in timings.items():
+                metrics.observe("sync_phase_seconds", seconds, phase=source, outcome=outcome.get(source))
+            metrics.observe("sync_phase_seconds", time.monotonic() - started, phase="startup",
+                            outcome="failed" if "failed" in outcome.values() else "done")
+
+
+def _ncm_preflight_error(code, name, omie_payload):
+    return {
+        "code": code,
+        "name": name,
+        "error_code": "NCM_PREFLIGHT",
+        "error_message": f"NCM {omie_payload.get('ncm')} não cadastrada (local NCM check)"
+    }
+
+
+async def _produce(async_spot, products, queue):
+    """
+    Fetch stage: pulls SPOT products in batches (the pull runs in a SPOT client
+    thread) into `queue`, then None. A failure is put on the queue so the
+    mapping stage re-raises it instead of waiting forever.
+    """
+    try:
+        async for batch in async_spot.batches(products, PRODUCT_BATCH_SIZE):
+            await queue.put(batch)
+    except Exception as e:
+        await queue.put(e)
+        return
+    await queue.put(None)
+
+
+async def _insert_product(async_omie, omie_payload):
+    """
+    Inserts one product; pacing is done by the client.
+    Exceptions are returned instead of raised so the caller can record them.
+    """
+    try:
+        return await async_omie.insert_product(omie_payload)
+    except Exception as e:
+        return e
+
+
+async def _update_product(async_omie, code, omie_payload, baseline):
+    """
+    Diffs the mapped payload against `baseline` (the last synced payload or OMIE
+    listing record, fetched with ConsultarProduto when missing) and sends only
+    the changed fields. Returns NO_CHANGES when OMIE is already up to date;
+    exceptions are returned instead of raised.
+    """
+    try:
+        if baseline is None:
+            baseline = await async_omie.get_product(code)
+            if isinstance(baseline, dict) and "faultcode" in baseline:
+                return baseline
+        changes = changed_fields(omie_payload, baseline)
+        if not changes:
+            return NO_CHANGES
+        return await async_omie.update_product({"codigo_produto_integracao": code, **changes})
+    except Exception as e:
+        return e
+
+
+async def _insert_lot(async_omie, items, lot_size):
+    """
+    Inserts a lot of products with one OMIE call.
+    Returns {codigo_produto_integracao: result}; exceptions are returned instead of raised.
+    """
+    try:
+        return dict(await async_omie.insert_products_batch([item[3] for item in items], lot_size=lot_size))
+    except Exception as e:
+        return e
+
+
+def _record_outcome(action, item, response, tracking, state=None, index=None, ncm_table=None, journal=None,
+                    dead_letters=None):
+    """
+    Records one product's insert/update outcome in the tracking lists (and in the
+    sync state store, OMIE code index, NCM table, journal and dead-letter store,
+    when given).
+    Returns True if the outcome is a fatal OMIE fault (see classify_fault) or OMIE
+    stayed down through every circuit breaker cooldown.
+    """
+    code, name, update_date, omie_payload, digest, spot_ncm = item
+    error_products = tracking["errors"]
+
+    def dead_letter(error_code, error_message, fault_class):
+        if dead_letters is not None:
+            dead_letters.record(code, "update" if action == "update" else "insert", omie_payload, error_code,
+                                error_message, fault_class, name=name, update_date=update_date, spot_ncm=spot_ncm)
+
+    if isinstance(response, Exception):
+        logger.error("❌ Unexpected exception while %s product %s: %s",
+                     "updating" if action == "update" else "inserting", code, response,
+                     exc_info=response)
+        error_products.append({
+            "code": code,
+            "name": name,
+            "error_code": "EXCEPTION",
+            "error_message": str(response)
+        })
+        if journal is not None:
+            journal.record(code, "failed", error_code="EXCEPTION", error_message=str(response))
+        dead_letter("EXCEPTION", str(response), "exception")
+        if isinstance(response, CircuitOpenError):
+            logger.warning("🛑 Stopping sync, OMIE is unavailable.")
+            return True
+        return False
+
+    if response is NO_CHANGES:
+        logger.info("⏭️ Skipping %s — already up to date in OMIE.", code,
+                    extra={"event": "skip", "code": code, "reason": "up_to_date"})
+        tracking["skipped_existing"].append({"code": code, "name": name})
+        if state is not None:
+            state.record(code, update_date, digest, omie_payload)
+        if journal is not None:
+            journal.record(code, "skipped")
+        if dead_letters is not None:
+            dead_letters.resolve(code)
+        return False
+
+    logger.info("📬 OMIE Response: %s", response, extra={"event": "omie_response", "code": code, "action": action})
+
+    if isinstance(response, dict) and "faultcode" in response:
+        fault_msg = response.get("faultstring", "")
+        fault_code = response.get("faultcode", "")
+
+        error_products.append({
+            "code": code,
+            "name": name,
+            "error_code": fault_code,
+            "error_message": fault_msg
+        })
+        if journal is not None:
+            journal.record(code, "failed", error_code=fault_code, error_message=fault_msg)
+        fault_class = classify_fault(response)
+        dead_letter(fault_code, fault_msg, fault_class)
+
+        if "NCM não cadastrada" in fault_msg:
+            logger.warning("⚠️ Skipping due to missing NCM: %s", code)
+            if ncm_table is not None:
+                ncm_table.reject(omie_payload.get("ncm"))
+            return False
+
+        if fault_class == SKIPPABLE:
+            logger.warning("⚠️ Skipping %s due to OMIE error (%s): %s", code, fault_code, fault_msg)
+            return False
+        if fault_class == RETRYABLE:
+            # The client already retried it; OMIE is busy, not broken, so the next run picks it up
+            logger.warning("⚠️ Giving up on %s for this run, OMIE still busy (%s): %s", code, fault_code, fault_msg)
+            return False
+
+        logger.error("🚫 OMIE Error (%s): %s", fault_code, fault_msg)
+        logger.warning("🛑 Stopping sync due to fatal OMIE error.")
+        return True
+
+    if action == "update":
+        tracking["updated"].append({"code": code, "name": name})
+        if state is not None:
+            state.record(code, update_date, digest, omie_payload)
+        if journal is not None:
+            journal.record(code, "updated")
+        if dead_letters is not None:
+            dead_letters.resolve(code)
+        return False
+
+    # Successfully inserted
+    tracking["inserted"].append({
+        "code": code,
+        "name": name,
+        "omie_codigo": response.get("codigo_produto") if response else None
+    })
+    if state is not None:
+        state.record(code, update_date, digest, omie_payload)
+    if index is not None:
+        index.add(code, response.get("codigo_produto") if response else None)
+    if journal is not None:
+        journal.record(code, "inserted", codigo_produto=response.get("codigo_produto") if response else None)
+    if dead_letters is not None:
+        dead_letters.resolve(code)
+    return False
+
+
+def _write_metrics(metrics, path, started, outcomes, fatal_error, failed=False):
+    """Adds the run totals to `metrics` and writes the report; a failed write is only logged."""
+    metrics.observe("sync_phase_seconds", time.monotonic() - started, phase="total",
+                    outcome="failed" if failed else "done")
+    for outcome, products in outcomes.items():
+        metrics.set("sync_products", len(products), outcome=outcome)
+    metrics.set("sync_fatal_error", int(bool(fatal_error)))
+    metrics.set("sync_failed", int(failed))
+    metrics.set("sync_last_run_timestamp_seconds", round(time.time()))
+    try:
+        metrics.write(path)
+        logger.info(f"📈 Saving sync metrics to {path}")
+    except OSError as e:
+        logger.error(f"⚠️ Could not write sync metrics to {path}: {e}")
+
+
+def _log_execution_summary(total, inserted, updated, skipped_existing, skipped_unchanged, skipped_no_ref, errors,
+                           dry_run, fatal_error, skipped_resumed=()):
     """Logs a comprehensive summary of the sync execution."""
-    total = len(products)
-    
+
     logger.info("")
     logger.info("=" * 60)
     logger.info("📊 EXECUTION SUMMARY")
     logger.info("=" * 60)
     logger.info(f"Total products from SPOT:      {total}")
     logger.info(f"Successfully inserted:         {len(inserted)}")
+    logger.info(f"Updated (changed fields):      {len(updated)}")
     logger.info(f"Skipped (already in OMIE):     {len(skipped_existing)}")
+    logger.info(f"Skipped (unchanged):           {len(skipped_unchanged)}")
+    if skipped_resumed:
+        logger.info(f"Skipped (done before resume):  {len(skipped_resumed)}")
     logger.info(f"Skipped (no ProdReference):    {len(skipped_no_ref)}")
     logger.info(f"Errors:                        {len(errors)}")
     if dry_run:
@@ -148,6 +915,14 @@ def _log_execution_summary(products, inserted, skipped_existing, skipped_no_ref,
         for p in inserted:
             logger.info(f"  • [{p['code']}] {p['name']}")
     
+    # List updated products
+    if updated:
+        logger.info("")
+        logger.info("🔁 PRODUCTS UPDATED:")
+        logger.info("-" * 40)
+        for p in updated:
+            logger.info(f"  • [{p['code']}] {p['name']}")
+
     # List products with errors
     if errors:
         logger.info("")
@@ -0,0 +1,76 @@
+import threading
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by concurrent workers.
+    Each acquire() takes one token; callers block until a token is available,
+    which caps the overall call rate at `rate` calls per second.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be greater than zero")
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        Blocks until a token is available.
+        Returns the total time spent waiting, in seconds.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket whose rate follows the server's feedback (AIMD).
+    penalize() cuts the rate multiplicatively and empties the bucket when the
+    server throttles us; reward() raises it additively on healthy responses,
+    never going outside [min_rate, max_rate].
+    """
+
+    def __init__(self, rate: float, min_rate: float = 0.2, max_rate: Optional[float] = None,
+                 burst: int = 1, increase: float = 0.05, decrease: float = 0.5):
+        super().__init__(rate, burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate) if max_rate else self.rate
+        self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+        self.increase = increase
+        self.decrease = decrease
+
+    def penalize(self) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # Drop stored tokens so the slowdown takes effect immediately
+            self._tokens = min(self._tokens, 0.0)
+        logger.warning(f"⏬ OMIE throttling detected, slowing down to {self.rate:.2f} req/s")
+
+    def reward(self) -> None:
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.increase)
@@ -0,0 +1,208 @@
+import csv
+import glob
+import gzip
+import json
+import logging
+import math
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Snapshots fall back to gzip-compressed CSV
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+Rows = Union[pd.DataFrame, Iterable[Dict[str, Any]]]
+
+# Snapshots of each name kept by default; about a month of hourly runs
+DEFAULT_KEEP = 720
+
+
+def snapshot_extension() -> str:
+    return ".parquet" if pq is not None else ".csv.gz"
+
+
+def _text(value: Any) -> Optional[str]:
+    """Cell value for string-typed snapshots; nested SPOT values are kept as JSON."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _to_frame(rows: Rows) -> pd.DataFrame:
+    frame = rows.copy() if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    # Mixed or nested object columns become text so every snapshot has a stable column type
+    for column in frame.columns[frame.dtypes == object]:
+        frame[column] = frame[column].map(_text).astype("string")
+    return frame
+
+
+def _write_file(path: str, rows: Rows) -> None:
+    frame = _to_frame(rows)
+    tmp_path = f"{path}.tmp"
+    if path.endswith(".parquet"):
+        frame.to_parquet(tmp_path, engine="pyarrow", compression="zstd", index=False)
+    else:
+        frame.to_csv(tmp_path, index=False, compression="gzip")
+    os.replace(tmp_path, path)
+
+
+def save_snapshot(name: str, rows: Rows, directory: str = "snapshots", timestamp: Optional[str] = None) -> str:
+    """Writes one snapshot right away (in the calling thread) and returns its path."""
+    os.makedirs(directory, exist_ok=True)
+    timestamp = timestamp or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(directory, f"{name}-{timestamp}{snapshot_extension()}")
+    _write_file(path, rows)
+    return path
+
+
+class _StreamFile:
+    """A snapshot written batch by batch; its columns are fixed by the first batch, all typed as text."""
+
+    def __init__(self, path: str, columns: List[str]):
+        self.path = path
+        self.columns = columns
+        self._tmp_path = f"{path}.tmp"
+        if path.endswith(".parquet"):
+            self._schema = pa.schema([(column, pa.string()) for column in columns])
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema, compression="zstd")
+        else:
+            self._file = gzip.open(self._tmp_path, "wt", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction="ignore")
+            self._writer.writeheader()
+
+    def append(self, batch: List[Dict[str, Any]]) -> None:
+        if self.path.endswith(".parquet"):
+            # Like the old CSV dump: columns missing from the first batch are ignored
+            data = {column: [_text(row.get(column)) for row in batch] for column in self.columns}
+            self._writer.write_table(pa.Table.from_pydict(data, schema=self._schema))
+        else:
+            self._writer.writerows({column: _text(row.get(column)) for column in self.columns} for row in batch)
+
+    def close(self) -> None:
+        if self.path.endswith(".parquet"):
+            self._writer.close()
+        else:
+            self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class SnapshotWriter:
+    """
+    Writes the run's data snapshots (SPOT catalog and prices, sync outcomes) from
+    a background thread, so the sync only pays for handing the rows over.
+
+    Each snapshot is <directory>/<name>-<run timestamp>.parquet (zstd), or
+    .csv.gz when pyarrow is not installed; read them back with read_snapshot().
+    Only the newest `keep` snapshots of each name are kept (all of them with keep=None).
+    Write errors are logged and never interrupt the sync.
+    """
+
+    def __init__(self, directory: str = "snapshots", keep: Optional[int] = DEFAULT_KEEP,
+                 timestamp: Optional[str] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.keep = keep
+        self.timestamp = timestamp or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._streams: Dict[str, _StreamFile] = {}
+        self._thread = threading.Thread(target=self._run, name="snapshots", daemon=True)
+        self._thread.start()
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}-{self.timestamp}{snapshot_extension()}")
+
+    def write(self, name: str, rows: Rows) -> str:
+        """Queues a whole snapshot and returns the path it will be written to."""
+        # Shallow copy: the caller may keep appending to its list
+        self._jobs.put(("write", name, rows.copy() if isinstance(rows, pd.DataFrame) else list(rows)))
+        return self.path_for(name)
+
+    def stream(self, name: str, rows: Iterable[Dict[str, Any]], batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Yields `rows` unchanged while they are appended to a snapshot in batches,
+        so a streamed catalog is never held in memory for the dump. The snapshot
+        is finished when the generator is exhausted or closed.
+        """
+        batch = []
+        try:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self._jobs.put(("append", name, batch))
+                    batch = []
+                yield row
+        finally:
+            if batch:
+                self._jobs.put(("append", name, batch))
+            self._jobs.put(("finish", name, None))
+
+    def close(self) -> None:
+        """Waits until every queued snapshot is on disk."""
+        self._jobs.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            action, name, rows = job
+            try:
+                if action == "write":
+                    _write_file(self.path_for(name), rows)
+                    self._prune(name)
+                elif action == "append":
+                    if name not in self._streams:
+                        self._streams[name] = _StreamFile(self.path_for(name), list(rows[0].keys()))
+                    self._streams[name].append(rows)
+                elif name in self._streams:
+                    self._streams.pop(name).close()
+                    self._prune(name)
+            except Exception as e:
+                logger.error(f"⚠️ Could not write snapshot {name}: {e}", exc_info=e)
+                self._streams.pop(name, None)
+
+        for name, stream in self._streams.items():
+            stream.close()
+
+    def _prune(self, name: str) -> None:
+        if not self.keep:
+            return
+        for path in list_snapshots(name, self.directory)[:-self.keep]:
+            os.remove(path)
+
+
+def list_snapshots(name: str, directory: str = "snapshots") -> List[str]:
+    """Paths of the snapshots called `name`, oldest first."""
+    paths = [path for extension in (".parquet", ".csv.gz")
+             for path in glob.glob(os.path.join(directory, f"{name}-*{extension}"))]
+    # The UTC timestamp suffix sorts chronologically
+    return sorted(paths, key=os.path.basename)
+
+
+def read_snapshot(name_or_path: str, directory: str = "snapshots",
+                  columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Loads a snapshot file, or the newest snapshot called `name_or_path` in
+    `directory`. With `columns`, only those columns are read.
+    """
+    path = name_or_path
+    if not os.path.isfile(path):
+        paths = list_snapshots(name_or_path, directory)
+        if not paths:
+            raise FileNotFoundError(f"No snapshot named {name_or_path!r} in {directory}")
+        path = paths[-1]
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=list(columns) if columns else None)
+    return pd.read_csv(path, usecols=list(columns) if columns else None)
@@ -1,24 +1,62 @@
 import requests
 import logging
-from typing import Optional, Dict, Any
+import tempfile
+import threading
+from typing import Optional, Dict, Any, Iterator, IO
 import json
+from http_session import build_session, Timeout, RequestCancelled
+from token_cache import TokenCache
+from json_stream import iter_json_array
+from event_log import log_payload
+from metrics import Metrics
 
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BASE_URL = "http://ws.spotgifts.com.br/api/v1"
+
+# (connect, read) timeouts per SPOT endpoint; the catalog downloads are large and slow
+DEFAULT_TIMEOUTS: Dict[str, Timeout] = {
+    "authenticateclient": (5, 30),
+    "validateSession": (5, 30),
+    "products": (5, 180),
+    "optionalsPrice": (5, 180),
+}
+
 class SpotClient:
-    def __init__(self, access_key: str, lang: str = "PT"):
+    def __init__(self, access_key: str, lang: str = "PT", session: Optional[requests.Session] = None,
+                 pool_maxsize: int = 4, timeouts: Optional[Dict[str, Timeout]] = None,
+                 token_cache: Optional[TokenCache] = None, token_ttl: float = 1800,
+                 token_cache_path: Optional[str] = None, metrics: Optional[Metrics] = None,
+                 base_url: str = DEFAULT_BASE_URL):
         self.access_key = access_key
         self.lang = lang
-        self.base_url = "http://ws.spotgifts.com.br/api/v1"
+        self.base_url = base_url.rstrip("/")
         self.session_token: Optional[str] = None
+        self.session = session or build_session(pool_maxsize=pool_maxsize)
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.token_cache = token_cache or TokenCache(ttl=token_ttl, path=token_cache_path)
+        # Set by cancel(); requests not yet sent (and catalog downloads) stop with RequestCancelled
+        self.cancelled = threading.Event()
+        # Request latencies and re-authentications per SPOT endpoint
+        self.metrics = metrics or Metrics()
+
+    def cancel(self) -> None:
+        """Stops this client's pending work: later requests and running downloads raise RequestCancelled."""
+        self.cancelled.set()
+
+    def _check_cancelled(self) -> None:
+        if self.cancelled.is_set():
+            raise RequestCancelled("SPOT client was cancelled")
 
     def authenticate(self) -> None:
         """
         Authenticates using the access key and retrieves a session token.
         """
+        self._check_cancelled()
         url = f"{self.base_url}/authenticateclient?AccessKey={self.access_key}"
-        response = requests.get(url)
+        with self.metrics.timer("spot_request_seconds", endpoint="authenticateclient"):
+            response = self.session.get(url, timeout=self.timeouts["authenticateclient"])
         response.raise_for_status()
         data = response.json()
 
@@ -37,7 +75,8 @@ class SpotClient:
             return False
 
         url = f"{self.base_url}/validateSession?token={self.session_token}"
-        response = requests.get(url)
+        with self.metrics.timer("spot_request_seconds", endpoint="validateSession"):
+            response = self.session.get(url, timeout=self.timeouts["validateSession"])
         response.raise_for_status()
         data = response.json()
 
@@ -49,32 +88,120 @@ class SpotClient:
 
         return is_valid
 
-    def fetch_products(self) -> Dict[str, Any]:
+    def get_token(self) -> Optional[str]:
+        """
+        Returns a usable session token, re-authenticating only when the cached
+        token is missing, expired or fails validation. Concurrent callers wait
+        for a single refresh instead of each authenticating on their own.
         """
-        Fetches products using the current valid session token.
-        If no token or invalid, re-authenticates first.
+        token = self.token_cache.get()
+        if token and not self.token_cache.needs_validation:
+            self.session_token = token
+            return token
+
+        with self.token_cache.lock:
+            token = self.token_cache.get()
+            if token and self.token_cache.needs_validation:
+                # Token came from disk: check the server still accepts it
+                self.session_token = token
+                if self.validate_session():
+                    self.token_cache.needs_validation = False
+                else:
+                    self.token_cache.invalidate()
+                    token = None
+
+            if not token:
+                logger.info("Authenticating to obtain new session token...")
+                self.authenticate()
+                self.token_cache.set(self.session_token)
+                token = self.session_token
+
+            self.session_token = token
+            return token
+
+    def _fetch(self, endpoint: str) -> Dict[str, Any]:
         """
+        GETs a token-protected endpoint. If SPOT rejects the cached token, the
+        token is dropped and the request is repeated once with a fresh one.
+        """
+        url = f"{self.base_url}/{endpoint}"
+        data: Dict[str, Any] = {}
+        for attempt in range(2):
+            token = self.get_token()
+            self._check_cancelled()
+            params = {"token": token, "lang": self.lang}
+            # Includes decoding the body, which is most of the time for the catalog endpoints
+            with self.metrics.timer("spot_request_seconds", endpoint=endpoint):
+                response = self.session.get(url, params=params, timeout=self.timeouts[endpoint])
+                response.raise_for_status()
+                data = response.json()
+
+            if attempt == 0 and isinstance(data, dict) and data.get("ErrorCode") is not None:
+                logger.warning(f"SPOT rejected {endpoint} request ({data.get('ErrorMessage')}), re-authenticating.")
+                self.metrics.inc("spot_reauth_total", endpoint=endpoint)
+                self.token_cache.invalidate()
+                continue
+            break
+        return data
 
-        logger.info("Authenticating to obtain new session token...")
-        self.authenticate()
-        self.validate_session()
+    def fetch_products(self) -> Dict[str, Any]:
+        """
+        Fetches products using the cached session token (see get_token).
+        """
+        return self._fetch("products")
 
+    def iter_products(self, chunk_size: int = 64 * 1024) -> Iterator[Dict[str, Any]]:
+        """
+        Downloads the /products catalog to a temporary file and returns a generator
+        that yields one product dict at a time. The connection is released as soon
+        as the body is on disk and the full payload is never decoded in memory.
+        """
         url = f"{self.base_url}/products"
-        params = {"token": self.session_token, "lang": self.lang}
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        body: IO[bytes] = tempfile.TemporaryFile()
+        try:
+            for attempt in range(2):
+                body.seek(0)
+                body.truncate()
+                params = {"token": self.get_token(), "lang": self.lang}
+                self._check_cancelled()
+                with self.metrics.timer("spot_request_seconds", endpoint="products"), \
+                        self.session.get(url, params=params, timeout=self.timeouts["products"], stream=True) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(chunk_size):
+                        self._check_cancelled()
+                        body.write(chunk)
+
+                # A rejected token comes back as a small error object instead of the catalog
+                if attempt == 0 and body.tell() <= chunk_size:
+                    body.seek(0)
+                    try:
+                        data = json.load(body)
+                    except ValueError:
+                        data = None
+                    if isinstance(data, dict) and data.get("ErrorCode") is not None:
+                        logger.warning(f"SPOT rejected products request ({data.get('ErrorMessage')}), re-authenticating.")
+                        self.metrics.inc("spot_reauth_total", endpoint="products")
+                        self.token_cache.invalidate()
+                        continue
+                break
+        except BaseException:
+            # Failed or cancelled download: don't leave the temporary file open
+            body.close()
+            raise
+
+        logger.info(f"Downloaded {body.tell() / 1024:.0f} KiB SPOT catalog, streaming products.")
+        self.metrics.inc("spot_downloaded_bytes_total", body.tell(), endpoint="products")
+        body.seek(0)
+        return self._iter_products_file(body, chunk_size)
+
+    @staticmethod
+    def _iter_products_file(body: IO[bytes], chunk_size: int) -> Iterator[Dict[str, Any]]:
+        try:
+            yield from iter_json_array(iter(lambda: body.read(chunk_size), b""), "Products")
+        finally:
+            body.close()
 
     def fetch_price(self) -> Dict[str, Any]:
-        logger.info("Authenticating to obtain new session token...")
-        self.authenticate()
-        self.validate_session()
-
-        url = f"{self.base_url}/optionalsPrice"
-        params = {"token": self.session_token, "lang": self.lang}
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-
-        data = response.json()
-        logger.debug("📊 SPOT price data: %s", json.dumps(data, indent=2, ensure_ascii=False))
+        data = self._fetch("optionalsPrice")
+        log_payload(logger, "📊 SPOT price data", data)
         return data
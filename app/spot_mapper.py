@@ -1,5 +1,9 @@
 from spot_client import SpotClient
-from typing import List, Dict, Any
+from snapshots import SnapshotWriter
+from functools import lru_cache
+import csv
+import json
+from typing import List, Dict, Any, Optional
 import logging
 import pandas as pd
 
@@ -14,10 +18,16 @@ NCM_CORRECTIONS = {
     "9608109900": "96081000",  # Handle 10-digit version
 }
 
+# Mapped fields that may be sent to AlterarProduto when they change
+UPDATABLE_FIELDS = ("descricao", "descr_detalhada", "ncm", "peso_bruto", "unidade", "valor_unitario", "obs_internas")
+
+@lru_cache(maxsize=4096)
 def fix_ncm(ncm: str) -> str:
     """
     Corrects known incorrect NCM codes from SPOT API.
     Returns the corrected NCM or the original if no correction needed.
+    Results are cached: the catalog reuses a few hundred codes, so each one is
+    normalized (and its correction logged) only once per process.
     """
     if not ncm:
         return ncm
@@ -44,7 +54,32 @@ def fix_ncm(ncm: str) -> str:
     
     return ncm_normalized
 
-def fetch_spot_products(spot: SpotClient) -> List[Dict[str, Any]]:
+def load_ncm_corrections(path: str) -> int:
+    """
+    Adds NCM corrections from a file to NCM_CORRECTIONS (overriding built-in
+    ones): a JSON object {"wrong": "right", ...} or a CSV with the wrong and
+    right codes in the first two columns. Clears fix_ncm's cache so the new
+    corrections apply at once. Returns how many corrections were loaded.
+    """
+    with open(path, encoding="utf-8-sig") as f:
+        if path.lower().endswith(".json"):
+            corrections = {str(wrong): str(right) for wrong, right in json.load(f).items()}
+        else:
+            # Rows without a code in the first column (a header) are ignored
+            corrections = {row[0].strip(): row[1].strip() for row in csv.reader(f)
+                           if len(row) >= 2 and any(ch.isdigit() for ch in row[0])}
+    NCM_CORRECTIONS.update(corrections)
+    fix_ncm.cache_clear()
+    logger.info(f"🔧 Loaded {len(corrections)} NCM corrections from {path}")
+    return len(corrections)
+
+def fetch_spot_products(spot: SpotClient, snapshot_dir: str = "snapshots",
+                        snapshots: Optional[SnapshotWriter] = None) -> List[Dict[str, Any]]:
+    """
+    Fetches the SPOT catalog and snapshots it. With `snapshots` the snapshot is
+    queued on that (running) writer; otherwise a writer for `snapshot_dir` is
+    opened and closed here.
+    """
     response = spot.fetch_products()
     products = response.get("Products", [])
 
@@ -54,9 +89,11 @@ def fetch_spot_products(spot: SpotClient) -> List[Dict[str, Any]]:
         logger.warning("No products were returned from SPOT.")
         return []
 
-    df = pd.DataFrame(products)
-    df.to_csv("spot_products.csv", index=False)
-    logger.info("Saved all products to spot_products.csv")
+    writer = snapshots or SnapshotWriter(snapshot_dir)
+    path = writer.write("spot_products", products)
+    if snapshots is None:
+        writer.close()
+    logger.info(f"Saved all products to {path}")
 
     return products
 
@@ -84,3 +121,43 @@ def map_spot_to_omie(spot_product: Dict[str, Any]) -> Dict[str, Any]:
         "unidade": "UN",
         "importado_api": "S"
     }
+
+def map_spot_variant(parent: Dict[str, Any], spot_product: Dict[str, Any], sku: str,
+                     color: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Maps one SKU (color variant) of a SPOT product from the product's mapped
+    payload: a shallow copy of `parent` with the SKU as codigo and its color in
+    the description, so the parent is mapped once for all of its variants.
+    """
+    variant = parent.copy()
+    variant["codigo"] = variant["codigo_produto_integracao"] = sku
+    cor = color if color is not None else spot_product.get("Colors").strip()
+    variant["descricao"] = f"{spot_product.get('Name')} - Cor: {cor} - Codigo: {sku}"[:120]
+    return variant
+
+def _comparable(field: str, value: Any) -> Any:
+    """Normalizes OMIE/SPOT representations so equal values compare equal."""
+    if value is None:
+        return ""
+    if field == "ncm":
+        return str(value).replace(".", "").strip()
+    if field in ("peso_bruto", "valor_unitario"):
+        try:
+            return round(float(value), 3 if field == "peso_bruto" else 2)
+        except (TypeError, ValueError):
+            return value
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+def changed_fields(new_payload: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the updatable fields of `new_payload` whose values differ from
+    `current` (a previously synced payload or an OMIE product record).
+    """
+    return {
+        field: new_payload[field]
+        for field in UPDATABLE_FIELDS
+        if field in new_payload
+        and _comparable(field, new_payload[field]) != _comparable(field, current.get(field))
+    }
@@ -0,0 +1,57 @@
+import sys
+from typing import Any, Dict, Iterable, List
+
+# The SPOT product fields the sync reads: the mapper's, the delta check's UpdateDate and the report's name
+PRODUCT_FIELDS = ("ProdReference", "ProdName", "Name", "Colors", "Description", "Taric", "Weight", "UpdateDate")
+
+_FIELD_SET = frozenset(PRODUCT_FIELDS)
+
+# Values repeated across the catalog; interned so every product shares one copy
+_INTERNED = ("Colors", "Taric", "UpdateDate")
+
+# Slot value of a field the SPOT product did not have (get() then returns the default, like dict.get)
+_MISSING = object()
+
+
+class SpotProduct:
+    """
+    Compact SPOT product: only PRODUCT_FIELDS, in slots, instead of the ~90-key
+    dict SPOT sends (customization tables, image lists, keywords...).
+    Reads like the dict it came from through get(), so map_spot_to_omie and the
+    sync loop take either.
+    """
+
+    __slots__ = PRODUCT_FIELDS
+
+    def __init__(self, **fields: Any):
+        for field in PRODUCT_FIELDS:
+            setattr(self, field, fields.get(field, _MISSING))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpotProduct":
+        record = cls.__new__(cls)
+        for field in PRODUCT_FIELDS:
+            value = data.get(field, _MISSING)
+            if field in _INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(record, field, value)
+        return record
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> List["SpotProduct"]:
+        return [cls.from_dict(row) for row in rows]
+
+    def get(self, field: str, default: Any = None) -> Any:
+        value = getattr(self, field) if field in _FIELD_SET else _MISSING
+        return default if value is _MISSING else value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in PRODUCT_FIELDS if getattr(self, field) is not _MISSING}
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, SpotProduct):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in PRODUCT_FIELDS)
+
+    def __repr__(self) -> str:
+        return f"SpotProduct({self.as_dict()!r})"
@@ -0,0 +1,99 @@
+import json
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Outcomes that mean a product needs no more work in this run
+FINISHED_STATUSES = ("inserted", "updated", "skipped")
+
+
+class SyncJournal:
+    """
+    Append-only JSON-lines journal of per-product sync outcomes. Every record is
+    flushed and fsync'd before the next product is processed, so a crashed or
+    stopped run leaves an exact account of what it already did.
+
+    A run starts a new journal unless `resume` is set and the previous run did
+    not reach complete(); in that case the old entries are replayed and new
+    records are appended after them.
+    """
+
+    def __init__(self, path: str = "sync_journal.jsonl", resume: bool = False):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.listing: Optional[Set[str]] = None
+        self.resumed = False
+
+        if resume and os.path.exists(path):
+            completed = self._replay()
+            if completed:
+                logger.info(f"Previous sync in {path} completed, starting a new journal.")
+                self.entries, self.listing = {}, None
+            else:
+                self.resumed = True
+                logger.info(f"♻️ Resuming sync from {path}: {len(self.entries)} products already handled.")
+
+        self._file = open(path, "a" if self.resumed else "w", encoding="utf-8")
+        if self.resumed and self._file.tell() and not self._ends_with_newline():
+            # Terminate a line torn by the crash so the next record starts cleanly
+            self._file.write("\n")
+
+    def _replay(self) -> bool:
+        """Loads the journal; returns True if it ends with a completed run."""
+        completed = False
+        with open(self.path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Only the last line can be torn by a crash mid-write
+                    logger.warning(f"⚠️ Ignoring unreadable line {line_number} in {self.path}")
+                    continue
+                event = record.get("event")
+                if event == "listing":
+                    self.listing = set(record.get("codes", []))
+                elif event == "complete":
+                    completed = True
+                elif event == "product":
+                    self.entries[record["code"]] = record
+                    completed = False
+        return completed
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        record["ts"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def is_finished(self, code: str) -> bool:
+        entry = self.entries.get(code)
+        return entry is not None and entry["status"] in FINISHED_STATUSES
+
+    def inserted_codes(self) -> Set[str]:
+        return {code for code, entry in self.entries.items() if entry["status"] == "inserted"}
+
+    def record_listing(self, codes: Iterable[str]) -> None:
+        """Journals the OMIE codes known at the start of the run, so a resume can skip the listing."""
+        self.listing = set(codes)
+        self._write({"event": "listing", "codes": sorted(self.listing)})
+
+    def record(self, code: str, status: str, **fields: Any) -> None:
+        """Journals one product outcome: inserted, updated, failed or skipped."""
+        entry = {"event": "product", "code": code, "status": status, **fields}
+        self.entries[code] = entry
+        self._write(dict(entry))
+
+    def complete(self) -> None:
+        """Marks the run as finished; the next resume starts from scratch."""
+        self._write({"event": "complete"})
+
+    def close(self) -> None:
+        self._file.close()
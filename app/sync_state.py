@@ -0,0 +1,94 @@
+import hashlib
+import json
+import sqlite3
+import logging
+from typing import Any, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProductState(NamedTuple):
+    update_date: Optional[str]
+    payload_hash: str
+    payload_json: Optional[str] = None
+
+    @property
+    def payload(self) -> Optional[Dict[str, Any]]:
+        """The OMIE payload last synced for this product, if it was stored."""
+        return json.loads(self.payload_json) if self.payload_json else None
+
+
+def payload_hash(payload: Dict[str, Any]) -> str:
+    """Stable hash of a mapped OMIE payload (key order does not matter)."""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SyncStateStore:
+    """
+    SQLite record of what the last successful sync sent for each product:
+    the SPOT UpdateDate, a hash of the mapped OMIE payload and the payload itself
+    (used to send only the changed fields when a product is updated).
+
+    All rows are loaded once at startup so per-product lookups never touch disk;
+    writes are committed every `commit_every` records and on close().
+    """
+
+    def __init__(self, path: str = "sync_state.db", commit_every: int = 100):
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS product_state (
+                code TEXT PRIMARY KEY,
+                update_date TEXT,
+                payload_hash TEXT NOT NULL,
+                synced_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(product_state)")}
+        if "payload" not in columns:
+            self._conn.execute("ALTER TABLE product_state ADD COLUMN payload TEXT")
+        self._conn.commit()
+        self._states: Dict[str, ProductState] = {
+            code: ProductState(update_date, digest, payload_json)
+            for code, update_date, digest, payload_json in self._conn.execute(
+                "SELECT code, update_date, payload_hash, payload FROM product_state"
+            )
+        }
+        logger.info(f"Loaded sync state for {len(self._states)} products from {path}")
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, code: str) -> Optional[ProductState]:
+        return self._states.get(code)
+
+    def is_unchanged(self, code: str, update_date: Optional[str]) -> bool:
+        """True when SPOT reports the same UpdateDate that was last synced."""
+        state = self._states.get(code)
+        return bool(update_date) and state is not None and state.update_date == update_date
+
+    def record(self, code: str, update_date: Optional[str], digest: str,
+               payload: Optional[Dict[str, Any]] = None) -> None:
+        payload_json = json.dumps(payload, ensure_ascii=False) if payload is not None else None
+        self._states[code] = ProductState(update_date, digest, payload_json)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO product_state (code, update_date, payload_hash, payload, synced_at) "
+            "VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
+            (code, update_date, digest, payload_json),
+        )
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self) -> None:
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        self.commit()
+        self._conn.close()
@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """
+    Holds a session token with an expiry, in memory and optionally on disk.
+
+    `lock` is meant to be held by whoever refreshes the token, so that when
+    several threads find the cache empty only one of them re-authenticates.
+    Tokens read back from disk are flagged with `needs_validation` because
+    the server may have dropped them in the meantime.
+    """
+
+    def __init__(self, ttl: float = 1800, path: Optional[str] = None):
+        self.ttl = ttl
+        self.path = path
+        self.lock = threading.Lock()
+        self.needs_validation = False
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        if path:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable token cache {self.path}: {e}")
+            return
+
+        if data.get("token") and data.get("expires_at", 0) > time.time():
+            self._token = data["token"]
+            self._expires_at = data["expires_at"]
+            self.needs_validation = True
+            logger.info("Loaded cached SPOT session token from disk.")
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"token": self._token, "expires_at": self._expires_at}, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self) -> Optional[str]:
+        """Returns the cached token, or None if there is none or it has expired."""
+        if self._token and time.time() < self._expires_at:
+            return self._token
+        return None
+
+    def set(self, token: Optional[str]) -> None:
+        if not token:
+            self.invalidate()
+            return
+        self._token = token
+        self._expires_at = time.time() + self.ttl
+        self.needs_validation = False
+        if self.path:
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"Could not write token cache {self.path}: {e}")
+
+    def invalidate(self) -> None:
+        self._token = None
+        self._expires_at = 0.0
+        self.needs_validation = False
+        if self.path and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.warning(f"Could not remove token cache {self.path}: {e}")
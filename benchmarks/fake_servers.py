@@ -0,0 +1,378 @@
+import json
+import math
+import random
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class LoadProfile(NamedTuple):
+    """
+    Shape of one load test.
+
+    Every request to a fake server waits a log-normal latency around
+    `spot_latency_ms` / `omie_latency_ms` (spread `latency_sigma`); `slow_rate`
+    of them wait `slow_ms` more (slow pages, stalls). The fault rates apply to
+    each OMIE write call, except `ncm_fault_rate`: like real OMIE, the fake
+    rejects a fixed share of the catalog's NCM codes on every call that uses
+    them. `drop_rate` applies to every OMIE call, by closing the connection
+    without answering.
+    """
+    products: int = 10_000
+    existing_ratio: float = 0.5      # share of the catalog already in OMIE
+    skus_per_product: int = 3        # OptionalsPrice rows (colors) per product
+    spot_latency_ms: float = 50
+    omie_latency_ms: float = 80
+    latency_sigma: float = 0.5
+    slow_rate: float = 0.0
+    slow_ms: float = 2000
+    ncm_fault_rate: float = 0.0      # share of NCM codes OMIE answers with "NCM não cadastrada"
+    throttle_rate: float = 0.0       # "Limite de requisições" faults (HTTP 500, retryable)
+    server_error_rate: float = 0.0   # "Erro interno" SOAP-ENV:Server faults (retryable)
+    fatal_fault_rate: float = 0.0    # faults that stop the sync (account without API access)
+    drop_rate: float = 0.0
+    seed: int = 42
+
+
+# NCMs the generated catalog draws from; 96171000 is one the mapper corrects. Synthetic
+# codes widen the pool so a rejected NCM hits a small group of products, as in a real catalog.
+CATALOG_NCMS = ("96081000", "48201000", "42029200", "39269090", "96171000", "8523.51.10") + tuple(
+    f"{39000000 + 7919 * k:08d}" for k in range(194)
+)
+CATALOG_COLORS = (("103", "Preto"), ("105", "Vermelho"), ("104", "Azul"), ("106", "Branco"), ("109", "Verde"))
+
+
+def make_catalog(profile: LoadProfile) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Builds a synthetic SPOT catalog: (Products, OptionalsPrice). Products carry
+    the bulky fields real SPOT products have (images, keywords, customization
+    tables) so memory measurements are representative.
+    """
+    rng = random.Random(profile.seed)
+    products, prices = [], []
+    for i in range(profile.products):
+        reference = str(100000 + i)
+        colors = [CATALOG_COLORS[(i + k) % len(CATALOG_COLORS)] for k in range(max(1, profile.skus_per_product))]
+        products.append({
+            "ProdReference": reference,
+            "Name": f"{reference}. Produto de teste {i}",
+            "Description": f"Produto de teste {i} para carga. " * 6,
+            "ShortDescription": f"Produto de teste {i}",
+            "Taric": CATALOG_NCMS[i % len(CATALOG_NCMS)],
+            "Colors": ", ".join(name for _, name in colors),
+            "Weight": rng.randint(5, 2000),
+            "UpdateDate": "2024-05-01T10:00:00",
+            "Type": "Escrita",
+            "SubType": "Canetas",
+            "Brand": "SPOT",
+            "CountryOfOrigin": "China",
+            "Materials": "Plástico ABS",
+            "MainImage": f"{reference}.jpg",
+            "AllImageList": ",".join(f"{reference}_{code}.jpg" for code, _ in colors),
+            "KeyWords": "caneta,brinde,escritório,personalizado,promocional",
+            "CustomizationTypes": "Tampografia,Serigrafia,Laser",
+            "CustomizationTables": [{"Table": t, "Location": "Corpo", "MaxColors": 4} for t in ("T1", "T2", "T3")],
+            "BoxQuantity": 500,
+            "BoxWeightKG": 8.5,
+            "IsStockOut": False,
+        })
+        for code, name in colors:
+            price = round(rng.uniform(0.3, 80), 2)
+            prices.append({
+                "Sku": f"{reference}-{code}",
+                "ProdReference": reference,
+                "ColorDesc1": name,
+                "ColorCode": code,
+                "YourPrice": price,
+                "MinQt1": 1.0,
+                "Price1": price,
+                "MinQt2": 100.0,
+                "Price2": round(price * 0.9, 2),
+            })
+    return products, prices
+
+
+class _FakeServer:
+    """A ThreadingHTTPServer on 127.0.0.1 (random port) serving in a background thread."""
+
+    path_prefix = ""
+
+    def __init__(self, profile: LoadProfile):
+        self.profile = profile
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(profile.seed + 1)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self, "GET")
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{self.path_prefix}"
+
+    def start(self) -> "_FakeServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _delay(self, latency_ms: float) -> None:
+        """Sleeps one request's simulated latency."""
+        if latency_ms <= 0 and self.profile.slow_rate <= 0:
+            return
+        with self._lock:
+            seconds = latency_ms / 1000 * math.exp(self._rng.gauss(0, self.profile.latency_sigma))
+            if self._rng.random() < self.profile.slow_rate:
+                seconds += self.profile.slow_ms / 1000
+        time.sleep(seconds)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, body: Any) -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json; charset=utf-8")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        view = memoryview(data)
+        for start in range(0, len(data), 64 * 1024):
+            handler.wfile.write(view[start:start + 64 * 1024])
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        raise NotImplementedError
+
+
+class FakeSpotServer(_FakeServer):
+    """
+    Stand-in for the SPOT API (authenticateclient, validateSession, products,
+    optionalsPrice). The catalog is serialized once, up front, so serving it
+    costs the server nothing per request.
+    """
+
+    path_prefix = "/api/v1"
+
+    def __init__(self, profile: LoadProfile, products: Iterable[Dict[str, Any]],
+                 prices: Iterable[Dict[str, Any]], access_key: str = "bench"):
+        super().__init__(profile)
+        self.access_key = access_key
+        self.tokens = set()
+        self._products = json.dumps({"Products": list(products)}, ensure_ascii=False).encode("utf-8")
+        self._prices = json.dumps({"OptionalsPrice": list(prices)}, ensure_ascii=False).encode("utf-8")
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        url = urlparse(handler.path)
+        endpoint = url.path[len(self.path_prefix):].strip("/")
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self._count(endpoint)
+        self._delay(self.profile.spot_latency_ms)
+
+        if endpoint == "authenticateclient":
+            if query.get("AccessKey") != self.access_key:
+                self._send(handler, 200, {"ErrorCode": 1, "ErrorMessage": "Invalid AccessKey"})
+                return
+            token = secrets.token_hex(16)
+            with self._lock:
+                self.tokens.add(token)
+            self._send(handler, 200, {"Token": token})
+        elif endpoint == "validateSession":
+            self._send(handler, 200, {"Status": 1 if query.get("token") in self.tokens else 0})
+        elif endpoint in ("products", "optionalsPrice"):
+            if query.get("token") not in self.tokens:
+                self._send(handler, 200, {"ErrorCode": 2, "ErrorMessage": "Invalid token"})
+                return
+            self._send(handler, 200, self._products if endpoint == "products" else self._prices)
+        else:
+            self._send(handler, 404, {"ErrorCode": 404, "ErrorMessage": f"Unknown endpoint {endpoint}"})
+
+
+class FakeOmieServer(_FakeServer):
+    """
+    Stand-in for the OMIE product API: ListarProdutos, ConsultarProduto,
+    IncluirProduto, AlterarProduto and IncluirProdutosPorLote, backed by an
+    in-memory product table seeded with `existing` integration codes.
+    """
+
+    path_prefix = "/api/v1/geral/produtos/"
+
+    # Calls that write products; fault injection applies to these
+    WRITE_CALLS = ("IncluirProduto", "AlterarProduto", "IncluirProdutosPorLote")
+
+    def __init__(self, profile: LoadProfile, existing: Iterable[str] = (),
+                 app_key: str = "bench", app_secret: str = "bench"):
+        super().__init__(profile)
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.records: Dict[str, Dict[str, Any]] = {}
+        # Day each record was last included or changed, for ListarProdutos' filtrar_por_data_de
+        self.changed_on: Dict[str, date] = {}
+        for code in existing:
+            self._store({"codigo_produto_integracao": code, "descricao": f"Produto {code}"},
+                        changed_on=date.today() - timedelta(days=30))
+
+    def _store(self, product: Dict[str, Any], changed_on: Optional[date] = None) -> Dict[str, Any]:
+        record = {**product, "codigo_produto": len(self.records) + 1}
+        self.records[product["codigo_produto_integracao"]] = record
+        self.changed_on[product["codigo_produto_integracao"]] = changed_on or date.today()
+        return record
+
+    def rejects_ncm(self, ncm: Optional[str]) -> bool:
+        """Whether this OMIE lacks `ncm`; fixed per code (and seed), whatever the call order."""
+        return bool(ncm) and random.Random(f"{self.profile.seed}:{ncm}").random() < self.profile.ncm_fault_rate
+
+    @staticmethod
+    def _fault(faultcode: str, faultstring: str) -> Dict[str, str]:
+        return {"faultcode": faultcode, "faultstring": faultstring}
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        body = handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+        request = json.loads(body or b"{}")
+        call = request.get("call", "")
+        param = (request.get("param") or [{}])[0]
+        self._count(call)
+        self._delay(self.profile.omie_latency_ms)
+
+        if self._chance(self.profile.drop_rate):
+            self._count("dropped")
+            handler.close_connection = True
+            return
+        if request.get("app_key") != self.app_key or request.get("app_secret") != self.app_secret:
+            self._send(handler, 500, self._fault("SOAP-ENV:Client-5", "ERROR: Chave de acesso inválida"))
+            return
+        if call in self.WRITE_CALLS:
+            fault = self._injected_fault() or self._ncm_fault(param)
+            if fault is not None:
+                self._send(handler, 500, fault)
+                return
+
+        status, response = getattr(self, f"_{call}", self._unknown)(param)
+        self._send(handler, status, response)
+
+    def _injected_fault(self) -> Optional[Dict[str, str]]:
+        if self._chance(self.profile.throttle_rate):
+            self._count("throttled")
+            return self._fault("SOAP-ENV:Client-8", "ERROR: Limite de requisições por minuto excedido")
+        if self._chance(self.profile.server_error_rate):
+            self._count("server_errors")
+            return self._fault("SOAP-ENV:Server", "ERROR: Erro interno ao processar a requisição")
+        if self._chance(self.profile.fatal_fault_rate):
+            self._count("fatal_faults")
+            return self._fault("SOAP-ENV:Client-5", "ERROR: Conta sem permissão de acesso à API")
+        return None
+
+    def _ncm_fault(self, param: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        products = param.get("produto_servico_cadastro") or [param]
+        ncm = next((p.get("ncm") for p in products if self.rejects_ncm(p.get("ncm"))), None)
+        if ncm is None:
+            return None
+        self._count("ncm_faults")
+        return self._fault("SOAP-ENV:Client-103", f"ERROR: NCM não cadastrada para o produto [{ncm}]")
+
+    def _unknown(self, param: Dict[str, Any]):
+        return 500, self._fault("SOAP-ENV:Client-1", "ERROR: Método não encontrado")
+
+    def _ListarProdutos(self, param: Dict[str, Any]):
+        page = int(param.get("pagina", 1))
+        page_size = int(param.get("registros_por_pagina", 50))
+        since = param.get("filtrar_por_data_de")
+        since = datetime.strptime(since, "%d/%m/%Y").date() if since else None
+        with self._lock:
+            records = [record for code, record in self.records.items()
+                       if since is None or self.changed_on[code] >= since]
+        total_pages = max(1, math.ceil(len(records) / page_size))
+        chunk = records[(page - 1) * page_size:page * page_size]
+        if not chunk:
+            # OMIE has no empty page: an empty listing (or filtered window) is a fault
+            return 500, self._fault("SOAP-ENV:Client-5113", f"ERROR: Não existem registros para a página [{page}]!")
+        return 200, {
+            "pagina": page,
+            "total_de_paginas": total_pages,
+            "registros": len(chunk),
+            "total_de_registros": len(records),
+            "produto_servico_cadastro": chunk,
+        }
+
+    def _ConsultarProduto(self, param: Dict[str, Any]):
+        with self._lock:
+            record = self.records.get(param.get("codigo_produto_integracao"))
+        if record is None:
+            return 500, self._fault("SOAP-ENV:Client-103", "ERROR: Produto não encontrado")
+        return 200, record
+
+    def _IncluirProduto(self, param: Dict[str, Any]):
+        code = param.get("codigo_produto_integracao")
+        with self._lock:
+            if code in self.records:
+                return 500, self._fault("SOAP-ENV:Client-102",
+                                        f"ERROR: Produto já cadastrado para o Código de Integração [{code}] !")
+            record = self._store(param)
+        return 200, {
+            "codigo_produto": record["codigo_produto"],
+            "codigo_produto_integracao": code,
+            "codigo_status": "0",
+            "descricao_status": "Produto cadastrado com sucesso!",
+        }
+
+    def _AlterarProduto(self, param: Dict[str, Any]):
+        code = param.get("codigo_produto_integracao")
+        with self._lock:
+            record = self.records.get(code)
+            if record is None:
+                return 500, self._fault("SOAP-ENV:Client-103", "ERROR: Produto não encontrado")
+            record.update(param)
+            self.changed_on[code] = date.today()
+        return 200, {
+            "codigo_produto": record["codigo_produto"],
+            "codigo_produto_integracao": code,
+            "codigo_status": "0",
+            "descricao_status": "Produto alterado com sucesso!",
+        }
+
+    def _IncluirProdutosPorLote(self, param: Dict[str, Any]):
+        lot = param.get("produto_servico_cadastro", [])
+        with self._lock:
+            duplicates = [p.get("codigo_produto_integracao") for p in lot if p.get("codigo_produto_integracao") in self.records]
+            if duplicates:
+                return 200, {"lote": param.get("lote"), "codigo_status": "1",
+                             "descricao_status": f"Produtos já cadastrados: {duplicates}"}
+            for product in lot:
+                self._store(product)
+        return 200, {"lote": param.get("lote"), "codigo_status": "0",
+                     "descricao_status": f"Lote processado com sucesso ({len(lot)} produtos)"}
@@ -0,0 +1,145 @@
+"""
+End-to-end load test of sync_products against local fake SPOT and OMIE servers.
+
+    python -m benchmarks.load_test --products 20000 --workers 8 --max-rps 50 \\
+        --omie-latency-ms 120 --slow-rate 0.01 --throttle-rate 0.005 --report bench.json
+
+Every LoadProfile field is a flag (see fake_servers.py). The servers run in this
+process; the sync runs in a fresh child process so its wall time and peak
+memory are measured on their own. Prints a JSON report with wall time,
+throughput, peak RSS, the calls each fake server received and the sync's own
+metrics (see app/metrics.py).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from benchmarks.fake_servers import FakeOmieServer, FakeSpotServer, LoadProfile, make_catalog
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_sync(options: Dict[str, Any], log_level: str, results) -> None:
+    """Child process: imports the app, runs one sync and reports time and memory."""
+    sys.path.insert(0, APP_DIR)
+    from event_log import configure_logging
+    from product_sync import sync_products
+
+    configure_logging(level=log_level)
+    baseline = _peak_rss_mib()
+    started = time.perf_counter()
+    try:
+        sync_products("bench", "bench", "bench", **options)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    results.put({
+        "wall_seconds": time.perf_counter() - started,
+        "peak_rss_mib": _peak_rss_mib(),
+        "baseline_rss_mib": baseline,
+        "error": error,
+    })
+
+
+def run_load_test(profile: LoadProfile, workers: int = 4, max_rps: float = 50.0, list_workers: int = 4,
+                  stream: bool = True, lot_size: Optional[int] = None, update_existing: bool = False,
+                  log_level: str = "WARNING", workdir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Runs one sync of a `profile`-shaped catalog against fresh fake servers and
+    returns the report. State, snapshots and metrics go to `workdir` (a
+    temporary directory by default).
+    """
+    products, prices = make_catalog(profile)
+    existing_count = int(len(products) * profile.existing_ratio)
+    existing = [p["ProdReference"] for p in products[:existing_count]]
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeSpotServer(profile, products, prices) as spot, \
+            FakeOmieServer(profile, existing) as omie:
+        workdir = workdir or tmp
+        metrics_path = os.path.join(workdir, "metrics.json")
+        options = {
+            "workers": workers,
+            "max_rps": max_rps,
+            "list_workers": list_workers,
+            "stream": stream,
+            "lot_size": lot_size,
+            "update_existing": update_existing,
+            "snapshot_dir": os.path.join(workdir, "snapshots"),
+            "metrics_path": metrics_path,
+            "spot_base_url": spot.url,
+            "omie_url": omie.url,
+        }
+        del products, prices  # the SPOT server keeps the serialized catalog
+
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        child = context.Process(target=_run_sync, args=(options, log_level, results), name="sync")
+        child.start()
+        outcome = results.get()
+        child.join()
+
+        with open(metrics_path, encoding="utf-8") as f:
+            metrics = json.load(f)
+        spot_calls, omie_calls = dict(spot.stats), dict(omie.stats)
+        omie_products = len(omie.records)
+
+    wall = outcome["wall_seconds"]
+    return {
+        "profile": profile._asdict(),
+        "workers": workers,
+        "max_rps": max_rps,
+        "stream": stream,
+        "lot_size": lot_size,
+        **outcome,
+        "throughput_products_per_second": profile.products / wall if wall else None,
+        "omie_writes_per_second": sum(omie_calls.get(call, 0) for call in FakeOmieServer.WRITE_CALLS) / wall
+        if wall else None,
+        "outcomes": {entry["labels"]["outcome"]: entry["value"] for entry in metrics["gauges"].get("sync_products", [])},
+        "omie_products_after": omie_products,
+        "spot_calls": spot_calls,
+        "omie_calls": omie_calls,
+        "metrics": metrics,
+    }
+
+
+def main(argv=None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    for field, default in LoadProfile._field_defaults.items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(default), default=default)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-rps", type=float, default=50.0)
+    parser.add_argument("--list-workers", type=int, default=4)
+    parser.add_argument("--lot-size", type=int, default=None)
+    parser.add_argument("--update-existing", action="store_true")
+    parser.add_argument("--no-stream", dest="stream", action="store_false")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--report", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    profile = LoadProfile(**{field: getattr(args, field) for field in LoadProfile._fields})
+    report = run_load_test(profile, workers=args.workers, max_rps=args.max_rps, list_workers=args.list_workers,
+                           stream=args.stream, lot_size=args.lot_size, update_existing=args.update_existing,
+                           log_level=args.log_level)
+    summary = {key: value for key, value in report.items() if key != "metrics"}
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import asyncio
+import threading
+from unittest.mock import MagicMock
+from app.async_clients import AsyncOmieClient, AsyncSpotClient
+
+
+def test_calls_run_in_client_threads():
+    omie = MagicMock()
+    omie.insert_product.side_effect = lambda payload: {"thread": threading.current_thread().name}
+    client = AsyncOmieClient(omie, max_workers=2)
+
+    result = asyncio.run(client.insert_product({"codigo": "A"}))
+    client.close()
+
+    assert result["thread"].startswith("omie")
+    omie.insert_product.assert_called_once_with({"codigo": "A"})
+
+
+def test_batches_pull_a_generator_lazily():
+    pulled = []
+
+    def products():
+        for i in range(5):
+            pulled.append(i)
+            yield i
+
+    client = AsyncSpotClient(MagicMock())
+
+    async def first_batch():
+        batches = client.batches(products(), 2)
+        batch = await batches.__anext__()
+        await batches.aclose()
+        return batch
+
+    assert asyncio.run(first_batch()) == [0, 1]
+    assert pulled == [0, 1]
+
+    async def collect():
+        return [batch async for batch in client.batches(range(5), 2)]
+
+    assert asyncio.run(collect()) == [[0, 1], [2, 3], [4]]
+    client.close()
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+from benchmarks.fake_servers import CATALOG_NCMS, FakeOmieServer, FakeSpotServer, LoadProfile, make_catalog
+from benchmarks.load_test import run_load_test
+from app.omie_client import OmieClient
+from app.spot_client import SpotClient
+
+FAST = LoadProfile(products=10, existing_ratio=0.7, skus_per_product=2, spot_latency_ms=0, omie_latency_ms=0)
+
+
+def test_fake_servers_speak_the_client_protocols(tmp_path):
+    products, prices = make_catalog(FAST)
+    with FakeSpotServer(FAST, products, prices) as spot, FakeOmieServer(FAST, ["100000"]) as omie:
+        spot_client = SpotClient("bench", base_url=spot.url, token_cache_path=str(tmp_path / "token.json"))
+        omie_client = OmieClient("bench", "bench", rate_limit=100, max_rate_limit=100, url=omie.url)
+
+        assert [p["ProdReference"] for p in spot_client.iter_products()] == [p["ProdReference"] for p in products]
+        assert len(spot_client.fetch_price()["OptionalsPrice"]) == 20
+        assert [p["codigo_produto_integracao"] for p in omie_client.list_products()] == ["100000"]
+        assert omie_client.insert_product({"codigo_produto_integracao": "100001"})["codigo_status"] == "0"
+        assert omie_client.insert_product({"codigo_produto_integracao": "100001"})["faultcode"] == "SOAP-ENV:Client-102"
+
+    assert spot.stats["authenticateclient"] == 1
+    assert omie.stats["IncluirProduto"] == 2
+
+
+def test_fake_omie_rejects_the_same_ncm_codes_on_every_call():
+    profile = FAST._replace(ncm_fault_rate=0.5)
+    with FakeOmieServer(profile) as omie:
+        client = OmieClient("bench", "bench", rate_limit=100, max_rate_limit=100, url=omie.url)
+        rejected = [ncm for ncm in CATALOG_NCMS if omie.rejects_ncm(ncm)]
+        accepted = [ncm for ncm in CATALOG_NCMS if not omie.rejects_ncm(ncm)]
+        for i in range(2):
+            result = client.insert_product({"codigo_produto_integracao": f"A{i}", "ncm": rejected[0]})
+            assert "NCM não cadastrada" in result["faultstring"]
+        assert client.insert_product({"codigo_produto_integracao": "B1", "ncm": accepted[0]})["codigo_status"] == "0"
+
+    assert 0 < len(rejected) < len(CATALOG_NCMS)
+    assert omie.stats["ncm_faults"] == 2 and list(omie.records) == ["B1"]
+
+
+def test_fake_omie_listing_faults_when_empty_and_filters_by_date():
+    with FakeOmieServer(FAST, ["100000"]) as omie:
+        client = OmieClient("bench", "bench", rate_limit=100, max_rate_limit=100, url=omie.url)
+        yesterday = date.today() - timedelta(days=1)
+
+        # The seeded product changed long ago: nothing in the window, which OMIE answers with a fault
+        assert client.list_products(workers=2, changed_since=yesterday) == []
+        client.insert_product({"codigo_produto_integracao": "100001"})
+        assert [p["codigo_produto_integracao"] for p in client.list_products(changed_since=yesterday)] == ["100001"]
+
+    with FakeOmieServer(FAST) as omie:
+        response = OmieClient("bench", "bench", url=omie.url)._make_request(
+            {"app_key": "bench", "app_secret": "bench", "call": "ListarProdutos", "param": [{"pagina": 1}]})
+    assert response.status_code == 500 and response.json()["faultcode"] == "SOAP-ENV:Client-5113"
+
+
+def test_load_test_smoke():
+    report = run_load_test(FAST, workers=2, max_rps=100)
+
+    assert report["error"] is None
+    assert report["outcomes"]["inserted"] == 3 and report["outcomes"]["skipped_existing"] == 7
+    assert report["omie_products_after"] == 10
+    assert report["throughput_products_per_second"] > 0 and report["peak_rss_mib"] > 0
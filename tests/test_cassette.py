@@ -0,0 +1,88 @@
+import gzip
+import pytest
+from unittest.mock import patch
+from benchmarks.fake_servers import FakeOmieServer, FakeSpotServer, LoadProfile, make_catalog
+from app.cassette import Cassette, CassetteMiss
+from app.omie_client import OmieClient
+from app.product_sync import sync_products
+from app.snapshots import list_snapshots, read_snapshot
+from app.spot_client import SpotClient
+
+PROFILE = LoadProfile(products=6, existing_ratio=0.5, skus_per_product=1, spot_latency_ms=0, omie_latency_ms=0)
+
+
+def _clients(cassette, spot_url="http://127.0.0.1:9/api/v1", omie_url="http://127.0.0.1:9/api/v1/geral/produtos/"):
+    spot = SpotClient("bench", base_url=spot_url, session=cassette.session())
+    omie = OmieClient("bench", "bench", rate_limit=100, max_rate_limit=100, url=omie_url, session=cassette.session())
+    return spot, omie
+
+
+def test_record_then_replay_offline(tmp_path):
+    path = str(tmp_path / "run.jsonl.gz")
+    products, prices = make_catalog(PROFILE)
+    with FakeSpotServer(PROFILE, products, prices) as spot_server, FakeOmieServer(PROFILE, ["100000"]) as omie_server:
+        with Cassette(path, mode="record") as cassette:
+            spot, omie = _clients(cassette, spot_server.url, omie_server.url)
+            recorded_products = list(spot.iter_products())
+            recorded_listing = omie.list_products()
+            recorded_insert = omie.insert_product({"codigo_produto_integracao": "100001"})
+
+    # Servers are gone: everything below comes from the cassette
+    with Cassette(path, mode="replay") as cassette:
+        spot, omie = _clients(cassette)
+        assert list(spot.iter_products()) == recorded_products
+        assert omie.list_products() == recorded_listing
+        assert omie.insert_product({"codigo_produto_integracao": "100001"}) == recorded_insert
+        # No ConsultarProduto was recorded at all
+        with pytest.raises(CassetteMiss):
+            omie.get_product("100001")
+
+
+def test_cassette_masks_credentials(tmp_path):
+    path = str(tmp_path / "run.jsonl.gz")
+    with FakeSpotServer(PROFILE, [], [], access_key="spot-s3cr3t") as spot_server, \
+            FakeOmieServer(PROFILE, app_key="omie-k3y", app_secret="omie-s3cr3t") as omie_server:
+        with Cassette(path, mode="record") as cassette:
+            spot = SpotClient("spot-s3cr3t", base_url=spot_server.url, session=cassette.session())
+            omie = OmieClient("omie-k3y", "omie-s3cr3t", url=omie_server.url, session=cassette.session())
+            token = spot.get_token()
+            omie.list_products()
+
+    content = gzip.open(path, "rt", encoding="utf-8").read()
+    for secret in ("spot-s3cr3t", "omie-k3y", "omie-s3cr3t", token):
+        assert secret not in content
+
+
+def test_replay_latency_scale(tmp_path):
+    path = str(tmp_path / "run.jsonl.gz")
+    with FakeOmieServer(PROFILE._replace(omie_latency_ms=50, latency_sigma=0)) as omie_server:
+        with Cassette(path, mode="record") as cassette:
+            _, omie = _clients(cassette, omie_url=omie_server.url)
+            omie.list_products()
+
+    with Cassette(path, mode="replay", latency_scale=0.5) as cassette, patch("app.cassette.time.sleep") as sleep:
+        _, omie = _clients(cassette)
+        omie.list_products()
+
+    # time.sleep is patched for every module; the cassette's sleep is the longest one
+    recorded = max(call.args[0] for call in sleep.call_args_list) / 0.5
+    assert 0.05 <= recorded < 1
+
+
+def test_sync_products_replays_a_recorded_run(tmp_path):
+    path = str(tmp_path / "run.jsonl.gz")
+    products, prices = make_catalog(PROFILE)
+    with FakeSpotServer(PROFILE, products, prices) as spot_server, \
+            FakeOmieServer(PROFILE, ["100000", "100001", "100002"]) as omie_server:
+        sync_products("bench", "bench", "bench", stream=True, snapshot_dir=str(tmp_path / "recorded"),
+                      spot_base_url=spot_server.url, omie_url=omie_server.url,
+                      cassette_path=path, cassette_mode="record")
+        inserted = omie_server.stats["IncluirProduto"]
+
+    replayed = str(tmp_path / "replayed")
+    sync_products("bench", "bench", "bench", stream=True, snapshot_dir=replayed,
+                  cassette_path=path, cassette_mode="replay")
+
+    assert inserted == 3
+    assert list(read_snapshot("inserted_products", replayed)["code"].astype(str)) == ["100003", "100004", "100005"]
+    assert not list_snapshots("error_products", replayed)
@@ -0,0 +1,45 @@
+from app.dead_letters import DeadLetterStore
+
+PAYLOAD = {"codigo_produto_integracao": "A1", "ncm": "96171000"}
+
+
+def test_record_counts_attempts_and_survives_reopen(tmp_path):
+    path = str(tmp_path / "dead.db")
+    store = DeadLetterStore(path)
+    store.record("A1", "insert", PAYLOAD, "SOAP-ENV:Client-103", "NCM não cadastrada", "skippable",
+                 name="Caneta", update_date="2024-01-01", spot_ncm="9617.10.00")
+    store.record("A1", "insert", {**PAYLOAD, "ncm": "90251990"}, "SOAP-ENV:Server", "Erro interno", "retryable")
+    store.close()
+
+    store = DeadLetterStore(path)
+    letter = store.get("A1")
+    assert letter.attempts == 2
+    assert letter.payload["ncm"] == "90251990"
+    assert (letter.error_code, letter.fault_class) == ("SOAP-ENV:Server", "retryable")
+    # A later failure without the SPOT NCM keeps the one stored first
+    assert letter.spot_ncm == "9617.10.00"
+    store.close()
+
+
+def test_resolve_removes_synced_products(tmp_path):
+    store = DeadLetterStore(str(tmp_path / "dead.db"))
+    store.record("A1", "insert", PAYLOAD, "X", "x")
+    store.record("B2", "update", PAYLOAD, "Y", "y")
+
+    store.resolve("A1")
+    store.resolve("never-failed")
+
+    assert "A1" not in store and len(store) == 1
+    assert [letter.code for letter in store.letters()] == ["B2"]
+    store.close()
+
+
+def test_letters_filters_by_code_and_attempts(tmp_path):
+    store = DeadLetterStore(str(tmp_path / "dead.db"))
+    for code in ("A1", "B2", "C3"):
+        store.record(code, "insert", PAYLOAD, "X", "x")
+    store.record("C3", "insert", PAYLOAD, "X", "x")
+
+    assert [letter.code for letter in store.letters(["B2", "C3"])] == ["B2", "C3"]
+    assert [letter.code for letter in store.letters(max_attempts=2)] == ["A1", "B2"]
+    store.close()
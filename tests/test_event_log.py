@@ -0,0 +1,52 @@
+import io
+import json
+import logging
+import pytest
+from app import event_log
+from app.event_log import configure_logging, log_payload, redact
+
+
+@pytest.fixture
+def restore_root_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    root.handlers[:] = handlers
+    root.setLevel(level)
+    event_log._payload_every = 100
+
+
+def test_json_lines_through_queue_listener(restore_root_logging):
+    stream = io.StringIO()
+    listener = configure_logging(level="INFO", json_lines=True, stream=stream)
+
+    logging.getLogger("product_sync").info("Skipping %s", "A1", extra={"event": "skip", "code": "A1"})
+    logging.getLogger("omie_client").info("GET /authenticateclient?AccessKey=s3cr3t&lang=PT")
+    logging.getLogger("omie_client").debug("not enabled")
+    listener.stop()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(lines) == 2
+    assert lines[0]["msg"] == "Skipping A1"
+    assert lines[0]["event"] == "skip" and lines[0]["code"] == "A1" and lines[0]["level"] == "INFO"
+    assert "s3cr3t" not in lines[1]["msg"] and "AccessKey=***" in lines[1]["msg"]
+
+
+def test_log_payload_renders_only_at_debug_and_is_sampled(restore_root_logging, caplog):
+    logger = logging.getLogger("test_payloads")
+    event_log._payload_every = 3
+
+    with caplog.at_level(logging.INFO):
+        assert not log_payload(logger, "Payload", {"codigo": "A"})
+    assert caplog.records == []
+
+    with caplog.at_level(logging.DEBUG):
+        logged = [log_payload(logger, "Payload", {"codigo": i, "app_secret": "x"}) for i in range(6)]
+    assert logged.count(True) == 2
+    assert all('"app_secret": "***"' in r.getMessage() for r in caplog.records)
+
+
+def test_redact_masks_nested_credentials():
+    payload = {"app_key": "k", "call": "IncluirProduto", "param": [{"codigo": "A", "token": "t"}]}
+
+    assert redact(payload) == {"app_key": "***", "call": "IncluirProduto", "param": [{"codigo": "A", "token": "***"}]}
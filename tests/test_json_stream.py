@@ -0,0 +1,41 @@
+import json
+import pytest
+from app.json_stream import iter_json_array
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 100000])
+def test_iter_json_array_yields_items_across_chunk_boundaries(chunk_size):
+    products = [
+        {"ProdReference": "11103", "Name": "Borracha branca", "Weight": 1, "Taric": "4016.92.00"},
+        {"ProdReference": "93800", "Name": "Caneta ação", "Weight": 12345, "KeyWords": ["a", "b"]},
+        {"ProdReference": "X", "Description": "Texto com \"aspas\" e ] colchetes }", "Weight": 0.5},
+    ]
+    body = json.dumps({"Products": products}, ensure_ascii=False).encode("utf-8")
+
+    assert list(iter_json_array(_chunks(body, chunk_size), "Products")) == products
+
+
+def test_iter_json_array_collects_other_members_in_meta():
+    body = b'{"ErrorCode": null, "Products": [{"a": 1}], "Total": 1}'
+    meta = {}
+
+    assert list(iter_json_array(_chunks(body, 4), "Products", meta)) == [{"a": 1}]
+    assert meta == {"ErrorCode": None, "Total": 1}
+
+
+def test_iter_json_array_handles_empty_and_missing_arrays():
+    assert list(iter_json_array([b'{"Products": []}'], "Products")) == []
+    assert list(iter_json_array([b'{}'], "Products")) == []
+
+    meta = {}
+    assert list(iter_json_array([b'{"ErrorCode": 401, "ErrorMessage": "Invalid"}'], "Products", meta)) == []
+    assert meta["ErrorCode"] == 401
+
+
+def test_iter_json_array_rejects_truncated_stream():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"Products": [{"a": 1}, {"b":'], "Products"))
@@ -0,0 +1,97 @@
+import json
+import requests
+from unittest.mock import patch, MagicMock
+from app.metrics import Metrics
+from app.omie_client import OmieClient
+from app.product_sync import sync_products
+
+
+def test_counters_gauges_and_histograms():
+    metrics = Metrics(buckets=(0.1, 1))
+    metrics.inc("omie_faults_total", call="IncluirProduto", faultcode="SOAP-ENV:Client-101")
+    metrics.inc("omie_faults_total", call="IncluirProduto", faultcode="SOAP-ENV:Client-101")
+    metrics.set("sync_products", 3, outcome="inserted")
+    for seconds in (0.05, 0.5, 2):
+        metrics.observe("omie_request_seconds", seconds, call="IncluirProduto")
+
+    assert metrics.counter("omie_faults_total", call="IncluirProduto", faultcode="SOAP-ENV:Client-101") == 2
+    assert metrics.gauge("sync_products", outcome="inserted") == 3
+    histogram = metrics.histogram("omie_request_seconds", call="IncluirProduto")
+    assert histogram.count == 3 and histogram.sum == 2.55
+    assert list(histogram.cumulative()) == [(0.1, 1), (1, 2), (float("inf"), 3)]
+
+
+def test_prometheus_textfile(tmp_path):
+    metrics = Metrics(buckets=(1,))
+    metrics.inc("omie_retries_total", call="ListarProdutos", error="ConnectionError")
+    metrics.observe("sync_phase_seconds", 0.25, phase="startup")
+
+    path = metrics.write(str(tmp_path / "sync.prom"))
+
+    lines = open(path).read().splitlines()
+    assert "# TYPE spot_omie_omie_retries_total counter" in lines
+    assert 'spot_omie_omie_retries_total{call="ListarProdutos",error="ConnectionError"} 1' in lines
+    assert 'spot_omie_sync_phase_seconds_bucket{phase="startup",le="1"} 1' in lines
+    assert 'spot_omie_sync_phase_seconds_bucket{phase="startup",le="+Inf"} 1' in lines
+    assert 'spot_omie_sync_phase_seconds_sum{phase="startup"} 0.25' in lines
+    assert 'spot_omie_sync_phase_seconds_count{phase="startup"} 1' in lines
+
+
+def test_json_report(tmp_path):
+    metrics = Metrics()
+    metrics.inc("spot_reauth_total", endpoint="products")
+
+    report = json.loads(open(metrics.write(str(tmp_path / "metrics.json"))).read())
+
+    assert report["counters"]["spot_reauth_total"] == [{"labels": {"endpoint": "products"}, "value": 1}]
+
+
+@patch("app.omie_client.requests.Session.post")
+def test_omie_client_counts_retries_backoff_and_faults(mock_post):
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+    fault = MagicMock(status_code=500)
+    fault.json.return_value = {"faultstring": "Já cadastrado", "faultcode": "SOAP-ENV:Client-102"}
+    mock_post.side_effect = [requests.exceptions.ConnectionError("reset"), fault]
+
+    with patch("tenacity.nap.time.sleep"):
+        result = client.insert_product({"codigo_produto_integracao": "A1"})
+
+    assert result["faultcode"] == "SOAP-ENV:Client-102"
+    metrics = client.metrics
+    assert metrics.counter("omie_retries_total", call="IncluirProduto", error="ConnectionError") == 1
+    # First backoff: 0.5s plus up to 0.5s of jitter
+    assert 0.5 <= metrics.counter("omie_backoff_seconds_total", call="IncluirProduto") <= 1
+    assert metrics.counter("omie_faults_total", call="IncluirProduto", faultcode="SOAP-ENV:Client-102") == 1
+    assert metrics.counter("omie_requests_total", call="IncluirProduto", status=500) == 1
+    assert metrics.histogram("omie_request_seconds", call="IncluirProduto").count == 2
+
+
+@patch("app.product_sync.SnapshotWriter")
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_writes_metrics_report(mock_omie_cls, mock_spot_cls, mock_snapshots, tmp_path):
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [
+        {"ProdReference": "A1", "Name": "Caneta", "Colors": "Azul", "Taric": "96081000"},
+        {"ProdReference": "B2", "Name": "Caderno", "Colors": "Preto", "Taric": "48201000"},
+    ]}
+    mock_spot_cls.return_value = mock_spot
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = [{"codigo_produto_integracao": "B2"}]
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    mock_omie_cls.return_value = mock_omie
+    path = tmp_path / "sync.json"
+
+    sync_products("fake", "app_key", "secret", metrics_path=str(path))
+
+    # The clients record into the run's registry
+    assert mock_omie_cls.call_args.kwargs["metrics"] is mock_spot_cls.call_args.kwargs["metrics"]
+    report = json.loads(path.read_text())
+    gauges = {entry["labels"]["outcome"]: entry["value"] for entry in report["gauges"]["sync_products"]}
+    assert gauges["inserted"] == 1 and gauges["skipped_existing"] == 1
+    phases = {entry["labels"]["phase"] for entry in report["histograms"]["sync_phase_seconds"]}
+    assert {"spot_auth", "spot_products", "spot_prices", "omie_listing", "startup", "processing", "total"} <= phases
+    calls = report["histograms"]["sync_call_seconds"]
+    assert calls[0]["labels"] == {"action": "insert"} and calls[0]["count"] == 1
+    assert report["histograms"]["sync_map_seconds"][0]["count"] == 1
+    assert report["gauges"]["sync_fatal_error"][0]["value"] == 0
@@ -0,0 +1,57 @@
+import json
+from app.ncm_table import NcmTable
+from app.spot_mapper import fix_ncm
+
+
+def test_without_a_table_only_rejected_codes_fail():
+    table = NcmTable()
+
+    assert table.accepts("4016.92.00")
+    assert table.accepts(None)
+
+    table.reject("4016.92.00")
+
+    assert not table.accepts("40169200")
+    assert table.accepts("12345678")
+
+
+def test_loaded_table_rejects_unknown_codes_after_correction():
+    table = NcmTable(["9025.19.90", "40169200", "01", "01.01"])
+
+    assert len(table) == 2
+    assert "4016.92.00" in table
+    # 9617.10.00 is corrected to 9025.19.90 before the lookup
+    assert table.accepts("9617.10.00")
+    assert not table.accepts("12345678")
+    assert not table.accepts("")
+
+
+def test_load_siscomex_json(tmp_path):
+    path = tmp_path / "ncm.json"
+    path.write_text(json.dumps({"Nomenclaturas": [
+        {"Codigo": "01", "Descricao": "Animais vivos."},
+        {"Codigo": "0101.21.00", "Descricao": "-- Reprodutores de raça pura"},
+    ]}), encoding="utf-8")
+
+    table = NcmTable.load(str(path))
+
+    assert len(table) == 1
+    assert table.accepts("01012100")
+
+
+def test_load_csv_with_header_and_plain_list(tmp_path):
+    csv_path = tmp_path / "ncm.csv"
+    csv_path.write_text("descricao;ncm\nBorracha;4016.92.00\nCanetas;96081000\n", encoding="utf-8")
+    txt_path = tmp_path / "ncm.txt"
+    txt_path.write_text("40169200\n96081000\n", encoding="utf-8")
+
+    assert NcmTable.load(str(csv_path)).accepts("96081000")
+    assert len(NcmTable.load(str(txt_path))) == 2
+
+
+def test_fix_ncm_is_cached():
+    fix_ncm.cache_clear()
+    fix_ncm("9608.10.99")
+    fix_ncm("9608.10.99")
+
+    assert fix_ncm.cache_info().hits == 1
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from app.omie_client import OmieClient
+from app.omie_client import OmieClient, PAGE_SIZE_LADDER
 import requests
 
 
@@ -9,7 +9,7 @@ def omie_client():
     return OmieClient(app_key="dummy_key", app_secret="dummy_secret")
 
 
-@patch("app.omie_client.requests.post")
+@patch("app.omie_client.requests.Session.post")
 def test_insert_product_success(mock_post, omie_client):
     dummy_response = {
         "codigo": "ABC123",
@@ -35,7 +35,7 @@ def test_insert_product_success(mock_post, omie_client):
     mock_post.assert_called_once()
 
 
-@patch("app.omie_client.requests.post")
+@patch("app.omie_client.requests.Session.post")
 def test_insert_product_with_faultstring(mock_post, omie_client):
     mock_post.return_value = MagicMock(status_code=200, json=lambda: {
         "faultstring": "Duplicate product"
@@ -56,7 +56,7 @@ def test_insert_product_with_faultstring(mock_post, omie_client):
     assert result is None
 
 
-@patch("app.omie_client.requests.post")
+@patch("app.omie_client.requests.Session.post")
 def test_insert_product_http_error(mock_post, omie_client):
     mock_resp = MagicMock()
     mock_resp.status_code = 500
@@ -78,7 +78,7 @@ def test_insert_product_http_error(mock_post, omie_client):
         omie_client.insert_product(product_data)
 
 
-@patch("app.omie_client.requests.post")
+@patch("app.omie_client.requests.Session.post")
 def test_list_products_with_multiple_pages(mock_post):
     client = OmieClient("key", "secret")
 
@@ -105,7 +105,7 @@ def test_list_products_with_multiple_pages(mock_post):
     assert result[1]["codigo_produto_integracao"] == "B"
 
 
-@patch("app.omie_client.requests.post")
+@patch("app.omie_client.requests.Session.post")
 def test_list_products_handles_no_products(mock_post):
     client = OmieClient("key", "secret")
     mock_post.return_value = MagicMock(
@@ -116,7 +116,7 @@ def test_list_products_handles_no_products(mock_post):
     result = client.list_products()
     assert result == []  # still safe
 
-@patch("app.omie_client.requests.post")
+@patch("app.omie_client.requests.Session.post")
 def test_list_products_http_error(mock_post):
     client = OmieClient("key", "secret")
 
@@ -134,7 +134,7 @@ def test_build_auth_and_headers():
     assert client._build_headers() == {"Content-Type": "application/json"}
     assert client._build_auth_payload() == {"app_key": "KEY", "app_secret": "SECRET"}
 
-@patch("app.omie_client.requests.post")
+@patch("app.omie_client.requests.Session.post")
 def test_list_products_with_debug_logs(mock_post, caplog):
     client = OmieClient("key", "secret")
     mock_post.return_value = MagicMock(
@@ -151,7 +151,7 @@ def test_list_products_with_debug_logs(mock_post, caplog):
         assert "Number of products" in caplog.text
         assert result[0]["codigo_produto_integracao"] == "ABC"
 
-@patch("app.omie_client.requests.post")
+@patch("app.omie_client.requests.Session.post")
 def test_list_products_logs_debug_info(mock_post, caplog):
     client = OmieClient("key", "secret")
 
@@ -169,7 +169,7 @@ def test_list_products_logs_debug_info(mock_post, caplog):
         assert "Number of products" in caplog.text
         assert result[0]["codigo_produto_integracao"] == "XYZ"
 
-@patch("app.omie_client.requests.post")
+@patch("app.omie_client.requests.Session.post")
 def test_list_products_http_error_handling(mock_post, caplog):
     client = OmieClient("key", "secret")
 
@@ -185,3 +185,302 @@ def test_list_products_http_error_handling(mock_post, caplog):
         assert result == []
         assert "OMIE error on ListarProdutos" in caplog.text
         assert "Skipping remaining pages due to error" in caplog.text
+
+@patch("app.omie_client.requests.Session.post")
+def test_make_request_backs_off_on_redundant_consumption(mock_post):
+    client = OmieClient("key", "secret", rate_limit=2.0, max_rate_limit=4.0)
+    mock_resp = MagicMock()
+    mock_resp.status_code = 500
+    mock_resp.text = '{"faultstring": "ERROR: Consumo redundante detectado.", "faultcode": "SOAP-ENV:Client-8"}'
+    mock_post.return_value = mock_resp
+
+    client._make_request({"call": "ListarProdutos"})
+    assert client.rate_limiter.rate == 1.0
+
+@patch("app.omie_client.requests.Session.post")
+def test_make_request_speeds_up_on_healthy_responses(mock_post):
+    client = OmieClient("key", "secret", rate_limit=2.0, max_rate_limit=4.0)
+    mock_post.return_value = MagicMock(status_code=200, json=lambda: {})
+
+    client._make_request({"call": "ListarProdutos"})
+    client._make_request({"call": "ListarProdutos"})
+    assert 2.0 < client.rate_limiter.rate <= 4.0
+
+def test_rate_limiter_starts_at_the_ceiling_by_default():
+    assert OmieClient("key", "secret", max_rate_limit=200).rate_limiter.rate == 200
+    assert OmieClient("key", "secret", rate_limit=50, max_rate_limit=200).rate_limiter.rate == 50
+
+def _page_response(codes, total_pages, total_records=None):
+    data = {
+        "produto_servico_cadastro": [{"codigo_produto_integracao": c} for c in codes],
+        "total_de_paginas": total_pages,
+    }
+    if total_records is not None:
+        data["total_de_registros"] = total_records
+    return MagicMock(status_code=200, json=lambda: data)
+
+@patch("app.omie_client.requests.Session.post")
+def test_list_products_parallel_fetches_all_pages_in_order(mock_post):
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+
+    def fake_post(url, json, headers, timeout):
+        page = json["param"][0]["pagina"]
+        return _page_response([f"P{page}"], total_pages=5)
+
+    mock_post.side_effect = fake_post
+
+    result = client.list_products(workers=3)
+    assert [p["codigo_produto_integracao"] for p in result] == ["P1", "P2", "P3", "P4", "P5"]
+
+@patch("app.omie_client.requests.Session.post")
+def test_list_products_parallel_retries_failed_page(mock_post):
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+    failures = {"page3": 1}
+
+    def fake_post(url, json, headers, timeout):
+        page = json["param"][0]["pagina"]
+        if page == 3 and failures["page3"]:
+            failures["page3"] -= 1
+            resp = MagicMock(status_code=500, text="Erro")
+            resp.raise_for_status.side_effect = requests.HTTPError("boom")
+            return resp
+        return _page_response([f"P{page}"], total_pages=3)
+
+    mock_post.side_effect = fake_post
+
+    result = client.list_products(workers=2)
+    assert [p["codigo_produto_integracao"] for p in result] == ["P1", "P2", "P3"]
+
+@patch("app.omie_client.requests.Session.post")
+def test_list_products_parallel_reports_missing_pages(mock_post):
+    import app.omie_client as omie_module
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+
+    def fake_post(url, json, headers, timeout):
+        page = json["param"][0]["pagina"]
+        if page == 2:
+            resp = MagicMock(status_code=500, text="Erro")
+            resp.raise_for_status.side_effect = requests.HTTPError("boom")
+            return resp
+        return _page_response([f"P{page}"], total_pages=3)
+
+    mock_post.side_effect = fake_post
+
+    with pytest.raises(omie_module.IncompleteListingError) as e:
+        client.list_products(workers=2, page_retries=1)
+    assert e.value.missing_pages == [2]
+    assert [p["codigo_produto_integracao"] for p in e.value.products] == ["P1", "P3"]
+
+def _empty_listing_response():
+    fault = {"faultcode": "SOAP-ENV:Client-5113", "faultstring": "ERROR: Não existem registros para a página [1]!"}
+    response = MagicMock(status_code=500, text=str(fault), json=lambda: fault)
+    response.raise_for_status.side_effect = requests.HTTPError("500 Server Error", response=response)
+    return response
+
+@pytest.mark.parametrize("workers", [1, 4])
+@patch("app.omie_client.requests.Session.post")
+def test_list_products_empty_listing_fault_is_an_empty_result(mock_post, workers):
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+    mock_post.return_value = _empty_listing_response()
+
+    assert client.list_products(workers=workers) == []
+    assert mock_post.call_count == 1
+
+def test_tune_page_size_shrinks_slow_pages():
+    client = OmieClient("key", "secret")
+    assert client._tune_page_size(500, latency=5.0, target_page_latency=15.0) == 500
+    # 25s for 500 records → 0.05s/record, 250 records would take 12.5s
+    assert client._tune_page_size(500, latency=25.0, target_page_latency=15.0) == 250
+    # 40s for 500 records → 0.08s/record, 250 records would take 20s, 50 records 4s
+    assert client._tune_page_size(500, latency=40.0, target_page_latency=15.0) == 50
+
+def test_tune_page_size_steps_down_from_250_to_a_divisor():
+    client = OmieClient("key", "secret")
+    assert all(size % smaller == 0 for size in PAGE_SIZE_LADDER for smaller in PAGE_SIZE_LADDER if smaller < size)
+    assert client._tune_page_size(250, latency=30.0, target_page_latency=15.0) == 50
+    assert client._tune_page_size(50, latency=30.0, target_page_latency=15.0) == 50
+
+@patch("app.omie_client.requests.Session.post")
+def test_list_products_parallel_switches_to_tuned_page_size(mock_post, monkeypatch):
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+    monkeypatch.setattr(client, "_tune_page_size", lambda size, latency, target: 250)
+    requested = []
+
+    def fake_post(url, json, headers, timeout):
+        param = json["param"][0]
+        requested.append((param["pagina"], param["registros_por_pagina"]))
+        return _page_response([f"P{param['pagina']}"], total_pages=2, total_records=900)
+
+    mock_post.side_effect = fake_post
+
+    client.list_products(workers=2)
+    # Page 1 at 500 covers pages 1-2 at 250; 900 records need 4 pages of 250
+    assert sorted(requested) == [(1, 500), (3, 250), (4, 250)]
+    assert client.page_size == 250
+
+@patch("app.omie_client.requests.Session.post")
+def test_make_request_uses_per_call_timeouts(mock_post):
+    client = OmieClient("key", "secret", timeouts={"IncluirProduto": (2, 10)})
+    mock_post.return_value = MagicMock(status_code=200, json=lambda: {})
+
+    client._make_request({"call": "IncluirProduto"})
+    assert mock_post.call_args.kwargs["timeout"] == (2, 10)
+
+    client._make_request({"call": "ConsultarProduto"})
+    assert mock_post.call_args.kwargs["timeout"] == (5, 60)
+
+@patch("app.omie_client.requests.Session.post")
+def test_list_products_changed_since_adds_date_filter(mock_post):
+    from datetime import date
+    client = OmieClient("key", "secret")
+    mock_post.return_value = _page_response(["A"], total_pages=1)
+
+    client.list_products(changed_since=date(2025, 3, 9))
+
+    param = mock_post.call_args.kwargs["json"]["param"][0]
+    assert param["filtrar_por_data_de"] == "09/03/2025"
+
+@patch("app.omie_client.requests.Session.post")
+def test_update_product_sends_alterar_produto(mock_post):
+    client = OmieClient("key", "secret")
+    mock_post.return_value = MagicMock(status_code=200, json=lambda: {
+        "codigo_produto_integracao": "A1", "codigo_status": "0", "descricao_status": "Produto alterado com sucesso!"
+    })
+
+    result = client.update_product({"codigo_produto_integracao": "A1", "ncm": "40169200"})
+
+    sent = mock_post.call_args.kwargs["json"]
+    assert sent["call"] == "AlterarProduto"
+    assert sent["param"] == [{"codigo_produto_integracao": "A1", "ncm": "40169200"}]
+    assert result["codigo_status"] == "0"
+
+@patch("app.omie_client.requests.Session.post")
+def test_upsert_and_get_product_calls(mock_post):
+    client = OmieClient("key", "secret")
+    mock_post.return_value = MagicMock(status_code=200, json=lambda: {"codigo_produto": 1})
+
+    client.upsert_product({"codigo_produto_integracao": "A1", "descricao": "X"})
+    assert mock_post.call_args.kwargs["json"]["call"] == "UpsertProduto"
+
+    client.get_product("A1")
+    sent = mock_post.call_args.kwargs["json"]
+    assert sent["call"] == "ConsultarProduto"
+    assert sent["param"] == [{"codigo_produto_integracao": "A1"}]
+
+def _lot_products(n):
+    return [{"codigo_produto_integracao": f"L{i}", "codigo": f"L{i}"} for i in range(n)]
+
+@patch("app.omie_client.requests.Session.post")
+def test_insert_products_batch_splits_into_lots(mock_post):
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+    mock_post.return_value = MagicMock(status_code=200, json=lambda: {
+        "lote": 1, "codigo_status": "0", "descricao_status": "Lote processado"
+    })
+
+    results = client.insert_products_batch(_lot_products(5), lot_size=2)
+
+    calls = [c.kwargs["json"] for c in mock_post.call_args_list]
+    assert [c["call"] for c in calls] == ["IncluirProdutosPorLote"] * 3
+    assert [len(c["param"][0]["produto_servico_cadastro"]) for c in calls] == [2, 2, 1]
+    assert [code for code, _ in results] == ["L0", "L1", "L2", "L3", "L4"]
+    assert all(r["codigo_status"] == "0" for _, r in results)
+
+@patch("app.omie_client.requests.Session.post")
+def test_rejected_lot_is_resubmitted_per_product(mock_post):
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+
+    def fake_post(url, json, headers, timeout):
+        if json["call"] == "UpsertProdutosPorLote":
+            return MagicMock(status_code=500, text="", json=lambda: {"faultcode": "SOAP-ENV:Client-1", "faultstring": "Lote com erro"})
+        product = json["param"][0]
+        if product["codigo_produto_integracao"] == "L1":
+            return MagicMock(status_code=500, text="", json=lambda: {"faultcode": "SOAP-ENV:Client-102", "faultstring": "NCM não cadastrada"})
+        return MagicMock(status_code=200, json=lambda: {"codigo_produto": 10, "codigo_produto_integracao": product["codigo_produto_integracao"]})
+
+    mock_post.side_effect = fake_post
+
+    results = dict(client.upsert_products_batch(_lot_products(3)))
+
+    assert results["L0"]["codigo_produto"] == 10
+    assert results["L1"]["faultstring"] == "NCM não cadastrada"
+    assert results["L2"]["codigo_produto"] == 10
+    assert [c.kwargs["json"]["call"] for c in mock_post.call_args_list][1:] == ["UpsertProduto"] * 3
+
+
+@pytest.mark.parametrize("fault", [
+    {"faultcode": "SOAP-ENV:Client-6", "faultstring": "ERROR: Consumo redundante detectado"},
+    {"faultcode": "SOAP-ENV:Server", "faultstring": "Erro interno, tente novamente"},
+])
+@patch("app.omie_client.requests.Session.post")
+def test_throttled_or_busy_lot_is_not_resubmitted_per_product(mock_post, fault, monkeypatch):
+    monkeypatch.setattr("app.omie_client.FAULT_RETRY_WAIT", 0)
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+    mock_post.return_value = MagicMock(status_code=500, text=fault["faultstring"], json=lambda: fault)
+
+    results = dict(client.upsert_products_batch(_lot_products(3)))
+
+    assert [r["faultstring"] for r in results.values()] == [fault["faultstring"]] * 3
+    assert {c.kwargs["json"]["call"] for c in mock_post.call_args_list} == {"UpsertProdutosPorLote"}
+
+
+@patch("app.omie_client.requests.Session.post")
+def test_cancelled_client_sends_nothing(mock_post):
+    from app.omie_client import RequestCancelled
+    client = OmieClient("key", "secret")
+    client.cancel()
+
+    with pytest.raises(RequestCancelled):
+        client.list_products(workers=3)
+    mock_post.assert_not_called()
+
+
+@patch("app.omie_client.requests.Session.post")
+def test_insert_product_does_not_print_credentials(mock_post, capsys, caplog):
+    client = OmieClient("my-key", "my-secret")
+    mock_post.return_value = MagicMock(status_code=200, json=lambda: {"codigo_produto": 1})
+
+    with caplog.at_level("DEBUG"):
+        client.insert_product({"codigo_produto_integracao": "A1", "codigo": "A1"})
+
+    assert capsys.readouterr().out == ""
+    assert "my-secret" not in caplog.text
+
+
+@patch("app.omie_client.requests.Session.post")
+def test_retryable_fault_is_sent_again(mock_post, monkeypatch):
+    monkeypatch.setattr("app.omie_client.FAULT_RETRY_WAIT", 0)
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100)
+    busy = {"faultcode": "SOAP-ENV:Server", "faultstring": "ERROR: Erro interno ao processar a requisição"}
+    mock_post.side_effect = [
+        MagicMock(status_code=500, json=lambda: busy),
+        MagicMock(status_code=200, json=lambda: {"codigo_produto": 7, "codigo_status": "0"}),
+    ]
+
+    assert client.insert_product({"codigo_produto_integracao": "A"})["codigo_produto"] == 7
+    assert mock_post.call_count == 2
+    assert client.retry_budget.remaining == client.retry_budget.max_retries - 1
+
+
+@patch("app.omie_client.requests.Session.post")
+def test_product_fault_is_not_retried(mock_post):
+    from app.omie_faults import RetryBudget
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100, retry_budget=RetryBudget(0))
+    fault = {"faultcode": "SOAP-ENV:Client-103", "faultstring": "ERROR: NCM não cadastrada para o produto"}
+    mock_post.return_value = MagicMock(status_code=500, json=lambda: fault)
+
+    assert client.insert_product({"codigo_produto_integracao": "A"}) == fault
+    mock_post.assert_called_once()
+    # A product fault says nothing about OMIE's health
+    assert client.breaker.failures == 0
+
+
+@patch("app.omie_client.requests.Session.post")
+def test_connection_errors_stop_retrying_when_budget_is_spent(mock_post):
+    from app.omie_faults import RetryBudget
+    client = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100, retry_budget=RetryBudget(0))
+    mock_post.side_effect = requests.exceptions.ConnectionError("reset")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client._make_request({"call": "IncluirProduto"})
+    mock_post.assert_called_once()
+    assert client.breaker.failures == 1
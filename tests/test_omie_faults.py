@@ -0,0 +1,73 @@
+import threading
+import pytest
+from app.omie_faults import (
+    FATAL, RETRYABLE, SKIPPABLE, CircuitBreaker, CircuitOpenError, RetryBudget, classify_fault,
+)
+
+
+@pytest.mark.parametrize("fault, expected", [
+    ({"faultcode": "SOAP-ENV:Client-6", "faultstring": "ERROR: Consumo redundante detectado"}, SKIPPABLE),
+    ({"faultcode": "SOAP-ENV:Client-8", "faultstring": "ERROR: Limite de requisições excedido"}, RETRYABLE),
+    ({"faultcode": "SOAP-ENV:Server", "faultstring": "ERROR: Erro interno ao processar a requisição"}, RETRYABLE),
+    ({"faultcode": "SOAP-ENV:Client-8", "faultstring": "Serviço indisponível, tente novamente"}, RETRYABLE),
+    ({"faultcode": "SOAP-ENV:Client-103", "faultstring": "ERROR: NCM não cadastrada para o produto"}, SKIPPABLE),
+    ({"faultcode": "SOAP-ENV:Client-102", "faultstring": "ERROR: Produto já cadastrado"}, SKIPPABLE),
+    ({"faultcode": "SOAP-ENV:Client-5", "faultstring": "ERROR: Chave de acesso inválida"}, FATAL),
+    ({"faultcode": "CLIENT-999", "faultstring": "Erro fatal"}, FATAL),
+])
+def test_classify_fault(fault, expected):
+    assert classify_fault(fault) == expected
+
+
+def test_retry_budget_is_shared_and_finite():
+    budget = RetryBudget(max_retries=2)
+    assert budget.spend() and budget.spend()
+    assert not budget.spend()
+    assert budget.remaining == 0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_opens_then_probes_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+
+    assert not breaker.record_failure() and not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 10
+    breaker.acquire()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_circuit_breaker_reopens_on_failed_probe_and_gives_up():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, max_trips=2, clock=clock)
+
+    breaker.record_failure()
+    clock.now = 10
+    breaker.acquire()
+    assert breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+
+def test_circuit_breaker_stops_waiting_when_cancelled():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    cancelled = threading.Event()
+    cancelled.set()
+
+    assert breaker.acquire(cancelled) < 1
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone, date
+from unittest.mock import MagicMock
+from app.omie_index import OmieCodeIndex
+
+NOW = datetime(2025, 3, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def test_first_refresh_is_a_full_scan(tmp_path):
+    index = OmieCodeIndex(str(tmp_path / "index.db"))
+    omie = MagicMock()
+    omie.list_products.return_value = [
+        {"codigo_produto_integracao": "A", "codigo_produto": 1},
+        {"codigo_produto_integracao": "B", "codigo_produto": 2},
+        {"codigo_produto": 3},
+    ]
+
+    codes = index.refresh(omie, workers=3, now=NOW)
+
+    assert codes == {"A", "B"}
+    omie.list_products.assert_called_once_with(workers=3)
+    assert index.codigo_produto("B") == 2
+
+
+def test_next_refresh_is_incremental_and_persists(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = OmieCodeIndex(path)
+    omie = MagicMock()
+    omie.list_products.return_value = [{"codigo_produto_integracao": "A", "codigo_produto": 1}]
+    index.refresh(omie, now=NOW)
+    index.close()
+
+    reopened = OmieCodeIndex(path)
+    omie.list_products.reset_mock()
+    omie.list_products.return_value = [{"codigo_produto_integracao": "C", "codigo_produto": 3}]
+
+    codes = reopened.refresh(omie, now=NOW + timedelta(hours=1))
+
+    assert codes == {"A", "C"}
+    omie.list_products.assert_called_once_with(workers=4, changed_since=date(2025, 3, 9))
+
+
+def test_full_reconcile_drops_deleted_products(tmp_path):
+    index = OmieCodeIndex(str(tmp_path / "index.db"), full_refresh_every=timedelta(hours=24))
+    omie = MagicMock()
+    omie.list_products.return_value = [
+        {"codigo_produto_integracao": "A", "codigo_produto": 1},
+        {"codigo_produto_integracao": "GONE", "codigo_produto": 9},
+    ]
+    index.refresh(omie, now=NOW)
+
+    omie.list_products.return_value = [{"codigo_produto_integracao": "A", "codigo_produto": 1}]
+    codes = index.refresh(omie, now=NOW + timedelta(hours=25))
+
+    assert codes == {"A"}
+    assert index.last_full_refresh == NOW + timedelta(hours=25)
+
+
+def test_failed_refresh_keeps_previous_window(tmp_path):
+    index = OmieCodeIndex(str(tmp_path / "index.db"))
+    omie = MagicMock()
+    omie.list_products.return_value = []
+    index.refresh(omie, now=NOW)
+
+    omie.list_products.side_effect = RuntimeError("boom")
+    try:
+        index.refresh(omie, now=NOW + timedelta(hours=1))
+    except RuntimeError:
+        pass
+
+    assert index.last_refresh == NOW
+
+
+def test_add_records_inserted_product(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = OmieCodeIndex(path)
+    index.add("NEW1", 123)
+    index.close()
+
+    assert "NEW1" in OmieCodeIndex(path)
+
+
+def test_incremental_refresh_without_changes_keeps_the_index(tmp_path):
+    import requests
+    from app.omie_client import OmieClient
+
+    index = OmieCodeIndex(str(tmp_path / "index.db"))
+    index.merge([{"codigo_produto_integracao": "A", "codigo_produto": 1}], replace=True)
+    index._set_meta("last_full_refresh", NOW)
+    index._set_meta("last_refresh", NOW)
+
+    # OMIE answers a date window without changes with a fault, not an empty page
+    fault = {"faultcode": "SOAP-ENV:Client-5113", "faultstring": "ERROR: Não existem registros para a página [1]!"}
+    response = MagicMock(status_code=500, text=str(fault), json=lambda: fault)
+    response.raise_for_status.side_effect = requests.HTTPError("500 Server Error", response=response)
+    session = MagicMock()
+    session.post.return_value = response
+    omie = OmieClient("key", "secret", rate_limit=100, max_rate_limit=100, session=session)
+
+    codes = index.refresh(omie, workers=4, now=NOW + timedelta(hours=1))
+
+    assert codes == {"A"}
+    assert session.post.call_args.kwargs["json"]["param"][0]["filtrar_por_data_de"] == "09/03/2025"
+    assert index.last_refresh == NOW + timedelta(hours=1)
+
+
+def test_refresh_hands_over_the_listed_records_once(tmp_path):
+    index = OmieCodeIndex(str(tmp_path / "index.db"))
+    omie = MagicMock()
+    record = {"codigo_produto_integracao": "A", "codigo_produto": 1, "descricao": "Caneta"}
+    omie.list_products.return_value = [record, {"codigo_produto": 3}]
+
+    index.refresh(omie, now=NOW)
+
+    assert index.pop_listed_records() == {"A": record}
+    assert index.pop_listed_records() == {}
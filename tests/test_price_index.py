@@ -0,0 +1,53 @@
+from app.price_index import PriceIndex, parse_price_row, format_tiers
+
+ROWS = [
+    {"Sku": "11103-103", "ProdReference": "11103", "ColorDesc1": "Preto", "ColorCode": 103,
+     "YourPrice": 0.342, "MinQt1": 1.0, "Price1": 0.342},
+    {"Sku": "11104-105", "ProdReference": "11104", "ColorDesc1": "Vermelho", "ColorCode": 105,
+     "YourPrice": 32.9, "MinQt1": 1.0, "Price1": 32.9, "MinQt2": 100.0, "Price2": 29.5, "MinQt3": "", "Price3": None},
+    {"Sku": "11104-104", "ProdReference": "11104", "ColorDesc1": "Azul", "ColorCode": 104,
+     "YourPrice": 31.0, "MinQt1": 1.0, "Price1": 31.0, "MinQt2": 100.0, "Price2": 28.0},
+    {"Sku": "11105-101", "ProdReference": "11105", "YourPrice": float("nan"), "MinQt1": 1.0, "Price1": 5.0},
+    {"Sku": "11106-101", "ProdReference": "11106"},
+]
+
+
+def test_parse_price_row_reads_unit_price_and_tiers():
+    price = parse_price_row(ROWS[1])
+
+    assert price.sku == "11104-105" and price.color == "Vermelho" and price.color_code == "105"
+    assert price.unit_price == 32.9
+    assert price.tiers == ((1.0, 32.9), (100.0, 29.5))
+    # No YourPrice: the first tier is the unit price
+    assert parse_price_row(ROWS[3]).unit_price == 5.0
+
+
+def test_index_groups_skus_by_reference():
+    index = PriceIndex(ROWS)
+
+    assert len(index) == 4 and "11104" in index and "99999" not in index
+    assert [sku.sku for sku in index.skus("11104")] == ["11104-105", "11104-104"]
+    assert index.product_price("11104").sku == "11104-104"
+    assert index.product_price("11106") is None
+    assert index.version("11104") == "31,1,31,100,28" and index.version("11106") == ""
+
+
+def test_apply_adds_unit_price_and_tier_note():
+    index = PriceIndex(ROWS)
+
+    single = index.apply("11103", {"codigo": "11103"})
+    tiered = index.apply("11104", {"codigo": "11104"})
+    unpriced = index.apply("11106", {"codigo": "11106"})
+
+    assert single == {"codigo": "11103", "valor_unitario": 0.34}
+    assert tiered == {"codigo": "11104", "valor_unitario": 31.0,
+                      "obs_internas": "Preços SPOT por quantidade: 1+ = 31.00; 100+ = 28.00"}
+    assert unpriced == {"codigo": "11106"}
+    assert format_tiers([(1.0, 2), (50.0, 1.5)]) == "Preços SPOT por quantidade: 1+ = 2.00; 50+ = 1.50"
+
+
+def test_variants_skip_rows_without_sku():
+    index = PriceIndex(ROWS + [{"Sku": "", "ProdReference": "11103", "YourPrice": 1.0}])
+
+    assert [sku.sku for sku in index.variants("11103")] == ["11103-103"]
+    assert index.variants("99999") == []
@@ -1,6 +1,15 @@
-from app.product_sync import sync_products
+import pytest
+from app.product_sync import sync_products, retry_failed
+from app.spot_mapper import map_spot_to_omie
 from unittest.mock import patch, MagicMock
 
+
+@pytest.fixture(autouse=True)
+def _run_in_tmp_path(tmp_path, monkeypatch):
+    """Runs each sync in tmp_path, so its default snapshots/ dir stays out of the repo."""
+    monkeypatch.chdir(tmp_path)
+
+
 @patch("app.product_sync.SpotClient")
 @patch("app.product_sync.OmieClient")
 def test_sync_products_inserts_only_new(mock_omie_cls, mock_spot_cls):
@@ -155,10 +164,10 @@ def test_sync_products_handles_insert_failure(mock_omie_cls, mock_spot_cls):
 
     mock_omie.insert_product.assert_called_once()
 
-@patch("app.product_sync.pd.DataFrame.to_csv")
+@patch("app.product_sync.SnapshotWriter")
 @patch("app.product_sync.SpotClient")
 @patch("app.product_sync.OmieClient")
-def test_sync_products_handles_ncm_missing(mock_omie_cls, mock_spot_cls, mock_csv):
+def test_sync_products_handles_ncm_missing(mock_omie_cls, mock_spot_cls, mock_snapshots):
     mock_spot = MagicMock()
     mock_spot.fetch_products.return_value = {
         "Products": [
@@ -184,12 +193,14 @@ def test_sync_products_handles_ncm_missing(mock_omie_cls, mock_spot_cls, mock_cs
 
     sync_products("key", "key", "secret", dry_run=False, preview_count=1)
 
-    mock_csv.assert_called_once()
+    written = {c[0][0]: c[0][1] for c in mock_snapshots.return_value.write.call_args_list}
+    assert [p["code"] for p in written["error_products"]] == ["NCMFAIL"]
+    assert "inserted_products" not in written
 
-@patch("app.product_sync.pd.DataFrame.to_csv")
+@patch("app.product_sync.SnapshotWriter")
 @patch("app.product_sync.SpotClient")
 @patch("app.product_sync.OmieClient")
-def test_sync_products_handles_fatal_fault(mock_omie_cls, mock_spot_cls, mock_csv):
+def test_sync_products_handles_fatal_fault(mock_omie_cls, mock_spot_cls, mock_snapshots):
     mock_spot = MagicMock()
     mock_spot.fetch_products.return_value = {
         "Products": [{
@@ -214,4 +225,848 @@ def test_sync_products_handles_fatal_fault(mock_omie_cls, mock_spot_cls, mock_cs
     sync_products("key", "key", "key", dry_run=False, preview_count=1)
 
     mock_omie.insert_product.assert_called_once()
-    mock_csv.assert_not_called()
+    written = {c[0][0]: c[0][1] for c in mock_snapshots.return_value.write.call_args_list}
+    assert [p["error_code"] for p in written["error_products"]] == ["CLIENT-999"]
+    assert "inserted_products" not in written
+    mock_snapshots.return_value.close.assert_called_once()
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_parallel_workers_insert_all(mock_omie_cls, mock_spot_cls):
+    products = [
+        {"ProdReference": f"P{i}", "Name": f"Produto {i}", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 100}
+        for i in range(20)
+    ]
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": products}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.side_effect = lambda payload: {"codigo_produto": 1, "codigo_produto_integracao": payload["codigo"]}
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", dry_run=False, workers=4)
+
+    assert mock_omie.insert_product.call_count == 20
+    inserted_codes = {c[0][0]["codigo"] for c in mock_omie.insert_product.call_args_list}
+    assert inserted_codes == {f"P{i}" for i in range(20)}
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_parallel_stops_on_fatal_fault(mock_omie_cls, mock_spot_cls):
+    products = [
+        {"ProdReference": f"P{i}", "Name": f"Produto {i}", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 100}
+        for i in range(50)
+    ]
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": products}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.return_value = {"faultcode": "SOAP-ENV:Client-1", "faultstring": "Erro fatal"}
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", dry_run=False, workers=3)
+
+    # At most one batch of in-flight inserts is allowed to finish after the fault
+    assert mock_omie.insert_product.call_count <= 3
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_continues_past_busy_and_product_faults(mock_omie_cls, mock_spot_cls):
+    products = [
+        {"ProdReference": f"P{i}", "Name": f"Produto {i}", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 100}
+        for i in range(4)
+    ]
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": products}
+    mock_spot_cls.return_value = mock_spot
+
+    faults = {
+        "P0": {"faultcode": "SOAP-ENV:Client-6", "faultstring": "ERROR: Consumo redundante detectado"},
+        "P1": {"faultcode": "SOAP-ENV:Client-102", "faultstring": "ERROR: Produto já cadastrado"},
+    }
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.side_effect = lambda payload: faults.get(payload["codigo"], {"codigo_produto": 1})
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", dry_run=False)
+
+    assert mock_omie.insert_product.call_count == 4
+
+
+def test_sync_products_rides_out_omie_hiccups(tmp_path, monkeypatch):
+    from benchmarks.fake_servers import FakeOmieServer, FakeSpotServer, LoadProfile, make_catalog
+    from app.snapshots import list_snapshots, read_snapshot
+    # product_sync imports the client module as omie_client (app/ is on the path)
+    monkeypatch.setattr("omie_client.FAULT_RETRY_WAIT", 0)
+    profile = LoadProfile(products=8, existing_ratio=0, skus_per_product=1, spot_latency_ms=0, omie_latency_ms=0,
+                          server_error_rate=0.3, seed=7)
+    products, prices = make_catalog(profile)
+    with FakeSpotServer(profile, products, prices) as spot_server, FakeOmieServer(profile) as omie_server:
+        sync_products("bench", "bench", "bench", snapshot_dir=str(tmp_path), max_rps=100,
+                      spot_base_url=spot_server.url, omie_url=omie_server.url)
+
+    assert omie_server.stats["server_errors"]
+    inserted = len(read_snapshot("inserted_products", str(tmp_path)))
+    errors = len(read_snapshot("error_products", str(tmp_path))) if list_snapshots("error_products", str(tmp_path)) else 0
+    # Nothing stopped the run: every product was either inserted or, after its retries, reported
+    assert inserted + errors == 8 and inserted >= 6
+    assert len(omie_server.records) == inserted
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_does_not_insert_when_listing_incomplete(mock_omie_cls, mock_spot_cls):
+    import app.product_sync as product_sync
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {
+        "Products": [{"ProdReference": "NEW1", "Name": "Novo", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 1}]
+    }
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.side_effect = product_sync.IncompleteListingError([], [2])
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", dry_run=False)
+
+    mock_omie.insert_product.assert_not_called()
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_stream_mode_reads_generator(mock_omie_cls, mock_spot_cls, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    consumed = []
+
+    def product_stream():
+        for code in ("S1", "S2", "S3"):
+            consumed.append(code)
+            yield {"ProdReference": code, "Name": "Produto", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 1}
+
+    mock_spot = MagicMock()
+    mock_spot.iter_products.return_value = product_stream()
+    mock_spot.fetch_price.return_value = {"OptionalsPrice": []}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = [{"codigo_produto_integracao": "S2"}]
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", dry_run=False, stream=True, preview_count=2)
+
+    mock_spot.fetch_products.assert_not_called()
+    assert consumed == ["S1", "S2"]
+    assert [c[0][0]["codigo"] for c in mock_omie.insert_product.call_args_list] == ["S1"]
+    from app.snapshots import read_snapshot
+    assert read_snapshot("produtos_spot", str(tmp_path / "snapshots"))["ProdReference"].tolist() == ["S1", "S2"]
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_delta_skips_unchanged_products(mock_omie_cls, mock_spot_cls, tmp_path):
+    state_path = str(tmp_path / "state.db")
+    product = {"ProdReference": "D1", "Name": "Produto", "Colors": "Azul", "Description": "X",
+               "Taric": "12345678", "Weight": 1, "UpdateDate": "11/04/2024 11:44:22"}
+    mock_spot = MagicMock()
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    mock_omie_cls.return_value = mock_omie
+
+    # First run inserts and records state
+    mock_spot.fetch_products.return_value = {"Products": [dict(product)]}
+    sync_products("fake", "key", "secret", state_path=state_path)
+    assert mock_omie.insert_product.call_count == 1
+
+    # Same UpdateDate: skipped before mapping
+    with patch("app.product_sync.map_spot_to_omie") as mock_map:
+        sync_products("fake", "key", "secret", state_path=state_path)
+        mock_map.assert_not_called()
+    assert mock_omie.insert_product.call_count == 1
+
+    # New UpdateDate but identical payload: still no OMIE call
+    mock_spot.fetch_products.return_value = {"Products": [dict(product, UpdateDate="12/04/2024 08:00:00")]}
+    sync_products("fake", "key", "secret", state_path=state_path)
+    assert mock_omie.insert_product.call_count == 1
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_uses_local_omie_index(mock_omie_cls, mock_spot_cls, tmp_path):
+    from app.omie_index import OmieCodeIndex
+    index_path = str(tmp_path / "index.db")
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [
+        {"ProdReference": "OLD", "Name": "Antigo", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 1},
+        {"ProdReference": "NEW", "Name": "Novo", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 1},
+    ]}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = [{"codigo_produto_integracao": "OLD", "codigo_produto": 1}]
+    mock_omie.insert_product.return_value = {"codigo_produto": 2}
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", index_path=index_path)
+
+    assert [c[0][0]["codigo"] for c in mock_omie.insert_product.call_args_list] == ["NEW"]
+    assert OmieCodeIndex(index_path).codes() == {"OLD", "NEW"}
+
+    # Second run only asks OMIE for recent changes and no longer re-inserts NEW
+    mock_omie.list_products.return_value = []
+    sync_products("fake", "key", "secret", index_path=index_path)
+    assert "changed_since" in mock_omie.list_products.call_args.kwargs
+    assert mock_omie.insert_product.call_count == 1
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_diffs_against_records_listed_by_the_index(mock_omie_cls, mock_spot_cls, tmp_path):
+    product = {"ProdReference": "OLD", "Name": "Antigo", "Colors": "Azul", "Description": "X",
+               "Taric": "12345678", "Weight": 1}
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [product]}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = [dict(map_spot_to_omie(dict(product)), codigo_produto=1)]
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", index_path=str(tmp_path / "index.db"), update_existing=True)
+
+    # The full reconcile already listed OLD: no ConsultarProduto, and nothing changed
+    mock_omie.get_product.assert_not_called()
+    mock_omie.update_product.assert_not_called()
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_keeps_recorded_outcomes_when_the_run_fails(mock_omie_cls, mock_spot_cls, tmp_path):
+    from app.dead_letters import DeadLetterStore
+    from app.sync_journal import SyncJournal
+    from app.sync_state import SyncStateStore
+    paths = {name: str(tmp_path / name) for name in ("state.db", "index.db", "journal.jsonl", "dead.db")}
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [
+        {"ProdReference": f"F{i}", "Name": "Novo", "Colors": "Azul", "Description": "X", "Taric": "12345678",
+         "Weight": 1, "UpdateDate": "11/04/2024 11:44:22"}
+        for i in range(4)
+    ]}
+    mock_spot_cls.return_value = mock_spot
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.side_effect = lambda payload: (
+        {"faultcode": "SOAP-ENV:Client-102", "faultstring": "ERROR: Produto já cadastrado"}
+        if payload["codigo"] == "F1" else {"codigo_produto": 1})
+    mock_omie_cls.return_value = mock_omie
+
+    def map_or_crash(product):
+        if product.get("ProdReference") == "F2":
+            raise RuntimeError("mapper crashed")
+        return map_spot_to_omie(product)
+
+    with patch("app.product_sync.map_spot_to_omie", side_effect=map_or_crash), pytest.raises(RuntimeError):
+        sync_products("fake", "key", "secret", state_path=paths["state.db"], index_path=paths["index.db"],
+                      journal_path=paths["journal.jsonl"], dead_letter_path=paths["dead.db"])
+
+    # Far fewer writes than a batched commit: they must still be on disk
+    assert SyncStateStore(paths["state.db"]).get("F0") is not None
+    assert "F1" in DeadLetterStore(paths["dead.db"])
+    assert SyncJournal(paths["journal.jsonl"], resume=True).is_finished("F0")
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_state_and_index_on_default_paths(mock_omie_cls, mock_spot_cls, tmp_path, monkeypatch):
+    import inspect
+    from app.omie_index import OmieCodeIndex
+    from app.sync_state import SyncStateStore
+    monkeypatch.chdir(tmp_path)
+    state_path = inspect.signature(SyncStateStore).parameters["path"].default
+    index_path = inspect.signature(OmieCodeIndex).parameters["path"].default
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [
+        {"ProdReference": f"S{i}", "Name": "Novo", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 1}
+        for i in range(3)
+    ]}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.return_value = {"codigo_produto": 2}
+    mock_omie_cls.return_value = mock_omie
+
+    # The state store's batched transaction must not lock the index out of its writes
+    sync_products("fake", "key", "secret", state_path=state_path, index_path=index_path)
+
+    assert OmieCodeIndex(index_path).codes() == {"S0", "S1", "S2"}
+    assert len(SyncStateStore(state_path)) == 3
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_updates_only_changed_fields(mock_omie_cls, mock_spot_cls):
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [
+        {"ProdReference": "U1", "Name": "Caneca", "Colors": "Azul", "Description": "Nova descrição",
+         "Taric": "4016.92.00", "Weight": 390},
+        {"ProdReference": "U2", "Name": "Copo", "Colors": "Preto", "Description": "Igual",
+         "Taric": "12345678", "Weight": 100},
+    ]}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = [
+        {"codigo_produto_integracao": "U1", "descricao": "Caneca - Cor: Azul - Codigo: U1",
+         "descr_detalhada": "Descrição antiga", "ncm": "4016.92.00", "peso_bruto": 0.39, "unidade": "UN"},
+        {"codigo_produto_integracao": "U2", "descricao": "Copo - Cor: Preto - Codigo: U2",
+         "descr_detalhada": "Igual", "ncm": "1234.56.78", "peso_bruto": 0.1, "unidade": "UN"},
+    ]
+    mock_omie.update_product.return_value = {"codigo_status": "0"}
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", update_existing=True)
+
+    mock_omie.insert_product.assert_not_called()
+    mock_omie.get_product.assert_not_called()
+    mock_omie.update_product.assert_called_once_with(
+        {"codigo_produto_integracao": "U1", "descr_detalhada": "Nova descrição"}
+    )
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_update_fetches_omie_state_when_unknown(mock_omie_cls, mock_spot_cls, tmp_path):
+    from datetime import datetime, timezone
+    from app.omie_index import OmieCodeIndex
+    # U1 is indexed already and did not change in OMIE since: the refresh lists no record for it
+    index_path = str(tmp_path / "index.db")
+    index = OmieCodeIndex(index_path)
+    index.merge([{"codigo_produto_integracao": "U1", "codigo_produto": 5}], replace=True)
+    index._set_meta("last_full_refresh", datetime.now(timezone.utc))
+    index._set_meta("last_refresh", datetime.now(timezone.utc))
+    index.close()
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [
+        {"ProdReference": "U1", "Name": "Caneca", "Colors": "Azul", "Description": "Nova",
+         "Taric": "12345678", "Weight": 390},
+    ]}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.get_product.return_value = {
+        "codigo_produto_integracao": "U1", "descricao": "Caneca - Cor: Azul - Codigo: U1",
+        "descr_detalhada": "Nova", "ncm": "1234.56.78", "peso_bruto": 0.2, "unidade": "UN",
+    }
+    mock_omie.update_product.return_value = {"codigo_status": "0"}
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", update_existing=True, index_path=index_path)
+
+    assert "changed_since" in mock_omie.list_products.call_args.kwargs
+    mock_omie.get_product.assert_called_once_with("U1")
+    mock_omie.update_product.assert_called_once_with({"codigo_produto_integracao": "U1", "peso_bruto": 0.39})
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_inserts_in_lots_and_tracks_each_product(mock_omie_cls, mock_spot_cls):
+    import app.product_sync as product_sync
+    products = [
+        {"ProdReference": f"L{i}", "Name": f"Produto {i}", "Colors": "Azul", "Description": "X",
+         "Taric": "99999999" if i == 3 else "12345678", "Weight": 1}
+        for i in range(5)
+    ]
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": products}
+    mock_spot_cls.return_value = mock_spot
+
+    def fake_batch(payloads, lot_size):
+        return [
+            (p["codigo_produto_integracao"],
+             {"faultcode": "SOAP-ENV:Client-102", "faultstring": "NCM não cadastrada"} if p["codigo"] == "L3"
+             else {"codigo_status": "0"})
+            for p in payloads
+        ]
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_products_batch.side_effect = fake_batch
+    mock_omie_cls.return_value = mock_omie
+
+    with patch.object(product_sync, "_log_execution_summary") as mock_summary:
+        sync_products("fake", "key", "secret", lot_size=2)
+
+    mock_omie.insert_product.assert_not_called()
+    assert [len(c[0][0]) for c in mock_omie.insert_products_batch.call_args_list] == [2, 2, 1]
+    summary = mock_summary.call_args.kwargs
+    assert sorted(p["code"] for p in summary["inserted"]) == ["L0", "L1", "L2", "L4"]
+    assert [p["code"] for p in summary["errors"]] == ["L3"]
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_skips_invalid_ncm_without_calling_omie(mock_omie_cls, mock_spot_cls, tmp_path):
+    import app.product_sync as product_sync
+    table = tmp_path / "ncm.txt"
+    table.write_text("40169200\n", encoding="utf-8")
+    products = [
+        {"ProdReference": "OK1", "Name": "Válido", "Colors": "Azul", "Description": "X", "Taric": "4016.92.00", "Weight": 1},
+        {"ProdReference": "BAD1", "Name": "Inválido", "Colors": "Azul", "Description": "X", "Taric": "11111111", "Weight": 1},
+    ]
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": products}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    mock_omie_cls.return_value = mock_omie
+
+    with patch.object(product_sync, "_log_execution_summary") as mock_summary:
+        sync_products("fake", "key", "secret", ncm_table_path=str(table))
+
+    assert [c[0][0]["codigo"] for c in mock_omie.insert_product.call_args_list] == ["OK1"]
+    errors = mock_summary.call_args.kwargs["errors"]
+    assert [(p["code"], p["error_code"]) for p in errors] == [("BAD1", "NCM_PREFLIGHT")]
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_remembers_ncm_rejected_by_omie(mock_omie_cls, mock_spot_cls):
+    import app.product_sync as product_sync
+    products = [
+        {"ProdReference": f"R{i}", "Name": "Produto", "Colors": "Azul", "Description": "X", "Taric": "11111111", "Weight": 1}
+        for i in range(3)
+    ]
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": products}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.return_value = {"faultcode": "SOAP-ENV:Client-102", "faultstring": "NCM não cadastrada"}
+    mock_omie_cls.return_value = mock_omie
+
+    with patch.object(product_sync, "_log_execution_summary") as mock_summary:
+        sync_products("fake", "key", "secret")
+
+    mock_omie.insert_product.assert_called_once()
+    errors = mock_summary.call_args.kwargs["errors"]
+    assert [p["error_code"] for p in errors] == ["SOAP-ENV:Client-102", "NCM_PREFLIGHT", "NCM_PREFLIGHT"]
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_resume_skips_journaled_products_and_listing(mock_omie_cls, mock_spot_cls, tmp_path):
+    import app.product_sync as product_sync
+    journal = str(tmp_path / "journal.jsonl")
+    products = [
+        {"ProdReference": f"J{i}", "Name": f"Produto {i}", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 1}
+        for i in range(3)
+    ]
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": products}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = [{"codigo_produto_integracao": "OLD"}]
+    # J1 hits a fatal fault and stops the first run
+    mock_omie.insert_product.side_effect = [{"codigo_produto": 1}, {"faultcode": "SOAP-ENV:Client-5", "faultstring": "ERROR: Chave de acesso inválida"}]
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", journal_path=journal)
+
+    mock_omie.list_products.reset_mock()
+    mock_omie.insert_product.reset_mock()
+    mock_omie.insert_product.side_effect = None
+    mock_omie.insert_product.return_value = {"codigo_produto": 2}
+
+    with patch.object(product_sync, "_log_execution_summary") as mock_summary:
+        sync_products("fake", "key", "secret", journal_path=journal, resume=True)
+
+    mock_omie.list_products.assert_not_called()
+    assert [c[0][0]["codigo"] for c in mock_omie.insert_product.call_args_list] == ["J1", "J2"]
+    assert [p["code"] for p in mock_summary.call_args.kwargs["skipped_resumed"]] == ["J0"]
+
+    # The resumed run finished, so the next resume starts over and lists OMIE again
+    sync_products("fake", "key", "secret", journal_path=journal, resume=True, dry_run=True)
+    mock_omie.list_products.assert_called_once()
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_lists_omie_while_spot_downloads(mock_omie_cls, mock_spot_cls):
+    import threading
+    listing_started = threading.Event()
+
+    def fetch_products():
+        # Would time out if the OMIE listing only started after the SPOT download
+        assert listing_started.wait(timeout=5)
+        return {"Products": [{"ProdReference": "A1", "Name": "Produto", "Colors": "Azul", "Description": "X",
+                              "Taric": "12345678", "Weight": 1}]}
+
+    def list_products(**kwargs):
+        listing_started.set()
+        return [{"codigo_produto_integracao": "OLD"}]
+
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.side_effect = fetch_products
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.side_effect = list_products
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret")
+
+    mock_omie.insert_product.assert_called_once()
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_propagates_spot_stream_failure(mock_omie_cls, mock_spot_cls, tmp_path, monkeypatch):
+    import pytest
+    monkeypatch.chdir(tmp_path)
+
+    def product_stream():
+        yield {"ProdReference": "S1", "Name": "Produto", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 1}
+        raise ConnectionError("SPOT dropped the connection")
+
+    mock_spot = MagicMock()
+    mock_spot.iter_products.return_value = product_stream()
+    mock_spot.fetch_price.return_value = {"OptionalsPrice": []}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie_cls.return_value = mock_omie
+
+    with pytest.raises(ConnectionError):
+        sync_products("fake", "key", "secret", stream=True)
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_startup_fetches_all_sources_concurrently(mock_omie_cls, mock_spot_cls):
+    import threading
+    # Each source waits until the other two have started; a sequential startup would deadlock
+    started = threading.Barrier(3, timeout=5)
+
+    def fetch_products():
+        started.wait()
+        return {"Products": []}
+
+    def fetch_price():
+        started.wait()
+        return {"OptionalsPrice": []}
+
+    def list_products(**kwargs):
+        started.wait()
+        return []
+
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.side_effect = fetch_products
+    mock_spot.fetch_price.side_effect = fetch_price
+    mock_spot_cls.return_value = mock_spot
+    mock_omie = MagicMock()
+    mock_omie.list_products.side_effect = list_products
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret")
+
+    # One shared SPOT authentication for both downloads
+    mock_spot.get_token.assert_called_once()
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_pulls_spot_products_while_the_listing_runs(mock_omie_cls, mock_spot_cls, tmp_path, monkeypatch):
+    import threading
+    monkeypatch.chdir(tmp_path)
+    pulled = threading.Event()
+
+    def product_stream():
+        pulled.set()
+        yield {"ProdReference": "S1", "Name": "Produto", "Colors": "Azul", "Description": "X", "Taric": "12345678", "Weight": 1}
+
+    def list_products(**kwargs):
+        # A pipeline that waits for the whole listing before pulling products would deadlock here
+        assert pulled.wait(timeout=5)
+        return [{"codigo_produto_integracao": "S1"}]
+
+    mock_spot = MagicMock()
+    mock_spot.iter_products.return_value = product_stream()
+    mock_spot.fetch_price.return_value = {"OptionalsPrice": []}
+    mock_spot_cls.return_value = mock_spot
+    mock_omie = MagicMock()
+    mock_omie.list_products.side_effect = list_products
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", stream=True)
+
+    # The existence check still waited for the listing
+    mock_omie.insert_product.assert_not_called()
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_startup_failure_cancels_other_sources(mock_omie_cls, mock_spot_cls, caplog):
+    import logging
+    import threading
+    import pytest
+    listing_cancelled = threading.Event()
+
+    def list_products(**kwargs):
+        # Stands in for a long listing that stops once the client is cancelled
+        assert listing_cancelled.wait(timeout=5)
+        raise RuntimeError("cancelled")
+
+    mock_spot = MagicMock()
+    mock_spot.fetch_price.side_effect = ConnectionError("SPOT is down")
+    mock_spot_cls.return_value = mock_spot
+    mock_omie = MagicMock()
+    mock_omie.list_products.side_effect = list_products
+    mock_omie.cancel.side_effect = listing_cancelled.set
+    mock_omie_cls.return_value = mock_omie
+
+    with caplog.at_level(logging.INFO), pytest.raises(ConnectionError):
+        sync_products("fake", "key", "secret")
+
+    mock_omie.cancel.assert_called()
+    mock_omie.insert_product.assert_not_called()
+    startup_log = next(r.getMessage() for r in caplog.records if "Startup took" in r.getMessage())
+    assert "spot_prices" in startup_log and "(failed)" in startup_log and "omie_listing" in startup_log
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_joins_prices_and_pushes_only_price_changes(mock_omie_cls, mock_spot_cls, tmp_path):
+    state_path = str(tmp_path / "state.db")
+    product = {"ProdReference": "P1", "Name": "Caneta", "Colors": "Azul", "Description": "X",
+               "Taric": "96081000", "Weight": 10, "UpdateDate": "11/04/2024 11:44:22"}
+    prices = [{"Sku": "P1-104", "ProdReference": "P1", "YourPrice": 2.5, "MinQt1": 1, "Price1": 2.5}]
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [dict(product)]}
+    mock_spot.fetch_price.return_value = {"OptionalsPrice": prices}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    mock_omie.update_product.return_value = {"codigo_status": "0"}
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", state_path=state_path, update_existing=True)
+    assert mock_omie.insert_product.call_args[0][0]["valor_unitario"] == 2.5
+
+    # Nothing changed: skipped before mapping
+    mock_omie.list_products.return_value = [{"codigo_produto_integracao": "P1"}]
+    with patch("app.product_sync.map_spot_to_omie") as mock_map:
+        sync_products("fake", "key", "secret", state_path=state_path, update_existing=True)
+        mock_map.assert_not_called()
+
+    # SPOT repriced the product without touching UpdateDate: only the price goes to OMIE
+    mock_spot.fetch_price.return_value = {"OptionalsPrice": [dict(prices[0], YourPrice=2.25, Price1=2.25)]}
+    sync_products("fake", "key", "secret", state_path=state_path, update_existing=True)
+
+    mock_omie.update_product.assert_called_once_with({"codigo_produto_integracao": "P1", "valor_unitario": 2.25})
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_compares_products_skipped_as_existing_once_updates_are_on(mock_omie_cls, mock_spot_cls,
+                                                                                 tmp_path):
+    state_path = str(tmp_path / "state.db")
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [
+        {"ProdReference": "P1", "Name": "Caneta", "Colors": "Azul", "Description": "X",
+         "Taric": "96081000", "Weight": 10, "UpdateDate": "11/04/2024 11:44:22"},
+    ]}
+    mock_spot_cls.return_value = mock_spot
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = [{"codigo_produto_integracao": "P1"}]
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", state_path=state_path)
+
+    with patch("app.product_sync.map_spot_to_omie", side_effect=map_spot_to_omie) as mock_map:
+        sync_products("fake", "key", "secret", state_path=state_path, update_existing=True)
+        mock_map.assert_called_once()
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_without_update_date_is_never_skipped_as_unchanged(mock_omie_cls, mock_spot_cls, tmp_path):
+    from app.sync_state import SyncStateStore
+
+    state_path = str(tmp_path / "state.db")
+    product = {"ProdReference": "P1", "Name": "Caneta", "Colors": "Azul", "Description": "X",
+               "Taric": "96081000", "Weight": 10}
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [dict(product)]}
+    mock_spot.fetch_price.return_value = {"OptionalsPrice": [{"Sku": "P1-104", "ProdReference": "P1", "YourPrice": 2.5}]}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", state_path=state_path, update_existing=True)
+
+    store = SyncStateStore(state_path)
+    assert store.get("P1").update_date is None
+    store.close()
+
+    # No UpdateDate to compare: the product is mapped and diffed again
+    mock_omie.list_products.return_value = [{"codigo_produto_integracao": "P1"}]
+    with patch("app.product_sync.map_spot_to_omie", side_effect=map_spot_to_omie) as mock_map:
+        sync_products("fake", "key", "secret", state_path=state_path, update_existing=True)
+        mock_map.assert_called_once()
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_variant_mode_inserts_one_item_per_sku(mock_omie_cls, mock_spot_cls):
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [
+        {"ProdReference": "V1", "Name": "Caneta", "Colors": "Azul, Preto, Verde", "Description": "X",
+         "Taric": "96081000", "Weight": 10},
+        {"ProdReference": "V2", "Name": "Bloco", "Colors": "Branco", "Description": "Y",
+         "Taric": "48201000", "Weight": 50},
+    ]}
+    mock_spot.fetch_price.return_value = {"OptionalsPrice": [
+        {"Sku": "V1-104", "ProdReference": "V1", "ColorDesc1": "Azul", "YourPrice": 2.0},
+        {"Sku": "V1-103", "ProdReference": "V1", "ColorDesc1": "Preto", "YourPrice": 2.1},
+        {"Sku": "V1-109", "ProdReference": "V1", "ColorDesc1": "Verde", "YourPrice": 2.2},
+    ]}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    # V1-103 was already created; the existence check is per SKU
+    mock_omie.list_products.return_value = [{"codigo_produto_integracao": "V1-103"}]
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    mock_omie_cls.return_value = mock_omie
+
+    with patch("app.product_sync.map_spot_to_omie", wraps=map_spot_to_omie) as mapper:
+        sync_products("fake", "key", "secret", variants=True)
+
+    inserted = [c[0][0] for c in mock_omie.insert_product.call_args_list]
+    assert [(p["codigo"], p["descricao"], p.get("valor_unitario")) for p in inserted] == [
+        ("V1-104", "Caneta - Cor: Azul - Codigo: V1-104", 2.0),
+        ("V1-109", "Caneta - Cor: Verde - Codigo: V1-109", 2.2),
+        ("V2", "Bloco - Cor: Branco - Codigo: V2", None),
+    ]
+    # The parent is mapped once per product, not once per SKU
+    assert mapper.call_count == 2
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_sync_products_keeps_failed_products_as_dead_letters(mock_omie_cls, mock_spot_cls, tmp_path):
+    from app.dead_letters import DeadLetterStore
+    path = str(tmp_path / "dead.db")
+    products = [
+        {"ProdReference": code, "Name": "Produto", "Colors": "Azul", "Description": "X", "Taric": taric, "Weight": 1}
+        for code, taric in (("D1", "9617.10.00"), ("D2", "96081000"))
+    ]
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": products}
+    mock_spot_cls.return_value = mock_spot
+
+    mock_omie = MagicMock()
+    mock_omie.list_products.return_value = []
+    mock_omie.insert_product.side_effect = lambda payload: (
+        {"faultcode": "SOAP-ENV:Client-103", "faultstring": "ERROR: NCM não cadastrada para o produto"}
+        if payload["codigo"] == "D1" else {"codigo_produto": 2}
+    )
+    mock_omie_cls.return_value = mock_omie
+
+    sync_products("fake", "key", "secret", dead_letter_path=path)
+
+    store = DeadLetterStore(path)
+    letter = store.get("D1")
+    assert [l.code for l in store.letters()] == ["D1"]
+    assert (letter.action, letter.attempts, letter.fault_class) == ("insert", 1, "skippable")
+    assert letter.payload == map_spot_to_omie(products[0])
+    assert letter.spot_ncm == "9617.10.00"
+    store.close()
+
+    # Once it goes through, the product leaves the store
+    mock_omie.insert_product.side_effect = None
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    sync_products("fake", "key", "secret", dead_letter_path=path)
+    assert len(DeadLetterStore(path)) == 0
+
+
+@patch("app.product_sync.SpotClient")
+@patch("app.product_sync.OmieClient")
+def test_retry_failed_resubmits_only_dead_letters(mock_omie_cls, mock_spot_cls, tmp_path, monkeypatch):
+    import json
+    import spot_mapper
+    from app.dead_letters import DeadLetterStore
+    path = str(tmp_path / "dead.db")
+    store = DeadLetterStore(path)
+    store.record("R1", "insert", {"codigo_produto_integracao": "R1", "ncm": "12345678"}, "SOAP-ENV:Client-103",
+                 "NCM não cadastrada", "skippable", name="Caneta", spot_ncm="1234.56.78")
+    store.record("R2", "update", {"codigo_produto_integracao": "R2", "ncm": "11112222", "descricao": "Nova"},
+                 "SOAP-ENV:Server", "Erro interno", "retryable", name="Copo")
+    store.record("R3", "insert", {"codigo_produto_integracao": "R3", "ncm": "11112222"}, "X", "x")
+    store.close()
+    corrections = tmp_path / "ncm.json"
+    corrections.write_text(json.dumps({"12345678": "87654321"}))
+    # load_ncm_corrections updates this dict; keep the module's own one intact
+    monkeypatch.setattr(spot_mapper, "NCM_CORRECTIONS", dict(spot_mapper.NCM_CORRECTIONS))
+
+    mock_omie = MagicMock()
+    mock_omie.insert_product.return_value = {"codigo_produto": 1}
+    mock_omie.get_product.return_value = {"codigo_produto_integracao": "R2", "ncm": "11112222", "descricao": "Antiga"}
+    mock_omie.update_product.return_value = {"codigo_status": "0"}
+    mock_omie_cls.return_value = mock_omie
+
+    try:
+        retry_failed("key", "secret", dead_letter_path=path, codes=["R1", "R2"],
+                     ncm_corrections_path=str(corrections), snapshot_dir=str(tmp_path))
+    finally:
+        spot_mapper.fix_ncm.cache_clear()
+
+    mock_spot_cls.assert_not_called()
+    mock_omie.list_products.assert_not_called()
+    mock_omie.insert_product.assert_called_once_with({"codigo_produto_integracao": "R1", "ncm": "87654321"})
+    mock_omie.update_product.assert_called_once_with({"codigo_produto_integracao": "R2", "descricao": "Nova"})
+    assert [l.code for l in DeadLetterStore(path).letters()] == ["R3"]
+
+
+@patch("app.product_sync.OmieClient")
+def test_retry_failed_counts_another_attempt_on_failure(mock_omie_cls, tmp_path):
+    from app.dead_letters import DeadLetterStore
+    path = str(tmp_path / "dead.db")
+    store = DeadLetterStore(path)
+    store.record("R1", "insert", {"codigo_produto_integracao": "R1", "ncm": "12345678"}, "X", "x")
+    store.close()
+
+    mock_omie = MagicMock()
+    mock_omie.insert_product.return_value = {"faultcode": "SOAP-ENV:Client-102", "faultstring": "Produto já cadastrado"}
+    mock_omie_cls.return_value = mock_omie
+
+    retry_failed("key", "secret", dead_letter_path=path, snapshot_dir=str(tmp_path))
+    # Leaves out products that already failed twice
+    retry_failed("key", "secret", dead_letter_path=path, snapshot_dir=str(tmp_path), max_attempts=2)
+
+    letter = DeadLetterStore(path).get("R1")
+    assert (letter.attempts, letter.error_code) == (2, "SOAP-ENV:Client-102")
+    mock_omie.insert_product.assert_called_once()
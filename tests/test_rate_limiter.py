@@ -0,0 +1,43 @@
+import threading
+import time
+import pytest
+from app.rate_limiter import RateLimiter, AdaptiveRateLimiter
+
+
+def test_rate_limiter_first_acquire_does_not_wait():
+    limiter = RateLimiter(rate=1)
+    assert limiter.acquire() == 0.0
+
+
+def test_rate_limiter_caps_rate_across_threads():
+    limiter = RateLimiter(rate=50)
+    start = time.monotonic()
+
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(11)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # First token is free, the other 10 need at least 10 / 50 = 0.2s
+    assert time.monotonic() - start >= 0.19
+
+
+def test_rate_limiter_rejects_invalid_rate():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
+
+
+def test_adaptive_rate_limiter_backs_off_and_recovers():
+    limiter = AdaptiveRateLimiter(rate=4, min_rate=0.5, max_rate=4, increase=1)
+
+    limiter.penalize()
+    assert limiter.rate == 2
+    limiter.penalize()
+    limiter.penalize()
+    limiter.penalize()
+    assert limiter.rate == 0.5  # never below min_rate
+
+    for _ in range(10):
+        limiter.reward()
+    assert limiter.rate == 4  # never above max_rate
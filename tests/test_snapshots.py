@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+from app import snapshots
+from app.snapshots import SnapshotWriter, list_snapshots, read_snapshot, save_snapshot
+
+
+@pytest.fixture(params=["parquet", "csv.gz"])
+def backend(request, monkeypatch):
+    if request.param == "parquet":
+        pytest.importorskip("pyarrow")
+    else:
+        monkeypatch.setattr(snapshots, "pq", None)
+    return request.param
+
+
+def test_writer_writes_timestamped_compressed_snapshots(tmp_path, backend):
+    writer = SnapshotWriter(str(tmp_path), timestamp="20250310T120000Z")
+    rows = [{"code": "A", "price": 1.5, "Colors": ["Azul", "Preto"]}, {"code": "B", "price": 2.0, "Colors": None}]
+
+    path = writer.write("prices_spot", rows)
+    rows.append({"code": "C"})  # Changes after write() are not picked up
+    writer.close()
+
+    assert path == str(tmp_path / f"prices_spot-20250310T120000Z.{backend}")
+    frame = read_snapshot("prices_spot", str(tmp_path))
+    assert frame["code"].tolist() == ["A", "B"]
+    assert frame["price"].tolist() == [1.5, 2.0]
+    assert frame["Colors"].tolist()[0] == '["Azul", "Preto"]'
+
+
+def test_stream_passes_rows_through_and_appends_batches(tmp_path, backend):
+    writer = SnapshotWriter(str(tmp_path))
+    rows = ({"ProdReference": f"P{i}", "Weight": i, "Extra": "x" if i else None} for i in range(5))
+
+    passed = list(writer.stream("produtos_spot", rows, batch_size=2))
+    writer.close()
+
+    assert [row["ProdReference"] for row in passed] == [f"P{i}" for i in range(5)]
+    frame = read_snapshot("produtos_spot", str(tmp_path), columns=["ProdReference", "Weight"])
+    assert list(frame.columns) == ["ProdReference", "Weight"]
+    assert frame["ProdReference"].tolist() == [f"P{i}" for i in range(5)]
+    assert frame["Weight"].astype(str).tolist() == ["0", "1", "2", "3", "4"]
+
+
+def test_stream_keeps_nested_values_as_json(tmp_path, backend):
+    writer = SnapshotWriter(str(tmp_path))
+    rows = [{"ProdReference": "P1", "Colors": ["Azul", "Preto"], "Stock": {"SP": 3}}]
+
+    list(writer.stream("produtos_spot", rows))
+    writer.close()
+
+    frame = read_snapshot("produtos_spot", str(tmp_path))
+    assert frame["Colors"].tolist() == ['["Azul", "Preto"]']
+    assert frame["Stock"].tolist() == ['{"SP": 3}']
+
+
+def test_writer_keeps_a_default_number_of_snapshots(tmp_path):
+    first = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for hour in range(snapshots.DEFAULT_KEEP + 2):
+        timestamp = (first + timedelta(hours=hour)).strftime("%Y%m%dT%H%M%SZ")
+        writer = SnapshotWriter(str(tmp_path), timestamp=timestamp)
+        writer.write("error_products", [{"code": hour}])
+        writer.close()
+
+    assert len(list_snapshots("error_products", str(tmp_path))) == snapshots.DEFAULT_KEEP
+
+
+def test_keep_prunes_old_snapshots_and_reader_picks_newest(tmp_path):
+    for timestamp in ("20250101T000000Z", "20250102T000000Z", "20250103T000000Z"):
+        writer = SnapshotWriter(str(tmp_path), keep=2, timestamp=timestamp)
+        writer.write("error_products", [{"code": timestamp}])
+        writer.close()
+
+    paths = list_snapshots("error_products", str(tmp_path))
+    assert [p.split("-")[-1].split(".")[0] for p in paths] == ["20250102T000000Z", "20250103T000000Z"]
+    assert read_snapshot("error_products", str(tmp_path))["code"].tolist() == ["20250103T000000Z"]
+
+
+def test_save_snapshot_and_missing_snapshot(tmp_path):
+    path = save_snapshot("spot_products", pd.DataFrame({"a": [1, 2]}), str(tmp_path))
+
+    assert read_snapshot(path)["a"].tolist() == [1, 2]
+    with pytest.raises(FileNotFoundError):
+        read_snapshot("inserted_products", str(tmp_path))
@@ -7,7 +7,7 @@ from app.spot_client import SpotClient
 def spot_client():
     return SpotClient(access_key="fake-access-key")
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_fetch_products(mock_get, spot_client):
     mock_response = {
         "products": [
@@ -23,7 +23,7 @@ def test_fetch_products(mock_get, spot_client):
     assert "products" in result
     assert len(result["products"]) == 2
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_authenticate_success(mock_get, spot_client):
     mock_get.return_value = MagicMock(
         status_code=200,
@@ -32,10 +32,13 @@ def test_authenticate_success(mock_get, spot_client):
 
     spot_client.authenticate()
     assert spot_client.session_token == "abc123"
-    mock_get.assert_called_once_with("http://ws.spotgifts.com.br/api/v1/authenticateclient?AccessKey=fake-access-key")
+    mock_get.assert_called_once_with(
+        "http://ws.spotgifts.com.br/api/v1/authenticateclient?AccessKey=fake-access-key",
+        timeout=(5, 30),
+    )
 
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_validate_session_valid(mock_get, spot_client):
     spot_client.session_token = "abc123"
     mock_get.return_value = MagicMock(
@@ -45,10 +48,10 @@ def test_validate_session_valid(mock_get, spot_client):
 
     is_valid = spot_client.validate_session()
     assert is_valid is True
-    mock_get.assert_called_once_with("http://ws.spotgifts.com.br/api/v1/validateSession?token=abc123")
+    mock_get.assert_called_once_with("http://ws.spotgifts.com.br/api/v1/validateSession?token=abc123", timeout=(5, 30))
 
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_validate_session_invalid(mock_get, spot_client):
     spot_client.session_token = "abc123"
     mock_get.return_value = MagicMock(
@@ -59,7 +62,7 @@ def test_validate_session_invalid(mock_get, spot_client):
     is_valid = spot_client.validate_session()
     assert is_valid is False
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_authenticate_with_error_response(mock_get, spot_client):
     mock_get.return_value = MagicMock(status_code=200, json=lambda: {
         "Token": None,
@@ -71,7 +74,7 @@ def test_authenticate_with_error_response(mock_get, spot_client):
         spot_client.authenticate()
     assert "Authentication failed" in str(e.value)
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_authenticate_http_error(mock_get, spot_client):
     mock_resp = MagicMock()
     mock_resp.status_code = 401
@@ -82,7 +85,7 @@ def test_authenticate_http_error(mock_get, spot_client):
     with pytest.raises(Exception):
         spot_client.authenticate()
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_authenticate_token_missing(mock_get, spot_client):
     mock_get.return_value = MagicMock(status_code=200, json=lambda: {
         "ErrorCode": "403",
@@ -92,7 +95,7 @@ def test_authenticate_token_missing(mock_get, spot_client):
     with pytest.raises(Exception):
         spot_client.authenticate()
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_fetch_products_http_error(mock_get, spot_client):
     mock_resp = MagicMock()
     mock_resp.status_code = 500
@@ -102,7 +105,7 @@ def test_fetch_products_http_error(mock_get, spot_client):
     with pytest.raises(requests.exceptions.HTTPError):
         spot_client.fetch_products()
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_validate_session_no_token(mock_get, spot_client):
     # Make sure no token is set
     spot_client.session_token = None
@@ -110,7 +113,7 @@ def test_validate_session_no_token(mock_get, spot_client):
     assert is_valid is False
     mock_get.assert_not_called()
 
-@patch("app.spot_client.requests.get")
+@patch("app.spot_client.requests.Session.get")
 def test_validate_session_invalid_token(mock_get, spot_client):
     spot_client.session_token = "invalid-token"
     mock_get.return_value = MagicMock(
@@ -120,4 +123,170 @@ def test_validate_session_invalid_token(mock_get, spot_client):
 
     is_valid = spot_client.validate_session()
     assert is_valid is False
-    mock_get.assert_called_once()
\ No newline at end of file
+    mock_get.assert_called_once()
+
+
+def test_spot_client_uses_pooled_session_with_compression():
+    client = SpotClient(access_key="key", pool_maxsize=8, timeouts={"products": (3, 300)})
+    adapter = client.session.get_adapter("http://ws.spotgifts.com.br")
+
+    assert adapter._pool_maxsize == 8
+    assert "gzip" in client.session.headers["Accept-Encoding"]
+    assert client.timeouts["products"] == (3, 300)
+    assert client.timeouts["authenticateclient"] == (5, 30)
+
+
+def _json_response(data):
+    return MagicMock(status_code=200, json=lambda: data)
+
+
+@patch("app.spot_client.requests.Session.get")
+def test_fetch_products_and_price_authenticate_once(mock_get, spot_client):
+    def fake_get(url, params=None, timeout=None):
+        if "authenticateclient" in url:
+            return _json_response({"Token": "tok", "ErrorCode": None})
+        return _json_response({"Products": [], "OptionalsPrice": []})
+
+    mock_get.side_effect = fake_get
+
+    spot_client.fetch_products()
+    spot_client.fetch_price()
+
+    auth_calls = [c for c in mock_get.call_args_list if "authenticateclient" in c.args[0]]
+    validate_calls = [c for c in mock_get.call_args_list if "validateSession" in c.args[0]]
+    assert len(auth_calls) == 1
+    assert len(validate_calls) == 0
+
+
+@patch("app.spot_client.requests.Session.get")
+def test_get_token_reauthenticates_after_ttl(mock_get):
+    client = SpotClient(access_key="key", token_ttl=0)
+    mock_get.return_value = _json_response({"Token": "tok", "ErrorCode": None})
+
+    client.get_token()
+    client.get_token()
+    assert mock_get.call_count == 2
+
+
+@patch("app.spot_client.requests.Session.get")
+def test_get_token_refreshes_only_once_under_concurrency(mock_get, spot_client):
+    import threading
+    import time
+
+    def slow_auth(url, timeout=None):
+        time.sleep(0.05)
+        return _json_response({"Token": "tok", "ErrorCode": None})
+
+    mock_get.side_effect = slow_auth
+
+    threads = [threading.Thread(target=spot_client.get_token) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert mock_get.call_count == 1
+    assert spot_client.session_token == "tok"
+
+
+@patch("app.spot_client.requests.Session.get")
+def test_disk_token_is_validated_and_reused(mock_get, tmp_path):
+    from app.token_cache import TokenCache
+    path = str(tmp_path / "spot_token.json")
+    TokenCache(path=path).set("disk-token")
+
+    mock_get.return_value = _json_response({"Status": 1})
+    client = SpotClient(access_key="key", token_cache_path=path)
+
+    assert client.get_token() == "disk-token"
+    mock_get.assert_called_once_with(
+        "http://ws.spotgifts.com.br/api/v1/validateSession?token=disk-token", timeout=(5, 30)
+    )
+
+
+@patch("app.spot_client.requests.Session.get")
+def test_invalid_disk_token_triggers_authentication(mock_get, tmp_path):
+    from app.token_cache import TokenCache
+    path = str(tmp_path / "spot_token.json")
+    TokenCache(path=path).set("stale-token")
+
+    def fake_get(url, timeout=None):
+        if "validateSession" in url:
+            return _json_response({"Status": 0})
+        return _json_response({"Token": "fresh-token", "ErrorCode": None})
+
+    mock_get.side_effect = fake_get
+    client = SpotClient(access_key="key", token_cache_path=path)
+
+    assert client.get_token() == "fresh-token"
+    assert TokenCache(path=path).get() == "fresh-token"
+
+
+@patch("app.spot_client.requests.Session.get")
+def test_fetch_products_retries_once_when_token_rejected(mock_get, spot_client):
+    spot_client.token_cache.set("expired-on-server")
+    responses = iter([
+        _json_response({"ErrorCode": 401, "ErrorMessage": "Invalid token"}),
+        _json_response({"Token": "new", "ErrorCode": None}),
+        _json_response({"Products": [{"ProdReference": "A"}]}),
+    ])
+    mock_get.side_effect = lambda *args, **kwargs: next(responses)
+
+    result = spot_client.fetch_products()
+    assert result == {"Products": [{"ProdReference": "A"}]}
+    assert mock_get.call_args.kwargs["params"]["token"] == "new"
+
+
+def _streamed_response(body: bytes):
+    import io
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    return response
+
+
+@patch("app.spot_client.requests.Session.get")
+def test_iter_products_streams_catalog(mock_get, spot_client):
+    import json
+    spot_client.token_cache.set("tok")
+    products = [{"ProdReference": f"P{i}", "Name": f"Produto {i}"} for i in range(50)]
+    mock_get.return_value = _streamed_response(json.dumps({"Products": products}).encode())
+
+    result = spot_client.iter_products(chunk_size=256)
+
+    assert not isinstance(result, list)
+    assert list(result) == products
+    assert mock_get.call_args.kwargs["stream"] is True
+
+
+@patch("app.spot_client.requests.Session.get")
+def test_iter_products_reauthenticates_on_rejected_token(mock_get, spot_client):
+    spot_client.token_cache.set("stale")
+    responses = iter([
+        _streamed_response(b'{"ErrorCode": 401, "ErrorMessage": "Invalid token"}'),
+        _json_response({"Token": "fresh", "ErrorCode": None}),
+        _streamed_response(b'{"Products": [{"ProdReference": "A"}]}'),
+    ])
+    mock_get.side_effect = lambda *args, **kwargs: next(responses)
+
+    assert list(spot_client.iter_products()) == [{"ProdReference": "A"}]
+
+
+@patch("app.spot_client.requests.Session.get")
+def test_cancel_stops_catalog_download(mock_get):
+    from app.spot_client import RequestCancelled
+    client = SpotClient(access_key="key")
+    client.token_cache.set("token")
+
+    def chunks(chunk_size):
+        yield b'{"Products": ['
+        client.cancel()
+        yield b'{"ProdReference": "A"}]}'
+
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.iter_content.side_effect = chunks
+    mock_get.return_value = response
+
+    with pytest.raises(RequestCancelled):
+        client.iter_products()
@@ -89,8 +89,8 @@ def test_map_spot_to_omie_all_fields_missing():
         map_spot_to_omie(product)
 
 
-@patch("app.spot_mapper.pd.DataFrame.to_csv")
-def test_fetch_spot_products(mock_to_csv):
+@patch("app.spot_mapper.SnapshotWriter")
+def test_fetch_spot_products(mock_writer_cls):
     mock_spot_client = MagicMock()
     mock_spot_client.fetch_products.return_value = {
         "Products": [
@@ -103,15 +103,88 @@ def test_fetch_spot_products(mock_to_csv):
 
     assert len(result) == 2
     mock_spot_client.fetch_products.assert_called_once()
-    mock_to_csv.assert_called_once()
+    mock_writer_cls.return_value.write.assert_called_once()
+    assert mock_writer_cls.return_value.write.call_args[0][0] == "spot_products"
+    mock_writer_cls.return_value.close.assert_called_once()
 
 
-@patch("app.spot_mapper.pd.DataFrame.to_csv")
-def test_fetch_spot_products_empty(mock_csv):
+def test_fetch_spot_products_queues_snapshot_on_given_writer(tmp_path):
+    from app.snapshots import SnapshotWriter, read_snapshot
+    mock_spot = MagicMock()
+    mock_spot.fetch_products.return_value = {"Products": [{"ProdReference": "P1", "Colors": ["Azul"]}]}
+    writer = SnapshotWriter(str(tmp_path))
+
+    fetch_spot_products(mock_spot, snapshots=writer)
+    writer.close()
+
+    frame = read_snapshot("spot_products", str(tmp_path))
+    assert frame["ProdReference"].tolist() == ["P1"]
+    assert frame["Colors"].tolist() == ['["Azul"]']
+
+
+@patch("app.spot_mapper.SnapshotWriter")
+def test_fetch_spot_products_empty(mock_writer_cls):
     mock_spot = MagicMock()
     mock_spot.fetch_products.return_value = {"Products": []}
 
     result = fetch_spot_products(mock_spot)
 
     assert result == []
-    mock_csv.assert_not_called()
+    mock_writer_cls.assert_not_called()
+
+
+def test_changed_fields_only_reports_real_differences():
+    from app.spot_mapper import changed_fields
+    new_payload = {
+        "codigo": "A1",
+        "codigo_produto_integracao": "A1",
+        "descricao": "Caneta - Cor: Azul - Codigo: A1",
+        "descr_detalhada": "Nova descrição",
+        "ncm": "40169200",
+        "peso_bruto": 0.39,
+        "unidade": "UN",
+        "importado_api": "S",
+    }
+    omie_record = {
+        "codigo_produto": 123,
+        "codigo_produto_integracao": "A1",
+        "descricao": "Caneta - Cor: Azul - Codigo: A1 ",
+        "descr_detalhada": "Descrição antiga",
+        "ncm": "4016.92.00",
+        "peso_bruto": "0.390",
+        "unidade": "UN",
+    }
+
+    assert changed_fields(new_payload, omie_record) == {"descr_detalhada": "Nova descrição"}
+    assert changed_fields(new_payload, new_payload) == {}
+
+
+def test_map_spot_variant_reuses_parent_payload():
+    from app.spot_mapper import map_spot_variant
+    product = {"ProdReference": "11104", "Name": "Caneta", "Colors": "Azul, Vermelho", "Description": "X",
+               "Taric": "96081000", "Weight": 10}
+    parent = map_spot_to_omie(product)
+    original = dict(parent)
+
+    variant = map_spot_variant(parent, product, "11104-105", "Vermelho")
+
+    assert parent == original
+    assert variant["codigo"] == variant["codigo_produto_integracao"] == "11104-105"
+    assert variant["descricao"] == "Caneta - Cor: Vermelho - Codigo: 11104-105"
+    assert {k: v for k, v in variant.items() if k not in ("codigo", "codigo_produto_integracao", "descricao")} == \
+        {k: v for k, v in parent.items() if k not in ("codigo", "codigo_produto_integracao", "descricao")}
+    # SKU without a color of its own keeps the product's colors
+    assert map_spot_variant(parent, product, "11104-1")["descricao"] == "Caneta - Cor: Azul, Vermelho - Codigo: 11104-1"
+
+
+def test_load_ncm_corrections_from_csv(tmp_path, monkeypatch):
+    import app.spot_mapper as spot_mapper
+    monkeypatch.setattr(spot_mapper, "NCM_CORRECTIONS", dict(spot_mapper.NCM_CORRECTIONS))
+    path = tmp_path / "ncm.csv"
+    path.write_text("errado,certo\n4202.92.00,42029900\n")
+
+    try:
+        assert spot_mapper.load_ncm_corrections(str(path)) == 1
+        assert spot_mapper.fix_ncm("4202.92.00") == "42029900"
+    finally:
+        spot_mapper.fix_ncm.cache_clear()
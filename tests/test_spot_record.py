@@ -0,0 +1,38 @@
+from app.spot_record import SpotProduct, PRODUCT_FIELDS
+from app.spot_mapper import map_spot_to_omie
+
+SPOT_PRODUCT = {
+    "ProdReference": "11103", "Name": "11103. Borracha branca em TPR", "Colors": "Branco",
+    "Description": "Borracha branca em TPR.", "Taric": "4016.92.00", "Weight": 12,
+    "UpdateDate": "11/04/2024 11:44:22", "KeyWords": "borracha,escolar", "AllImageList": "a.jpg,b.jpg",
+    "CustomizationTables": [{"Table": "T1"}], "BoxQuantity": 500,
+}
+
+
+def test_keeps_only_the_fields_the_sync_reads():
+    record = SpotProduct.from_dict(SPOT_PRODUCT)
+
+    assert not hasattr(record, "__dict__")
+    assert record.as_dict() == {k: v for k, v in SPOT_PRODUCT.items() if k in PRODUCT_FIELDS}
+    assert record.get("KeyWords") is None
+
+
+def test_get_behaves_like_dict_get():
+    record = SpotProduct.from_dict({"ProdReference": "A1", "Weight": None})
+
+    assert record.get("ProdReference") == "A1"
+    assert record.get("ProdName", "Unknown") == "Unknown"
+    # Present but None is still None, like on the dict
+    assert record.get("Weight", 0) is None
+    assert SpotProduct(ProdReference="A1", Weight=None) == record
+
+
+def test_maps_like_the_original_dict():
+    assert map_spot_to_omie(SpotProduct.from_dict(SPOT_PRODUCT)) == map_spot_to_omie(SPOT_PRODUCT)
+
+
+def test_repeated_values_are_shared():
+    first = SpotProduct.from_dict({"Taric": "".join(["4016", "9200"])})
+    second = SpotProduct.from_dict({"Taric": "".join(["4016", "9200"])})
+
+    assert first.Taric is second.Taric
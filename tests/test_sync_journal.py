@@ -0,0 +1,62 @@
+import json
+from app.sync_journal import SyncJournal
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_records_are_written_as_the_run_goes(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = SyncJournal(str(path))
+    journal.record_listing({"B", "A"})
+    journal.record("C", "inserted", codigo_produto=7)
+
+    # Readable before close(): every record is flushed and fsync'd
+    records = _lines(path)
+    assert records[0]["codes"] == ["A", "B"]
+    assert records[1]["code"] == "C" and records[1]["status"] == "inserted" and records[1]["codigo_produto"] == 7
+    journal.close()
+
+
+def test_resume_replays_an_unfinished_journal(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = SyncJournal(str(path))
+    journal.record_listing(["A"])
+    journal.record("B", "inserted")
+    journal.record("C", "failed", error_code="500")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"event": "product", "code": "D", "sta')  # torn by a crash
+
+    resumed = SyncJournal(str(path), resume=True)
+
+    assert resumed.resumed
+    assert resumed.listing == {"A"}
+    assert resumed.inserted_codes() == {"B"}
+    assert resumed.is_finished("B") and not resumed.is_finished("C") and not resumed.is_finished("D")
+    resumed.record("C", "inserted")
+    resumed.close()
+    # The torn fragment stays on its own line and the new record follows it
+    last = path.read_text(encoding="utf-8").splitlines()[-1]
+    assert json.loads(last)["code"] == "C"
+
+
+def test_completed_or_non_resumed_runs_start_a_new_journal(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = SyncJournal(str(path))
+    journal.record("B", "inserted")
+    journal.complete()
+    journal.close()
+
+    resumed = SyncJournal(str(path), resume=True)
+    assert not resumed.resumed and resumed.entries == {} and resumed.listing is None
+    resumed.close()
+    assert path.read_text(encoding="utf-8") == ""
+
+    journal = SyncJournal(str(path))
+    journal.record("B", "inserted")
+    journal.close()
+    fresh = SyncJournal(str(path))
+    assert fresh.entries == {}
+    fresh.close()
@@ -0,0 +1,29 @@
+from app.sync_state import SyncStateStore, payload_hash
+
+
+def test_payload_hash_ignores_key_order():
+    assert payload_hash({"a": 1, "b": "x"}) == payload_hash({"b": "x", "a": 1})
+    assert payload_hash({"a": 1}) != payload_hash({"a": 2})
+
+
+def test_state_store_persists_between_runs(tmp_path):
+    path = str(tmp_path / "state.db")
+
+    store = SyncStateStore(path)
+    store.record("A1", "11/04/2024 11:44:22", "hash-a")
+    store.close()
+
+    reopened = SyncStateStore(path)
+    assert len(reopened) == 1
+    assert reopened.get("A1").payload_hash == "hash-a"
+    assert reopened.is_unchanged("A1", "11/04/2024 11:44:22")
+    assert not reopened.is_unchanged("A1", "12/04/2024 09:00:00")
+    assert not reopened.is_unchanged("B2", "11/04/2024 11:44:22")
+    reopened.close()
+
+
+def test_state_store_missing_update_date_is_never_unchanged(tmp_path):
+    store = SyncStateStore(str(tmp_path / "state.db"))
+    store.record("A1", None, "hash-a")
+    assert not store.is_unchanged("A1", None)
+    store.close()